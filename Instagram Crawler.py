@@ -7,7 +7,21 @@ Coleta:
 - Views (quando existir, principalmente Reels e vídeos)
 - Shares e Reach (somente se houver acesso ao painel de Insights)
 
-Exporta CSV.
+Exporta CSV, gerado a partir de uma base SQLite local (STORE_DB) com todos os posts
+já vistos: execuções seguintes só reabrem posts novos ou com métricas vencidas.
+
+A coleta é um pipeline: páginas de descoberta rolam a grade dos perfis e alimentam uma
+fila limitada de URLs, consumida por N_WORKERS páginas de extração; todas compartilham o
+mesmo contexto logado e um limitador adaptativo de navegações (AdaptiveRateLimiter).
+As páginas vêm de um pool (ContextPool) que recicla o contexto, mantendo a sessão,
+quando o número de navegações ou a memória do Chromium passam do limite.
+
+Cada etapa (navegação, esperas, extratores, insights, pausas) é cronometrada; os
+histogramas saem em METRICS_PROM_FILE (Prometheus) e METRICS_JSON_FILE.
+
+Escala horizontal: `--shards N` divide os perfis entre N processos (navegador e sessão
+próprios cada) por uma fila SQLite com leases em SHARD_DIR; outras máquinas entram na
+mesma fila com `--shards N --join`. Ao final os shards são fundidos em STORE_DB.
 
 Observação:
 Reach e Shares costumam existir apenas em Insights, que geralmente só aparece para dono do post
@@ -15,16 +29,38 @@ ou contas com permissão. Para perfis de terceiros, tende a vir vazio.
 """
 
 import os
+import sys
+import json
+import math
+import argparse
+import codecs
+import csv
+import hashlib
+import heapq
+import importlib.util
 import time
+import asyncio
 import random
 import re
+import socket
+import sqlite3
+import subprocess
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import List, Dict, Any, Optional, Set, Tuple
+from urllib.parse import quote
+from urllib.request import Request, urlopen
 
 import pandas as pd
 from dateutil import tz
 from unidecode import unidecode
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout, Error as PWError
+from playwright.async_api import async_playwright, TimeoutError as PWTimeout, Error as PWError
 
 # ======================== CREDENCIAIS ========================
 # Recomendo usar variáveis de ambiente:
@@ -35,8 +71,29 @@ from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout, Erro
 IG_USER = "mkt_sport_squad_br"
 IG_PASS = " "
 
+# sessão logada (cookies + localStorage do contexto) salva entre execuções: o login
+# só roda de novo quando a sessão salva deixa de valer. O arquivo dá acesso à conta;
+# não versione. Vazio desliga.
+SESSION_STATE_FILE = "instagram_session.json"
+
 # ======================== CONFIG ========================
 
+# registro de perfis: lista (com "enabled"/"interval_hours" editáveis à mão) e
+# estatísticas aprendidas a cada execução; criado a partir de PROFILES_RAW na
+# primeira execução e, daí em diante, a lista vale a partir dele
+PROFILES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles.json")
+
+# agendador: um perfil entra na execução quando o ritmo histórico de postagem prevê
+# ao menos SCHEDULE_MIN_EXPECTED_POSTS posts novos desde a última coleta, ou quando
+# ela tem mais de SCHEDULE_MAX_INTERVAL_HOURS (perfis parados ficam espaçados)
+SCHEDULE_MIN_EXPECTED_POSTS = 0.5
+SCHEDULE_MAX_INTERVAL_HOURS = 168
+# peso da execução mais recente nas médias do registro
+SCHEDULE_EWMA_ALPHA = 0.5
+# orçamento de tempo da execução em minutos (0 = sem limite): passado o prazo,
+# nenhum perfil novo é iniciado; os de mais valor vão primeiro
+RUN_BUDGET_MIN = 0
+
 PROFILES_RAW = """
 joolapickleballbrasil
 joolabrasil
@@ -179,6 +236,85 @@ fan_zhendong
 
 OUT_CSV = "instagram_perfis_auto.csv"
 
+# base local com todos os posts já vistos (chave: shortcode); o CSV sai daqui
+STORE_DB = "instagram_posts.sqlite"
+
+# hashtags como fonte extra de posts, de qualquer perfil (--hashtags "tag1,tag2");
+# cada tag traz até HASHTAG_MAX_POSTS posts da janela por execução
+HASHTAGS: List[str] = []
+HASHTAG_MAX_POSTS = 60
+
+# posts já abertos, comum a todas as fontes (perfis e hashtags) e entre execuções:
+# filtro de Bloom em SEEN_FILE (SEEN_CAPACITY posts com SEEN_ERROR de falsos
+# positivos ocupam ~1,2 MB) na frente da base, que confirma cada positivo
+SEEN_FILE = "instagram_seen.bloom"
+SEEN_CAPACITY = 1_000_000
+SEEN_ERROR = 0.01
+
+# formatos de saída ("csv", "jsonl", "parquet"); jsonl/parquet vão para EXPORT_DIR
+# particionados por data de coleta e perfil
+EXPORT_FORMATS = ["csv"]
+EXPORT_DIR = "exports"
+PARQUET_ROW_GROUP = 5000
+
+# diário da execução (JSONL, gravado a cada post/perfil concluído) usado pelo --resume
+RUN_JOURNAL = "instagram_crawl_journal.jsonl"
+
+# execução distribuída (--shards): os perfis ficam numa fila SQLite com leases em
+# SHARD_QUEUE; cada processo (desta ou de outras máquinas, com SHARD_DIR num disco
+# compartilhado) tem seu navegador e sessão e grava em SHARD_DIR/posts-<worker>.sqlite,
+# que o coordenador funde em STORE_DB antes de exportar. Lease não renovado em
+# LEASE_S (worker morto) volta para a fila; após LEASE_MAX_ATTEMPTS o perfil falha.
+SHARD_DIR = "shards"
+SHARD_QUEUE = os.path.join(SHARD_DIR, "queue.sqlite")
+LEASE_S = 300
+LEASE_MAX_ATTEMPTS = 3
+
+# modo daemon (--daemon): navegador e sessão ficam abertos entre jobs, que chegam por
+# uma API HTTP local (só escuta em DAEMON_HOST); --via-daemon manda os perfis da
+# execução para ele em vez de abrir outro navegador. A sessão é reconferida antes de
+# um job se a última conferência tiver mais de DAEMON_SESSION_CHECK_S.
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = 8765
+DAEMON_SESSION_CHECK_S = 600
+DAEMON_JOB_TTL_S = 3600     # jobs concluídos continuam consultáveis por esse tempo
+DAEMON_HTTP_TIMEOUT_S = 30  # por pedido do --via-daemon; o job em si pode demorar mais
+DAEMON_POLL_S = 2
+
+# reatualização das métricas voláteis (Likes/Views/Shares/Reach) conforme a idade
+# do post: (idade máxima em horas, intervalo mínimo entre coletas em horas)
+REFRESH_SCHEDULE = [
+    (24, 1),
+    (72, 6),
+    (168, 24),
+    (None, 72),
+]
+
+# séries de engajamento: toda coleta de métricas de um post com até
+# SNAPSHOT_TRACK_HOURS de vida vira uma amostra (hora, likes, views) na base;
+# --snapshot coleta só os posts que passaram de um marco de SNAPSHOT_SCHEDULE_H
+# (horas de vida) sem amostra desde então, no máximo SNAPSHOT_BATCH por rodada.
+# Amostras a menos de SNAPSHOT_MIN_GAP_S da anterior são descartadas.
+SNAPSHOT_SCHEDULE_H = [1, 3, 12, 24, 72]
+SNAPSHOT_TRACK_HOURS = 96
+SNAPSHOT_BATCH = 500
+SNAPSHOT_MIN_GAP_S = 300
+
+CSV_COLUMNS = [
+    "PERFIL",
+    "Data/Hora da Publicação",
+    "Legenda/Descrição do Post",
+    "Tema Central (assunto principal)",
+    "Tipo de Mídia",
+    "Tom da Comunicação",
+    "Hashtags utilizadas",
+    "Likes",
+    "Views",
+    "Shares",
+    "Reach",
+    "URL"
+]
+
 USER_TZ = tz.gettz("America/Sao_Paulo")
 
 # agora buscamos os posts das últimas 24 horas por perfil
@@ -186,15 +322,304 @@ WINDOW_HOURS = 480  # janela de tempo para considerar o post recente
 
 MIN_DELAY = 0.8
 MAX_DELAY = 1.6
+# falha ao abrir um post ou perfil não segura a página: o item vai para uma fila de
+# espera e volta após RETRY_BASE_S * 2^(tentativa-1) segundos (±50% de jitter, teto
+# RETRY_MAX_S), só quando a fila de trabalho novo estiver vazia; os *_RETRIES são o
+# total de tentativas
 OPEN_POST_RETRIES = 3
+OPEN_PROFILE_RETRIES = 2
+RETRY_BASE_S = 20
+RETRY_MAX_S = 600
+# disjuntores: PROFILE_BREAKER_FAILURES falhas seguidas num perfil encerram o perfil
+# nesta execução (fica pendente para o --resume); SESSION_BREAKER_FAILURES seguidas
+# na sessão pausam toda a navegação por SESSION_BREAKER_COOLDOWN_S (vezes o número de
+# disparos) e, no SESSION_BREAKER_MAX_TRIPS-ésimo disparo, a execução é encerrada
+PROFILE_BREAKER_FAILURES = 5
+SESSION_BREAKER_FAILURES = 10
+SESSION_BREAKER_COOLDOWN_S = 300
+SESSION_BREAKER_MAX_TRIPS = 3
+
+# páginas trabalhando em paralelo (todas no mesmo contexto logado):
+# N_DISCOVERY_WORKERS rolam grades de perfis, N_WORKERS abrem posts
+N_DISCOVERY_WORKERS = 1
+N_WORKERS = 4
+# capacidade das filas entre os estágios (backpressure)
+URL_QUEUE_SIZE = 50
+ROW_QUEUE_SIZE = 50
+PIPELINE_REPORT_EVERY_S = 30
+# ritmo de navegações da sessão (somando todas as páginas), ajustado em tempo real:
+# +RATE_INCREASE_PER_MIN a cada resposta saudável, x RATE_DECREASE_FACTOR e pausa
+# de RATE_PENALTY_S em 429 / login / challenge
+RATE_START_PER_MIN = 30
+RATE_MIN_PER_MIN = 4
+RATE_MAX_PER_MIN = 90
+RATE_INCREASE_PER_MIN = 0.5
+RATE_DECREASE_FACTOR = 0.5
+RATE_SOFT_DECREASE_FACTOR = 0.8  # timeouts e 5xx
+RATE_PENALTY_S = 60
+RATE_BURST = 3
+
+# reciclagem do contexto do navegador (a memória do Chromium cresce com as páginas
+# visitadas): um contexto novo, com a mesma sessão (storage_state), assume ao passar
+# de CONTEXT_MAX_NAVIGATIONS navegações ou de BROWSER_MAX_RSS_MB somando os processos
+# do navegador (medido a cada RSS_CHECK_EVERY_S); 0 desliga cada limite
+CONTEXT_MAX_NAVIGATIONS = 600
+BROWSER_MAX_RSS_MB = 2500
+RSS_CHECK_EVERY_S = 15
+
+# teto de links lidos da grade de um perfil (a parada normal é pela data de corte)
+MAX_POSTS_PER_PROFILE = 480
+# o Instagram permite até 3 posts fixados no topo da grade
+MAX_PINNED_POSTS = 3
+
+# como os posts são baixados: "http" pede o JSON do post direto (cliente HTTP com
+# keep-alive, cookies da sessão do navegador; precisa de `pip install httpx[http2]`)
+# e só abre no navegador o que não vier completo; "browser" renderiza tudo
+FETCH_BACKEND = "http"
+HTTP_MAX_CONNECTIONS = 8
+HTTP_TIMEOUT_S = 20
+# falhas seguidas até o caminho HTTP ser desligado na execução
+HTTP_MAX_FAILURES = 8
+
+# replay offline (benchmarks/replay.py): com REPLAY_BASE_URL definido, os pedidos de
+# JSON feitos fora das páginas (cliente HTTP e context.request: sonda, hashtag, checagem
+# da sessão) vão para <REPLAY_BASE_URL>/__replay__?url=<url original>
+REPLAY_BASE_URL = ""
+# proxy do Chromium (opção `proxy` do Playwright), ex.: {"server": "http://host:3128"}
+BROWSER_PROXY: Optional[Dict[str, str]] = None
+
+# sonda de mudança: antes da grade, um pedido só (web_profile_info) traz o total
+# de posts e os ~12 mais recentes do perfil; se o post mais novo da execução
+# anterior está entre eles, a grade nem é aberta
+CHANGE_PROBE = True
+
+# Insights só aparece para contas com acesso ao painel (em geral, as nossas): depois
+# de INSIGHTS_MISSES_TO_SKIP posts seguidos sem o botão, o perfil deixa de ser
+# sondado e só volta a ser testado INSIGHTS_REPROBE_HOURS depois (guardado em STORE_DB)
+INSIGHTS_MISSES_TO_SKIP = 3
+INSIGHTS_REPROBE_HOURS = 168
+
+# lê os campos direto das respostas JSON/GraphQL que a própria página baixa;
+# o scraping do DOM fica só como plano B
+CAPTURE_JSON = True
+
+# filtro de requisições do contexto: "metadata-only" bloqueia mídia, fontes e
+# analytics (só lemos texto e atributos); "full" carrega tudo, como antes
+ROUTE_PROFILE = "metadata-only"
+
+# prazo máximo (ms) de cada condição de prontidão; a espera termina assim que a
+# condição é satisfeita, o prazo só vale quando ela nunca chega
+READY_TIMEOUT_MS = {
+    "login_form": 15000,
+    "login_done": 30000,
+    "profile_grid": 10000,
+    "grid_scroll": 6000,
+    "post": 10000,
+    "insights": 5000,
+}
+
+# telemetria da execução: textfile para o node_exporter (coletor textfile do
+# Prometheus) e resumo JSON, regravados a cada relatório do pipeline e no fim;
+# "" desliga o arquivo
+METRICS_PROM_FILE = "instagram_crawler.prom"
+METRICS_JSON_FILE = "instagram_crawler_metrics.json"
+# limites (s) dos buckets dos histogramas de tempo
+SPAN_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# taxonomia de palavras-chave do "Tom da Comunicação" (rótulos por prioridade)
+TONE_KEYWORDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tone_keywords.json")
 
 USERNAME_RE = re.compile(r"instagram\.com/([A-Za-z0-9._]+)/?", re.IGNORECASE)
 HASHTAG_RE = re.compile(r"#\w+", re.UNICODE)
+SHORTCODE_RE = re.compile(r"/(?:p|reel|reels)/([A-Za-z0-9_-]+)")
 
 # ======================== FUNÇÕES AUXILIARES ========================
 
-def human_delay(a=MIN_DELAY, b=MAX_DELAY):
-    time.sleep(random.uniform(a, b))
+async def human_delay(a=MIN_DELAY, b=MAX_DELAY):
+    with TELEMETRY.span("pausa"):
+        await asyncio.sleep(random.uniform(a, b))
+
+
+class AdaptiveRateLimiter:
+    """Token bucket da sessão com ajuste AIMD: o ritmo sobe aos poucos enquanto as
+    respostas vêm saudáveis e cai pela metade, com uma pausa, em HTTP 429,
+    redirecionamento para o login ou página de challenge."""
+
+    def __init__(self, start_per_min: Optional[float] = None,
+                 min_per_min: Optional[float] = None,
+                 max_per_min: Optional[float] = None,
+                 burst: Optional[float] = None):
+        # padrões lidos na criação, não na definição: quem ajusta RATE_* no módulo
+        # (benchmarks/replay.py) vale para o próximo limitador
+        start_per_min = RATE_START_PER_MIN if start_per_min is None else start_per_min
+        min_per_min = RATE_MIN_PER_MIN if min_per_min is None else min_per_min
+        max_per_min = RATE_MAX_PER_MIN if max_per_min is None else max_per_min
+        self.min_rate = min_per_min / 60
+        self.max_rate = max_per_min / 60
+        self.rate = min(self.max_rate, max(self.min_rate, start_per_min / 60))
+        self.burst = RATE_BURST if burst is None else burst
+        self.tokens = 1.0
+        self.throttled_s = 0.0
+        self.events: Counter = Counter()
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._last_cut = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def per_minute(self) -> float:
+        return self.rate * 60
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self):
+        t0 = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+        self.throttled_s += time.monotonic() - t0
+
+    def observe(self, status: Optional[int], final_url: str = ""):
+        u = (final_url or "").lower()
+        if status == 429:
+            self.back_off("http 429")
+        elif "/accounts/login" in u:
+            self.back_off("redirecionado ao login")
+        elif "/challenge" in u:
+            self.back_off("challenge")
+        elif status is not None and status >= 500:
+            self.back_off(f"http {status}", factor=RATE_SOFT_DECREASE_FACTOR, pause=0)
+        elif status is None or status < 400:
+            self.speed_up()
+
+    def observe_timeout(self):
+        self.back_off("timeout", factor=RATE_SOFT_DECREASE_FACTOR, pause=0)
+
+    def speed_up(self):
+        self.events["ok"] += 1
+        self.rate = min(self.max_rate, self.rate + RATE_INCREASE_PER_MIN / 60)
+
+    def back_off(self, reason: str, factor: Optional[float] = None, pause: Optional[float] = None):
+        factor = RATE_DECREASE_FACTOR if factor is None else factor
+        pause = RATE_PENALTY_S if pause is None else pause
+        now = time.monotonic()
+        self.events[reason] += 1
+        TELEMETRY.inc(f"bloqueio: {reason}")
+        if now - self._last_cut < 2.0:
+            return  # vários sinais da mesma rajada contam como um só corte
+        self._last_cut = now
+        self.rate = max(self.min_rate, self.rate * factor)
+        self.tokens = 0.0
+        self._paused_until = max(self._paused_until, now + pause)
+        print(f"[LIMITE] {reason}: ritmo reduzido para {self.per_minute:.1f} nav/min"
+              + (f", pausa de {pause:.0f}s" if pause else ""))
+
+    def hold(self, reason: str, seconds: float):
+        """Pausa incondicional (não é coalescida com outros cortes como `back_off`)."""
+        self.events[reason] += 1
+        TELEMETRY.inc(f"bloqueio: {reason}")
+        self.tokens = 0.0
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        print(f"[LIMITE] {reason}: navegação pausada por {seconds:.0f}s")
+
+    def watch(self, context):
+        """Também reage a 429 nas chamadas XHR/GraphQL que a página faz sozinha."""
+        def _on_response(resp):
+            if resp.status == 429:
+                self.back_off("http 429 (xhr)")
+        context.on("response", _on_response)
+
+    def summary(self) -> str:
+        bad = {k: v for k, v in self.events.items() if k != "ok"}
+        return (f"[LIMITE] ritmo final {self.per_minute:.1f} nav/min, "
+                f"{self.throttled_s:.0f}s esperando o limitador, "
+                f"{self.events['ok']} respostas saudáveis, sinais de bloqueio: {bad or 'nenhum'}")
+
+
+async def navigate(page, url: str, limiter: Optional[AdaptiveRateLimiter] = None, **kwargs):
+    if limiter is not None:
+        with TELEMETRY.span("limitador"):
+            await limiter.acquire()
+    try:
+        with TELEMETRY.span("navegação"):
+            resp = await page.goto(url, **kwargs)
+    except PWTimeout:
+        if limiter is not None:
+            limiter.observe_timeout()
+        raise
+    if limiter is not None:
+        limiter.observe(resp.status if resp else None, page.url)
+    return resp
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+class WaitStats:
+    """Tempo realmente gasto esperando em cada ponto de prontidão."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.timeouts: Counter = Counter()
+
+    def record(self, site: str, seconds: float, ok: bool):
+        self.samples.setdefault(site, []).append(seconds)
+        if not ok:
+            self.timeouts[site] += 1
+
+    def summary(self) -> str:
+        lines = ["[ESPERAS] ponto            n     p50     p95     max  prazo estourado"]
+        for site in sorted(self.samples):
+            v = self.samples[site]
+            lines.append(
+                f"  {site:<18} {len(v):>5} {_percentile(v, 0.5):>6.2f}s {_percentile(v, 0.95):>6.2f}s "
+                f"{max(v):>6.2f}s  {self.timeouts[site]}"
+            )
+        return "\n".join(lines)
+
+
+WAIT_STATS = WaitStats()
+
+
+async def wait_ready(site: str, *waiters, timeout_ms: Optional[int] = None) -> bool:
+    """Espera a primeira condição de prontidão que se cumprir, até o prazo do ponto `site`."""
+    timeout = (timeout_ms or READY_TIMEOUT_MS[site]) / 1000
+    t0 = time.monotonic()
+    pending = {asyncio.ensure_future(w) for w in waiters}
+    ok = False
+    try:
+        while pending and not ok:
+            remaining = timeout - (time.monotonic() - t0)
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    ok = True
+    finally:
+        for t in pending:
+            t.cancel()
+        WAIT_STATS.record(site, time.monotonic() - t0, ok)
+        TELEMETRY.observe(f"espera: {site}", time.monotonic() - t0)
+        if not ok:
+            TELEMETRY.inc(f"prazo estourado: {site}")
+    return ok
 
 
 def to_user_tz(dt_utc: datetime) -> datetime:
@@ -210,34 +635,201 @@ def extract_hashtags(text: str) -> str:
     return ", ".join(sorted(set(t.strip() for t in tags)))
 
 
+# transliteração de cada caractere não-ASCII já visto
+_FOLD_CACHE: Dict[str, str] = {}
+
+
+def _unidecode_errors(err: UnicodeEncodeError) -> Tuple[str, int]:
+    run = err.object[err.start:err.end]
+    out = _FOLD_CACHE.get(run)
+    if out is None:
+        out = unidecode(run)
+        if len(run) == 1:
+            _FOLD_CACHE[run] = out
+    return out, err.end
+
+
+codecs.register_error("unidecode", _unidecode_errors)
+
+
+def fold_text(text: str) -> str:
+    """O mesmo que unidecode(text.lower()), mas o unidecode (Python puro, caractere a
+    caractere) só vê os trechos não-ASCII; o resto passa pelo codec em C."""
+    low = text.lower()
+    if low.isascii():
+        return low
+    return low.encode("ascii", "unidecode").decode("ascii")
+
+
+class ToneClassifier:
+    """Taxonomia de tom (TONE_KEYWORDS_FILE) compilada uma única vez.
+
+    O rótulo principal segue a prioridade da taxonomia, como o classify_tone original:
+    cada nível de prioridade é testado em ordem e o primeiro que casar encerra a busca.
+    Com o pacote pyahocorasick instalado, cada nível vira um autômato Aho-Corasick (uma
+    passada pela legenda) e a busca de todos os rótulos usa um autômato único. Sem ele,
+    cada nível é uma tupla fixa de palavras-chave testadas com `in`; no CPython essa
+    busca em C ficou mais rápida que um regex de alternância nas legendas sem nenhuma
+    palavra-chave, que são a maioria.
+    """
+
+    def __init__(self, taxonomy: Dict[str, Any], engine: str = "auto"):
+        self.taxonomy = taxonomy
+        self.default = taxonomy.get("default", "Campanha")
+        labels = sorted(taxonomy["labels"], key=lambda lab: lab.get("priority", 0))
+        self.names = [lab["name"] for lab in labels]
+        self.priority = {lab["name"]: lab.get("priority", i) for i, lab in enumerate(labels)}
+
+        self.engine = "substring"
+        if engine in ("auto", "aho-corasick"):
+            try:
+                import ahocorasick
+            except ImportError:
+                if engine == "aho-corasick":
+                    raise RuntimeError("engine 'aho-corasick' requer pyahocorasick (pip install pyahocorasick).")
+            else:
+                owners: Dict[str, List[str]] = {}
+                self._tiers = []
+                for lab in labels:
+                    tier = ahocorasick.Automaton()
+                    for kw in lab["keywords"]:
+                        owners.setdefault(kw, []).append(lab["name"])
+                        tier.add_word(kw, kw)
+                    tier.make_automaton()
+                    self._tiers.append((lab["name"], tier))
+                self._automaton = ahocorasick.Automaton()
+                for kw, names in owners.items():
+                    self._automaton.add_word(kw, (kw, names))
+                self._automaton.make_automaton()
+                self.engine = "aho-corasick"
+
+        self._keywords = [(lab["name"], tuple(lab["keywords"])) for lab in labels]
+
+    @classmethod
+    def from_file(cls, path: str = "", engine: str = "auto") -> "ToneClassifier":
+        with open(path or TONE_KEYWORDS_FILE, encoding="utf-8") as fh:
+            return cls(json.load(fh), engine)
+
+    def matches(self, caption: str) -> Dict[str, List[str]]:
+        """Rótulo -> palavras-chave encontradas na legenda."""
+        out: Dict[str, List[str]] = {}
+        if not caption:
+            return out
+        text = fold_text(caption)
+        if self.engine == "aho-corasick":
+            for _, (kw, names) in self._automaton.iter(text):
+                for name in names:
+                    found = out.setdefault(name, [])
+                    if kw not in found:
+                        found.append(kw)
+        else:
+            for name, kws in self._keywords:
+                found = [kw for kw in kws if kw in text]
+                if found:
+                    out[name] = found
+        return out
+
+    def labels(self, caption: str) -> List[str]:
+        m = self.matches(caption)
+        return sorted(m, key=self.priority.__getitem__)
+
+    def classify(self, caption: str) -> str:
+        if not caption:
+            return self.default
+        return self._primary(fold_text(caption))
+
+    def _primary(self, text: str) -> str:
+        # só o rótulo principal: para no primeiro nível (por prioridade) que casar
+        if self.engine == "aho-corasick":
+            for name, tier in self._tiers:
+                for _ in tier.iter(text):
+                    return name
+        else:
+            for name, kws in self._keywords:
+                if any(kw in text for kw in kws):
+                    return name
+        return self.default
+
+    def classify_series(self, captions: "pd.Series", workers: int = 0, chunksize: int = 5000,
+                        multi_label: bool = True) -> "pd.DataFrame":
+        """Classifica uma Series inteira; com workers > 1 divide em blocos num pool de processos.
+
+        Colunas: "Tom da Comunicação" (rótulo principal) e, com multi_label, "Tons" (todos,
+        por prioridade) e "Palavras-chave de tom". Sem multi_label cada legenda para no
+        primeiro nível que casar.
+        """
+        values = captions.fillna("").astype(str).tolist()
+        # exports históricos repetem muita legenda: classifica cada texto distinto uma vez
+        uniq = list(dict.fromkeys(values))
+        if workers and workers > 1 and len(uniq) > chunksize:
+            from concurrent.futures import ProcessPoolExecutor
+            chunks = [uniq[i:i + chunksize] for i in range(0, len(uniq), chunksize)]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parts = list(pool.map(_classify_chunk,
+                                      [(self.taxonomy, self.engine, multi_label, c) for c in chunks]))
+            cols = [[v for part in parts for v in part[i]] for i in range(len(parts[0]))]
+        else:
+            cols = self._classify_many(uniq, multi_label)
+        if len(uniq) < len(values):
+            pos = {v: i for i, v in enumerate(uniq)}
+            idx = [pos[v] for v in values]
+            cols = [[col[i] for i in idx] for col in cols]
+        names = ["Tom da Comunicação", "Tons", "Palavras-chave de tom"] if multi_label else ["Tom da Comunicação"]
+        return pd.DataFrame(dict(zip(names, cols)), index=captions.index, columns=names)
+
+    def _classify_many(self, captions: List[str], multi_label: bool) -> List[List[str]]:
+        """Classifica uma lista e devolve colunas (listas), não uma tupla por legenda."""
+        if not multi_label:
+            return [[self.classify(c) for c in captions]]
+        tones: List[str] = []
+        labels: List[str] = []
+        keywords: List[str] = []
+        for c in captions:
+            tone, labs, kws = self._classify_full(c)
+            tones.append(tone)
+            labels.append(labs)
+            keywords.append(kws)
+        return [tones, labels, keywords]
+
+    def _classify_full(self, caption: str) -> Tuple[str, str, str]:
+        m = self.matches(caption)
+        labels = sorted(m, key=self.priority.__getitem__)
+        kws = [kw for name in labels for kw in m[name]]
+        return (labels[0] if labels else self.default, "; ".join(labels),
+                ", ".join(dict.fromkeys(kws)))
+
+
+_POOL_CLASSIFIER: Optional[ToneClassifier] = None
+
+
+def _classify_chunk(args) -> List[List[str]]:
+    global _POOL_CLASSIFIER
+    taxonomy, engine, multi_label, captions = args
+    if _POOL_CLASSIFIER is None:
+        _POOL_CLASSIFIER = ToneClassifier(taxonomy, engine)
+    return _POOL_CLASSIFIER._classify_many(captions, multi_label)
+
+
+_TONE_CLASSIFIER: Optional[ToneClassifier] = None
+
+
+def get_tone_classifier() -> ToneClassifier:
+    global _TONE_CLASSIFIER
+    if _TONE_CLASSIFIER is None:
+        _TONE_CLASSIFIER = ToneClassifier.from_file(TONE_KEYWORDS_FILE)
+    return _TONE_CLASSIFIER
+
+
 def classify_tone(caption: str) -> str:
-    if not caption:
-        return "Campanha"
-    text = unidecode(caption.lower())
-    produto_kw = [
-        "compre","garanta","aproveite","desconto","oferta","cupom","frete","estoque","tamanho",
-        "cores","modelo","produto","colecao","linha","edicao","preco","por apenas","link na bio",
-        "especificacoes","caracteristicas","material","tecido","madeira","borracha","raquete","paddle",
-        "tenis","camiseta","shorts","jaqueta","mochila","oculos","meias","lancamento de produto"
-    ]
-    campanha_kw = [
-        "campanha","evento","torneio","inscricoes","inscricao","regulamento","programacao",
-        "cronograma","datas","agenda","ao vivo","live","estreia","parceria","oficial",
-        "comunicado","novidade","lancamento","edicao","serie","capitulo","episodio"
-    ]
-    atleta_kw = [
-        "atleta","treino","treinar","partida","jogo","match","vitoria","derrota","titulo",
-        "medalha","podio","campeonato","torneio","ranking","desempenho","sets","games",
-        "sparring","coach","tecnico","convocacao","selecao","selecao brasileira",
-        "meu jogo","minha partida","minha vitoria","minha derrota","estou treinando","eu joguei"
-    ]
-    if any(k in text for k in produto_kw):
-        return "Produto"
-    if any(k in text for k in atleta_kw):
-        return "Atleta"
-    if any(k in text for k in campanha_kw):
-        return "Campanha"
-    return "Campanha"
+    return get_tone_classifier().classify(caption)
+
+
+PT_STOPWORDS = frozenset("""
+a o os as de da do das dos e em para por com sem um uma umas uns no na nos nas ao à às aos que ser estar é são foi foram era eram vai vão
+como mais menos muito muita muitos muitas pouco poucos poucas este esta isto esse essa isso aquele aquela aquilo sobre entre até
+""".split())
+SENTENCE_SPLIT_RE = re.compile(r"[.!?\n\r]")
+WORD_RE = re.compile(r"\w+")
 
 
 def extract_main_theme(caption: str) -> str:
@@ -252,42 +844,224 @@ def extract_main_theme(caption: str) -> str:
                 uniq.append(tclean)
         return ", ".join(uniq[:2])
 
-    first_sentence = re.split(r"[.!?\n\r]", caption.strip())[0]
-    tokens = re.findall(r"\w+", unidecode(first_sentence.lower()))
-    pt_stop = set("""
-a o os as de da do das dos e em para por com sem um uma umas uns no na nos nas ao à às aos que ser estar é são foi foram era eram vai vão
-como mais menos muito muita muitos muitas pouco poucos poucas este esta isto esse essa isso aquele aquela aquilo sobre entre até
-""".split())
-    tokens = [w for w in tokens if w not in pt_stop]
+    first_sentence = SENTENCE_SPLIT_RE.split(caption.strip())[0]
+    tokens = WORD_RE.findall(fold_text(first_sentence))
+    tokens = [w for w in tokens if w not in PT_STOPWORDS]
     return " ".join(tokens[:8])
 
 
-def parse_profiles(raw: str) -> List[str]:
-    items = re.split(r"[\s,]+", raw.strip())
-    usernames: Set[str] = set()
-    for it in items:
+def profile_names(raw: str) -> List[str]:
+    """Usernames de `raw` (@perfil, URL ou nome) sem repetição, na ordem em que aparecem."""
+    usernames: Dict[str, None] = {}
+    for it in re.split(r"[\s,]+", raw.strip()):
         s = it.strip()
         if not s:
             continue
         if s.startswith("@"):
-            usernames.add(s[1:])
+            usernames[s[1:]] = None
             continue
         if "instagram.com" in s:
             m = USERNAME_RE.search(s)
             if m:
-                usernames.add(m.group(1))
+                usernames[m.group(1)] = None
+                continue
+        usernames[s] = None
+    return list(usernames)
+
+
+def parse_profiles(raw: str) -> List[str]:
+    return sorted(profile_names(raw))
+
+# ======================== TELEMETRIA ========================
+# Spans de tempo nos pontos quentes (limitador, navegação, esperas, snapshot do DOM,
+# extratores, insights, retentativas, pausas) viram histogramas por execução e por
+# perfil. O perfil vem de CURRENT_PROFILE, definido por cada worker do pipeline
+# para o job que está processando.
+
+CURRENT_PROFILE: ContextVar[str] = ContextVar("CURRENT_PROFILE", default="")
+
+
+class Histogram:
+    """Histograma de buckets fixos (SPAN_BUCKETS_S), no formato do Prometheus."""
+
+    def __init__(self):
+        self.counts = [0] * (len(SPAN_BUCKETS_S) + 1)  # último = +Inf
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(SPAN_BUCKETS_S, seconds)] += 1
+        self.n += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Estimativa por interpolação dentro do bucket (como o histogram_quantile)."""
+        rank = q * self.n
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                lo = SPAN_BUCKETS_S[i - 1] if i else 0.0
+                hi = SPAN_BUCKETS_S[i] if i < len(SPAN_BUCKETS_S) else self.max
+                return min(self.max, lo + (hi - lo) * (rank - seen) / c)
+            seen += c
+        return self.max
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "n": self.n,
+            "sum_s": round(self.total, 3),
+            "mean_s": round(self.total / self.n, 3) if self.n else 0.0,
+            "p50_s": round(self.quantile(0.5), 3),
+            "p95_s": round(self.quantile(0.95), 3),
+            "max_s": round(self.max, 3),
+        }
+
+
+def _prom_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Telemetry:
+    def __init__(self):
+        self.worker = ""  # rótulo extra nas séries quando há vários processos (--shards)
+        self.reset()
+
+    def reset(self):
+        self.t0 = time.monotonic()
+        self.started = time.time()
+        self.run: Dict[str, Histogram] = {}
+        self.by_profile: Dict[str, Dict[str, Histogram]] = {}
+        self.events: Counter = Counter()
+        self.profile_events: Dict[str, Counter] = {}
+
+    def observe(self, span: str, seconds: float, profile: Optional[str] = None):
+        profile = CURRENT_PROFILE.get() if profile is None else profile
+        self.run.setdefault(span, Histogram()).observe(seconds)
+        if profile:
+            self.by_profile.setdefault(profile, {}).setdefault(span, Histogram()).observe(seconds)
+
+    @contextmanager
+    def span(self, name: str, profile: Optional[str] = None):
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - t0, profile)
+
+    def inc(self, event: str, n: int = 1, profile: Optional[str] = None):
+        profile = CURRENT_PROFILE.get() if profile is None else profile
+        self.events[event] += n
+        if profile:
+            self.profile_events.setdefault(profile, Counter())[event] += n
+
+    def posts_per_minute(self) -> float:
+        return self.events["post"] / max(1e-6, time.monotonic() - self.t0) * 60
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "started": datetime.fromtimestamp(self.started, USER_TZ).isoformat(),
+            "elapsed_s": round(time.monotonic() - self.t0, 1),
+            "posts_per_min": round(self.posts_per_minute(), 2),
+            "events": dict(self.events),
+            "spans": {k: h.as_dict() for k, h in sorted(self.run.items())},
+            "profiles": {
+                p: {
+                    "events": dict(self.profile_events.get(p, {})),
+                    "spans": {k: h.as_dict() for k, h in sorted(spans.items())},
+                }
+                for p, spans in sorted(self.by_profile.items())
+            },
+        }
+
+    def prometheus(self) -> str:
+        lines: List[str] = []
+        worker = f'worker="{_prom_label(self.worker)}"' if self.worker else ""
+
+        def lbl(labels: str = "") -> str:
+            inner = ",".join(x for x in (worker, labels) if x)
+            return f"{{{inner}}}" if inner else ""
+
+        def hist(metric: str, labels: str, h: Histogram):
+            cum = 0
+            for bound, c in zip(list(SPAN_BUCKETS_S) + ["+Inf"], h.counts):
+                cum += c
+                le = f'{labels},le="{bound}"'
+                lines.append(f"{metric}_bucket{lbl(le)} {cum}")
+            lines.append(f"{metric}_sum{lbl(labels)} {h.total:.6f}")
+            lines.append(f"{metric}_count{lbl(labels)} {h.n}")
+
+        lines += ["# HELP instagram_crawler_span_seconds Tempo gasto em cada etapa da execução.",
+                  "# TYPE instagram_crawler_span_seconds histogram"]
+        for span, h in sorted(self.run.items()):
+            hist("instagram_crawler_span_seconds", f'span="{_prom_label(span)}"', h)
+
+        lines += ["# HELP instagram_crawler_profile_span_seconds Tempo por etapa e por perfil.",
+                  "# TYPE instagram_crawler_profile_span_seconds histogram"]
+        for profile, spans in sorted(self.by_profile.items()):
+            for span, h in sorted(spans.items()):
+                hist("instagram_crawler_profile_span_seconds",
+                     f'profile="{_prom_label(profile)}",span="{_prom_label(span)}"', h)
+
+        lines += ["# HELP instagram_crawler_events_total Eventos da execução (posts, retentativas, bloqueios).",
+                  "# TYPE instagram_crawler_events_total counter"]
+        for ev, n in sorted(self.events.items()):
+            labels = f'event="{_prom_label(ev)}"'
+            lines.append(f"instagram_crawler_events_total{lbl(labels)} {n}")
+        lines += ["# HELP instagram_crawler_profile_events_total Eventos por perfil.",
+                  "# TYPE instagram_crawler_profile_events_total counter"]
+        for profile, evs in sorted(self.profile_events.items()):
+            for ev, n in sorted(evs.items()):
+                labels = f'profile="{_prom_label(profile)}",event="{_prom_label(ev)}"'
+                lines.append(f"instagram_crawler_profile_events_total{lbl(labels)} {n}")
+
+        lines += ["# TYPE instagram_crawler_run_start_timestamp_seconds gauge",
+                  f"instagram_crawler_run_start_timestamp_seconds{lbl()} {self.started:.0f}",
+                  "# TYPE instagram_crawler_run_duration_seconds gauge",
+                  f"instagram_crawler_run_duration_seconds{lbl()} {time.monotonic() - self.t0:.1f}",
+                  "# TYPE instagram_crawler_posts_per_minute gauge",
+                  f"instagram_crawler_posts_per_minute{lbl()} {self.posts_per_minute():.3f}"]
+        return "\n".join(lines) + "\n"
+
+    def write(self, prom_path: Optional[str] = None, json_path: Optional[str] = None):
+        """Grava via arquivo temporário + rename: o coletor nunca lê um arquivo pela metade."""
+        prom_path = METRICS_PROM_FILE if prom_path is None else prom_path
+        json_path = METRICS_JSON_FILE if json_path is None else json_path
+        for path, render in ((prom_path, self.prometheus),
+                             (json_path, lambda: json.dumps(self.as_dict(), ensure_ascii=False, indent=2))):
+            if not path:
                 continue
-        usernames.add(s)
-    return sorted(usernames)
+            try:
+                tmp = path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as fh:
+                    fh.write(render())
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"[WARN] Não foi possível gravar {path}: {e}")
+
+    def summary(self, top: int = 12) -> str:
+        lines = ["[TEMPO] etapa                     n     soma     p50     p95     max"]
+        for span, h in sorted(self.run.items(), key=lambda kv: -kv[1].total)[:top]:
+            lines.append(f"  {span:<26} {h.n:>5} {h.total:>7.0f}s {h.quantile(0.5):>6.2f}s "
+                         f"{h.quantile(0.95):>6.2f}s {h.max:>6.2f}s")
+        return "\n".join(lines)
+
+
+TELEMETRY = Telemetry()
 
 # ======================== MÉTRICAS ========================
 
+COUNT_WORDS_RE = re.compile(r"(curtidas?|likes?|visualizacoes?|views?|reproducoes?|plays?|contas?|alcancadas?|reach|compartilhamentos?|shares?)")
+NON_NUMERIC_RE = re.compile(r"[^0-9.]")
+
+
 def _parse_count(text: str) -> Optional[int]:
     if not text:
         return None
     t = unidecode(text.lower()).strip()
 
-    t = re.sub(r"(curtidas?|likes?|visualizacoes?|views?|reproducoes?|plays?|contas?|alcancadas?|reach|compartilhamentos?|shares?)", "", t).strip()
+    t = COUNT_WORDS_RE.sub("", t).strip()
     t = t.replace("\u202f", " ").replace("\xa0", " ")
     t = t.replace(".", "").replace(" ", "")
 
@@ -300,7 +1074,7 @@ def _parse_count(text: str) -> Optional[int]:
         t = t.replace("mi", "").replace("m", "")
 
     t = t.replace(",", ".")
-    t = re.sub(r"[^0-9.]", "", t)
+    t = NON_NUMERIC_RE.sub("", t)
     if not t:
         return None
     try:
@@ -310,437 +1084,3324 @@ def _parse_count(text: str) -> Optional[int]:
         return None
 
 
-def extract_likes(page) -> Optional[int]:
-    try:
-        candidates = page.query_selector_all("main section span, main section a, main section div")
-        for c in candidates[:450]:
-            tx = (c.inner_text() or "").strip()
-            if not tx:
-                continue
-            low = unidecode(tx.lower())
-            if "curtida" in low or "likes" in low:
-                n = _parse_count(tx)
-                if n is not None:
-                    return n
-    except Exception:
-        pass
+# Um único page.evaluate devolve tudo o que o post precisa; os parsers em Python
+# rodam depois sobre esse snapshot, sem uma ida e volta ao driver por elemento.
+POST_SNAPSHOT_JS = r"""
+() => {
+    const norm = (s) => (s || "").normalize("NFD").replace(/[\u0300-\u036f]/g, "").toLowerCase();
+    const texts = (sel, limit, keep) => {
+        const out = [];
+        const nodes = document.querySelectorAll(sel);
+        for (let i = 0; i < nodes.length && i < limit; i++) {
+            const tx = (nodes[i].innerText || "").trim();
+            if (tx && (!keep || keep.test(norm(tx)))) out.push(tx);
+        }
+        return out;
+    };
+    const attrs = (sel, attr, limit) => {
+        const out = [];
+        const nodes = document.querySelectorAll(sel);
+        for (let i = 0; i < nodes.length && i < limit; i++) out.push(nodes[i].getAttribute(attr) || "");
+        return out;
+    };
+    const timeEl = document.querySelector("time");
+    return {
+        url: location.href,
+        datetime: timeEl ? timeEl.getAttribute("datetime") : null,
+        headings: texts("h1, h2", Infinity),
+        spans: texts("main span", 250),
+        likeTexts: texts("main section span, main section a, main section div", 450, /curtida|likes/),
+        likeLabels: attrs('[aria-label*="like" i], [aria-label*="curtida" i]', "aria-label", 200),
+        viewTexts: texts("main span, main div, main a", 600, /visualiz|views|reproduc|plays/),
+        hasVideo: !!document.querySelector("video"),
+        hasCarouselNav: !!document.querySelector(
+            'button[aria-label*="Next"], button[aria-label*="Próximo"], ' +
+            'button[aria-label*="Previous"], button[aria-label*="Anterior"]'
+        ),
+        headerLinks: attrs('header a[href^="/"]', "href", 8),
+    };
+}
+"""
 
-    try:
-        candidates = page.query_selector_all('[aria-label*="like" i], [aria-label*="curtida" i]')
-        for c in candidates[:200]:
-            tx = (c.get_attribute("aria-label") or "").strip()
+INSIGHTS_TEXTS_JS = r"""
+() => {
+    const out = [];
+    const nodes = document.querySelectorAll("div[role='dialog'] span, div[role='dialog'] div");
+    for (let i = 0; i < nodes.length && i < 900; i++) {
+        const tx = (nodes[i].innerText || "").trim();
+        if (tx) out.push(tx);
+    }
+    return out;
+}
+"""
+
+
+def extract_likes(snap: Dict[str, Any]) -> Optional[int]:
+    for tx in snap.get("likeTexts") or []:
+        low = unidecode(tx.lower())
+        if "curtida" in low or "likes" in low:
             n = _parse_count(tx)
             if n is not None:
                 return n
-    except Exception:
-        pass
+
+    for tx in snap.get("likeLabels") or []:
+        n = _parse_count(tx.strip())
+        if n is not None:
+            return n
 
     return None
 
 
-def extract_views(page, media_type: str) -> Optional[int]:
+def extract_views(snap: Dict[str, Any], media_type: str) -> Optional[int]:
     if media_type.lower() not in ("reels", "vídeo", "video"):
         return None
 
-    try:
-        candidates = page.query_selector_all("main span, main div, main a")
-        for c in candidates[:600]:
-            tx = (c.inner_text() or "").strip()
-            if not tx:
-                continue
-            low = unidecode(tx.lower())
-            if "visualiz" in low or "views" in low or "reproduc" in low or "plays" in low:
-                n = _parse_count(tx)
-                if n is not None:
-                    return n
-    except Exception:
-        pass
+    for tx in snap.get("viewTexts") or []:
+        low = unidecode(tx.lower())
+        if "visualiz" in low or "views" in low or "reproduc" in low or "plays" in low:
+            n = _parse_count(tx)
+            if n is not None:
+                return n
 
     return None
 
 
-def try_extract_insights(page) -> Dict[str, Optional[int]]:
+def parse_insights_text(joined: str) -> Dict[str, Optional[int]]:
     out = {"Reach": None, "Shares": None}
+    j = unidecode(joined.lower())
 
-    btn_selectors = [
-        'text="Ver insights"',
-        'text="Ver insight"',
-        'text="View insights"',
-        'a:has-text("Ver insights")',
-        'button:has-text("Ver insights")',
-        'a:has-text("View insights")',
-        'button:has-text("View insights")',
+    reach_patterns = [
+        r"contas alcancadas\s*([\d\.,]+)\s*(mil|mi|m|k)?",
+        r"accounts reached\s*([\d\.,]+)\s*(mil|mi|m|k)?",
+        r"alcancadas\s*([\d\.,]+)\s*(mil|mi|m|k)?",
+        r"reached\s*([\d\.,]+)\s*(mil|mi|m|k)?",
     ]
+    for pat in reach_patterns:
+        m = re.search(pat, j, flags=re.IGNORECASE)
+        if m:
+            raw = m.group(1)
+            suf = m.group(2) or ""
+            out["Reach"] = _parse_count(f"{raw} {suf}".strip())
+            break
 
-    insights_clicked = False
-    for sel in btn_selectors:
-        try:
-            el = page.query_selector(sel)
-            if el:
-                el.click()
-                page.wait_for_timeout(1500)
-                insights_clicked = True
-                break
-        except Exception:
-            continue
+    shares_patterns = [
+        r"compartilhamentos\s*([\d\.,]+)\s*(mil|mi|m|k)?",
+        r"shares\s*([\d\.,]+)\s*(mil|mi|m|k)?",
+        r"compartilhou\s*([\d\.,]+)\s*(mil|mi|m|k)?",
+    ]
+    for pat in shares_patterns:
+        m = re.search(pat, j, flags=re.IGNORECASE)
+        if m:
+            raw = m.group(1)
+            suf = m.group(2) or ""
+            out["Shares"] = _parse_count(f"{raw} {suf}".strip())
+            break
 
-    if not insights_clicked:
-        return out
+    return out
 
-    try:
-        nodes = page.query_selector_all("div[role='dialog'] span, div[role='dialog'] div")
-        texts = []
-        for n in nodes[:900]:
-            tx = (n.inner_text() or "").strip()
-            if tx:
-                texts.append(tx)
-
-        joined = "\n".join(texts)
-        j = unidecode(joined.lower())
-
-        reach_patterns = [
-            r"contas alcancadas\s*([\d\.,]+)\s*(mil|mi|m|k)?",
-            r"accounts reached\s*([\d\.,]+)\s*(mil|mi|m|k)?",
-            r"alcancadas\s*([\d\.,]+)\s*(mil|mi|m|k)?",
-            r"reached\s*([\d\.,]+)\s*(mil|mi|m|k)?",
-        ]
-        for pat in reach_patterns:
-            m = re.search(pat, j, flags=re.IGNORECASE)
-            if m:
-                raw = m.group(1)
-                suf = m.group(2) or ""
-                out["Reach"] = _parse_count(f"{raw} {suf}".strip())
-                break
 
-        shares_patterns = [
-            r"compartilhamentos\s*([\d\.,]+)\s*(mil|mi|m|k)?",
-            r"shares\s*([\d\.,]+)\s*(mil|mi|m|k)?",
-            r"compartilhou\s*([\d\.,]+)\s*(mil|mi|m|k)?",
-        ]
-        for pat in shares_patterns:
-            m = re.search(pat, j, flags=re.IGNORECASE)
-            if m:
-                raw = m.group(1)
-                suf = m.group(2) or ""
-                out["Shares"] = _parse_count(f"{raw} {suf}".strip())
-                break
+# um seletor só para todas as variantes do botão ("Ver insights", "Ver insight",
+# "View insights"), seja link, botão ou texto solto
+INSIGHTS_BUTTON_SELECTOR = r"text=/^\s*(ver|view) insights?\s*$/i"
 
-    except Exception:
-        return out
 
-    return out
+async def try_extract_insights(page) -> Optional[Dict[str, Optional[int]]]:
+    """Reach/Shares do painel de Insights; None quando o post não tem o botão."""
+    out = {"Reach": None, "Shares": None}
 
-# ======================== LOGIN AUTOMÁTICO ========================
+    try:
+        el = await page.query_selector(INSIGHTS_BUTTON_SELECTOR)
+    except Exception:
+        el = None
+    if not el:
+        return None
 
-def login_instagram(page) -> bool:
     try:
-        page.goto("https://www.instagram.com/accounts/login/", timeout=90000)
-        page.wait_for_timeout(4000)
+        await el.click()
+        if not await wait_ready("insights", page.wait_for_selector("div[role='dialog']",
+                                                                   timeout=READY_TIMEOUT_MS["insights"])):
+            return out
+    except Exception:
+        return out
 
-        if not IG_PASS:
-            print("[ERRO] IG_PASS vazio. Configure a variável de ambiente IG_PASS.")
-            return False
+    try:
+        texts = await page.evaluate(INSIGHTS_TEXTS_JS)
+        return parse_insights_text("\n".join(texts))
+    except Exception:
+        return out
 
-        page.fill('input[name="username"]', IG_USER)
-        page.fill('input[name="password"]', IG_PASS)
-        human_delay()
-        page.click('button[type="submit"]')
+# ======================== CAPTURA DE JSON ========================
+# Exemplos gravados dessas respostas ficam em fixtures/capture/ e podem ser
+# passados direto para ResponseCapture.feed() para testar o parser offline.
 
-        page.wait_for_load_state("networkidle", timeout=90000)
-        page.wait_for_timeout(5000)
+CAPTURE_URL_HINTS = ("/graphql/query", "/api/graphql", "/api/v1/")
 
-        if "accounts/login" in page.url.lower():
-            print("[ERRO] Parece que o login falhou. Verifique usuário e senha.")
-            return False
 
-        print("[OK] Login realizado com sucesso.")
-        return True
-    except Exception as e:
-        print("[ERRO] Falha ao fazer login:", e)
-        return False
+def shortcode_from_url(url: str) -> str:
+    m = SHORTCODE_RE.search(url or "")
+    return m.group(1) if m else ""
 
-# ======================== COLETA DOS LINKS ========================
 
-def collect_profile_post_urls(page, username: str, max_posts: int) -> List[str]:
-    urls: List[str] = []
-    seen: Set[str] = set()
+def iter_media_nodes(payload: Any):
+    """Percorre o JSON e devolve todo objeto que parece uma mídia (tem shortcode e data)."""
+    stack = [payload]
+    while stack:
+        cur = stack.pop()
+        if isinstance(cur, dict):
+            code = cur.get("code") or cur.get("shortcode")
+            if isinstance(code, str) and ("taken_at" in cur or "taken_at_timestamp" in cur):
+                yield cur
+            stack.extend(cur.values())
+        elif isinstance(cur, list):
+            stack.extend(cur)
 
-    profile_url = f"https://www.instagram.com/{username}/"
-    print(f"  > Abrindo perfil {profile_url}")
 
-    for attempt in range(2):
-        try:
-            page.goto(profile_url, timeout=90000)
-            page.wait_for_timeout(4000)
-            break
-        except (PWTimeout, PWError) as e:
-            print(f"  [WARN] Erro ao abrir perfil @{username}, tentativa {attempt+1}/2: {e}")
-            if attempt == 1:
-                return []
-            page.wait_for_timeout(3000)
+def _first_int(node: Dict[str, Any], *keys: str) -> Optional[int]:
+    for k in keys:
+        v = node.get(k)
+        if isinstance(v, dict):
+            v = v.get("count")
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            return int(v)
+    return None
 
-    try:
-        anchors = page.query_selector_all('a[href*="/p/"], a[href*="/reel/"]')
-    except PWError as e:
-        print(f"[ERRO] Coleta de links em @{username}: {e}")
-        return []
 
-    for a in anchors:
-        try:
-            href = a.get_attribute("href") or ""
-        except Exception:
-            continue
-        if not href:
-            continue
-        if href.startswith("/"):
-            href = "https://www.instagram.com" + href
-        href = href.split("?")[0]
-        if ("/p/" in href or "/reel/" in href) and href not in seen:
-            seen.add(href)
-            urls.append(href)
-            if len(urls) >= max_posts:
-                break
+def media_fields(node: Dict[str, Any]) -> Dict[str, Any]:
+    """Normaliza uma mídia da API (v1 ou GraphQL antigo) para os campos usados na linha."""
+    out: Dict[str, Any] = {"shortcode": node.get("code") or node.get("shortcode")}
 
-    print(f"  > Encontrados {len(urls)} posts na primeira tela de @{username}")
-    return urls
+    ts = node.get("taken_at") or node.get("taken_at_timestamp")
+    if isinstance(ts, (int, float)):
+        out["taken_at"] = datetime.fromtimestamp(ts, tz=tz.UTC)
 
-# ======================== EXTRAÇÃO DO POST ========================
+    caption = node.get("caption")
+    if isinstance(caption, dict):
+        out["caption"] = caption.get("text") or ""
+    elif isinstance(caption, str):
+        out["caption"] = caption
+    else:
+        edges = (node.get("edge_media_to_caption") or {}).get("edges") or []
+        if edges:
+            out["caption"] = ((edges[0] or {}).get("node") or {}).get("text") or ""
+        elif "edge_media_to_caption" in node or "caption" in node:
+            out["caption"] = ""
 
-def extract_post(page, url: str, profile: Optional[str] = None) -> Optional[Dict[str, Any]]:
-    for attempt in range(OPEN_POST_RETRIES):
-        try:
-            page.goto(url, timeout=90000, wait_until="domcontentloaded")
-            page.wait_for_timeout(3000)
+    typename = node.get("__typename") or ""
+    if node.get("product_type") == "clips":
+        out["media_type"] = "Reels"
+    elif node.get("media_type") == 8 or typename in ("GraphSidecar", "XDTGraphSidecar"):
+        out["media_type"] = "Carrossel"
+    elif node.get("media_type") == 2 or node.get("is_video") or typename in ("GraphVideo", "XDTGraphVideo"):
+        out["media_type"] = "vídeo"
+    elif node.get("media_type") == 1 or typename in ("GraphImage", "XDTGraphImage"):
+        out["media_type"] = "Foto"
 
-            dt_local: Optional[datetime] = None
-            data_str = ""
-            try:
-                time_el = page.query_selector("time")
-                if not time_el:
-                    page.wait_for_timeout(1500)
-                    time_el = page.query_selector("time")
-                if time_el:
-                    dtdt = time_el.get_attribute("datetime")
-                    if dtdt:
-                        dt_utc = datetime.fromisoformat(dtdt.replace("Z", "+00:00"))
-                        dt_local = to_user_tz(dt_utc)
-                        data_str = dt_local.strftime("%Y-%m-%d %H:%M:%S")
-            except Exception:
-                dt_local = None
-                data_str = ""
+    out["likes"] = _first_int(node, "like_count", "edge_media_preview_like", "edge_liked_by")
+    out["views"] = _first_int(node, "play_count", "ig_play_count", "view_count", "video_view_count",
+                              "video_play_count")
 
-            caption = ""
-            try:
-                texts = page.query_selector_all("h1, h2")
-                for t in texts:
-                    txt = (t.inner_text() or "").strip()
-                    if txt:
-                        caption += txt + " "
-            except Exception:
-                pass
+    if node.get("timeline_pinned_user_ids") or node.get("pinned_for_users"):
+        out["pinned"] = True
 
-            if not caption:
-                try:
-                    spans = page.query_selector_all("main span")
-                    capture = []
-                    for s in spans[:250]:
-                        txt = (s.inner_text() or "").strip()
-                        if txt:
-                            capture.append(txt)
-                    if capture:
-                        capture_sorted = sorted(set(capture), key=lambda x: (-len(x), x))
-                        caption = capture_sorted[0]
-                except Exception:
-                    caption = ""
-
-            media_type = "Foto"
-            try:
-                current_url = page.url
-                if "/reel/" in current_url:
-                    media_type = "Reels"
-                else:
-                    video = page.query_selector("video")
-                    if video:
-                        media_type = "vídeo"
-                    else:
-                        next_btn = page.query_selector('button[aria-label*="Next"], button[aria-label*="Próximo"]')
-                        prev_btn = page.query_selector('button[aria-label*="Previous"], button[aria-label*="Anterior"]')
-                        if next_btn or prev_btn:
-                            media_type = "Carrossel"
-            except Exception:
-                pass
+    user = node.get("user") or node.get("owner") or {}
+    if isinstance(user, dict) and user.get("username"):
+        out["username"] = user["username"]
 
-            perfil_final = profile or ""
-            if not perfil_final:
-                try:
-                    header_links = page.query_selector_all('header a[href^="/"]')
-                    for a in header_links[:8]:
-                        href = a.get_attribute("href") or ""
-                        if not href:
-                            continue
-                        u = href.strip("/").split("/")[0]
-                        if u and u not in ("explore", "reel", "p"):
-                            perfil_final = u
-                            break
-                except Exception:
-                    pass
-
-            likes = extract_likes(page)
-            views = extract_views(page, media_type)
-            insights = try_extract_insights(page)
-            reach = insights.get("Reach")
-            shares = insights.get("Shares")
-
-            return {
-                "PERFIL": perfil_final,
-                "Data/Hora da Publicação": data_str,
-                "_DT_LOCAL": dt_local,
-                "Legenda/Descrição do Post": caption.strip(),
-                "Tema Central (assunto principal)": extract_main_theme(caption),
-                "Tipo de Mídia": media_type,
-                "Tom da Comunicação": classify_tone(caption),
-                "Hashtags utilizadas": extract_hashtags(caption),
-                "Likes": likes,
-                "Views": views,
-                "Shares": shares,
-                "Reach": reach,
-                "URL": url
-            }
-
-        except (PWTimeout, PWError) as e:
-            print(f"    [WARN] Erro ao abrir {url}, tentativa {attempt+1}/{OPEN_POST_RETRIES}: {e}")
-            page.wait_for_timeout(2000)
-            continue
-        except Exception as e:
-            print(f"    [ERRO] Falha inesperada em {url}: {e}")
-            return None
+    return {k: v for k, v in out.items() if v is not None}
 
-    return None
 
-# ======================== MAIN ========================
+class ResponseCapture:
+    """Escuta page.on("response") e guarda, por shortcode, os campos vistos em JSON."""
 
-def main():
-    usernames = parse_profiles(PROFILES_RAW)
-    if not usernames:
-        print("Nenhum perfil válido em PROFILES_RAW.")
-        return
+    def __init__(self):
+        self.media: Dict[str, Dict[str, Any]] = {}
+        self.payloads = 0
+        self._events: Dict[str, asyncio.Event] = {}
 
-    rows: List[Dict[str, Any]] = []
+    def reset(self):
+        """Esquece o que foi capturado (a página passou para outro perfil/post)."""
+        self.media.clear()
+        self._events.clear()
 
-    now_local = datetime.now(USER_TZ)
-    cutoff = now_local - timedelta(hours=WINDOW_HOURS)
+    def attach(self, page):
+        page.on("response", self._on_response)
 
-    with sync_playwright() as pw:
-        browser = pw.chromium.launch(
-            headless=True,
-            args=["--disable-blink-features=AutomationControlled"]
-        )
+    async def _on_response(self, response):
+        try:
+            if not any(h in response.url for h in CAPTURE_URL_HINTS):
+                return
+            ctype = (response.headers or {}).get("content-type", "")
+            if "json" not in ctype and "javascript" not in ctype:
+                return
+            payload = await response.json()
+        except Exception:
+            return
+        self.feed(payload)
 
-        context = browser.new_context(
-            viewport={"width": 1280, "height": 800},
-            user_agent=(
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/123.0.0.0 Safari/537.36"
-            )
-        )
+    def feed(self, payload: Any) -> int:
+        n = 0
+        for node in iter_media_nodes(payload):
+            fields = media_fields(node)
+            code = fields.get("shortcode")
+            if not code:
+                continue
+            merged = self.media.setdefault(code, {})
+            merged.update(fields)
+            if code in self._events and "taken_at" in merged:
+                self._events[code].set()
+            n += 1
+        if n:
+            self.payloads += 1
+        return n
 
-        context.add_init_script("""
-            Object.defineProperty(navigator, 'webdriver', {get: () => undefined});
-            window.chrome = { runtime: {} };
-            Object.defineProperty(navigator, 'plugins', {get: () => [1,2,3]});
-            Object.defineProperty(navigator, 'languages', {get: () => ['pt-BR','pt','en']});
-        """)
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        found = self.media.get(shortcode_from_url(url))
+        if found and "taken_at" in found:
+            return found
+        return None
 
-        # Login
-        login_page = context.new_page()
-        if not login_instagram(login_page):
-            try:
-                login_page.close()
-            except Exception:
-                pass
-            context.close()
-            browser.close()
+    async def wait_for(self, url: str):
+        """Termina quando chegar um payload com a mídia de `url`."""
+        if self.get(url):
             return
-        login_page.close()
+        code = shortcode_from_url(url)
+        ev = self._events.setdefault(code, asyncio.Event())
+        await ev.wait()
 
-        # Coleta por perfil
-        for idx, u in enumerate(usernames, start=1):
-            print(f"\n[Perfil {idx}/{len(usernames)}] @{u}")
-            page = context.new_page()
+# ======================== FILTRO DE REDE ========================
 
-            try:
-                post_urls = collect_profile_post_urls(page, u, WINDOW_HOURS)
+ANALYTICS_URL_HINTS = (
+    "/logging_client_events", "/ajax/bz", "/ajax/logging", "graph.instagram.com/logging",
+    "facebook.com/tr", "connect.facebook.net", "google-analytics.com", "googletagmanager.com",
+    "doubleclick.net",
+)
 
-                old_streak = 0  # posts seguidos fora da janela
+ROUTE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "full": {"types": set(), "url_hints": ()},
+    "metadata-only": {"types": {"image", "media", "font"}, "url_hints": ANALYTICS_URL_HINTS},
+}
 
-                for jdx, url in enumerate(post_urls, start=1):
-                    print(f"    [{jdx}/{len(post_urls)}] {url}")
+# tamanho típico (bytes) de cada tipo bloqueado, usado para estimar a economia
+EST_BYTES_BY_TYPE = {
+    "image": 60_000,
+    "media": 900_000,
+    "font": 40_000,
+    "script": 30_000,
+    "xhr": 2_000,
+    "fetch": 2_000,
+}
 
-                    row = extract_post(page, url, profile=u)
-                    if not row:
-                        human_delay()
-                        continue
 
-                    dt_local = row.get("_DT_LOCAL")
+class RouteFilter:
+    """Filtro de requisições por perfil nomeado, com contadores por tipo de recurso."""
 
-                    # Se a data existe e está fora da janela, ignora e tenta parar cedo
-                    if isinstance(dt_local, datetime) and dt_local < cutoff:
-                        print("      > Fora da janela de tempo, ignorado.")
-                        old_streak += 1
+    def __init__(self, profile: str = ROUTE_PROFILE):
+        if profile not in ROUTE_PROFILES:
+            raise ValueError(f"Perfil de rede desconhecido: {profile!r} (use {sorted(ROUTE_PROFILES)})")
+        self.profile = profile
+        self.block_types: Set[str] = ROUTE_PROFILES[profile]["types"]
+        self.block_hints: Tuple[str, ...] = ROUTE_PROFILES[profile]["url_hints"]
+        self.allowed: Counter = Counter()
+        self.blocked: Counter = Counter()
+        self.saved_bytes = 0
 
-                        # Como a grade vem do mais recente para o mais antigo,
-                        # vários seguidos fora da janela indicam que o resto também estará
-                        if old_streak >= 6:
-                            print("      > Sequência fora da janela, parando coleta deste perfil.")
-                            break
+    async def install(self, context):
+        if not self.block_types and not self.block_hints:
+            # "full": nada a bloquear, só conta o que passa (sem custo de route)
+            context.on("request", lambda req: self.allowed.update([req.resource_type]))
+            return
+        await context.route("**/*", self._handle)
 
-                        human_delay()
-                        continue
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if resource_type in self.block_types:
+            return True
+        return any(h in url for h in self.block_hints)
 
-                    # Se chegou aqui, está dentro da janela ou não foi possível ler a data
-                    old_streak = 0
-                    rows.append(row)
-                    human_delay()
+    async def _handle(self, route):
+        req = route.request
+        rtype = req.resource_type
+        if self.should_block(rtype, req.url):
+            self.blocked[rtype] += 1
+            self.saved_bytes += EST_BYTES_BY_TYPE.get(rtype, 0)
+            try:
+                await route.abort()
+            except PWError:
+                pass
+            return
+        self.allowed[rtype] += 1
+        try:
+            # fallback (e não continue_) deixa outros handlers de rota, como o replay
+            # offline de benchmarks/replay.py, decidirem de onde vem a resposta
+            await route.fallback()
+        except PWError:
+            pass
 
-            except Exception as e:
-                print(f"[ERRO PERFIL @{u}] {e}")
+    def summary(self) -> str:
+        lines = [f"[REDE] Perfil '{self.profile}': "
+                 f"{sum(self.allowed.values())} permitidas, {sum(self.blocked.values())} bloqueadas, "
+                 f"~{self.saved_bytes / 1_048_576:.1f} MB economizados (estimado)"]
+        for rtype in sorted(set(self.allowed) | set(self.blocked)):
+            lines.append(f"  {rtype:<12} permitidas={self.allowed[rtype]:<6} bloqueadas={self.blocked[rtype]}")
+        return "\n".join(lines)
 
-            finally:
-                try:
-                    page.close()
-                except Exception:
-                    pass
-                human_delay(1.0, 2.0)
+# ======================== LOGIN AUTOMÁTICO ========================
 
-        context.close()
-        browser.close()
+async def login_instagram(page) -> bool:
+    try:
+        await page.goto("https://www.instagram.com/accounts/login/", timeout=90000)
+        await wait_ready("login_form", page.wait_for_selector('input[name="username"]',
+                                                             timeout=READY_TIMEOUT_MS["login_form"]))
+
+        if not IG_PASS:
+            print("[ERRO] IG_PASS vazio. Configure a variável de ambiente IG_PASS.")
+            return False
+
+        await page.fill('input[name="username"]', IG_USER)
+        await page.fill('input[name="password"]', IG_PASS)
+        await human_delay()
+        await page.click('button[type="submit"]')
+
+        await wait_ready(
+            "login_done",
+            page.wait_for_url(lambda u: "accounts/login" not in u.lower(),
+                              timeout=READY_TIMEOUT_MS["login_done"]),
+            page.wait_for_selector('#slfErrorAlert, [role="alert"]', timeout=READY_TIMEOUT_MS["login_done"]),
+        )
+
+        if "accounts/login" in page.url.lower():
+            print("[ERRO] Parece que o login falhou. Verifique usuário e senha.")
+            return False
+
+        print("[OK] Login realizado com sucesso.")
+        return True
+    except Exception as e:
+        print("[ERRO] Falha ao fazer login:", e)
+        return False
+
+
+# endpoint barato que só devolve JSON com a sessão válida (sem ela, redireciona ao login)
+SESSION_CHECK_URL = "https://www.instagram.com/api/v1/accounts/edit/web_form_data/"
+
+
+def load_session_state(path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    path = SESSION_STATE_FILE if path is None else path
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[WARN] Sessão salva ilegível ({path}): {e}")
+        return None
+
+
+async def save_session_state(context, path: Optional[str] = None):
+    path = SESSION_STATE_FILE if path is None else path
+    if not path:
+        return
+    state = await context.storage_state()
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.chmod(tmp, 0o600)
+    os.replace(tmp, path)
+
+
+async def session_valid(context) -> bool:
+    cookies = await context.cookies("https://www.instagram.com")
+    if not any(c["name"] == "sessionid" and c["value"] for c in cookies):
+        return False
+    payload = await context_get_json(context, SESSION_CHECK_URL)
+    return isinstance(payload, dict) and payload.get("status") == "ok"
+
+
+async def ensure_login(pool) -> bool:
+    """Reaproveita a sessão do contexto (carregada de SESSION_STATE_FILE) se ela ainda
+    vale; senão faz o login e salva a sessão nova."""
+    if await session_valid(pool.context):
+        print("[OK] Sessão salva ainda válida; login pulado.")
+        return True
+    slot = await pool.acquire()
+    try:
+        ok = await login_instagram(slot.page)
+    finally:
+        await pool.release(slot)
+    if ok:
+        await save_session_state(pool.context)
+    return ok
+
+# ======================== COLETA DOS LINKS ========================
+
+GRID_ANCHORS_JS = r"""
+() => Array.from(document.querySelectorAll('a[href*="/p/"], a[href*="/reel/"]')).map((a) => ({
+    href: a.getAttribute("href") || "",
+    pinned: !!a.querySelector('svg[aria-label*="Pinned" i], svg[aria-label*="Fixad" i]'),
+}))
+"""
+
+GRID_STALE_SCROLLS = 2  # rolagens seguidas sem link novo = fim da grade
+
+
+def _known_date(url: str, capture: Optional[ResponseCapture],
+                store: Optional["PostStore"]) -> Optional[datetime]:
+    media = capture.get(url) if capture else None
+    if media:
+        return media["taken_at"]
+    ts = store.published_ts(url) if store else None
+    return datetime.fromtimestamp(ts, tz=tz.UTC) if ts is not None else None
+
+
+async def iter_profile_post_urls(page, username: str, cutoff: datetime,
+                                 limiter: Optional[AdaptiveRateLimiter] = None,
+                                 capture: Optional[ResponseCapture] = None,
+                                 store: Optional["PostStore"] = None,
+                                 max_posts: int = MAX_POSTS_PER_PROFILE):
+    """Rola a grade do perfil e devolve (url, fixado) conforme os links aparecem.
+
+    Para assim que um post não fixado com data conhecida (JSON da grade ou base local)
+    fica antes do `cutoff`; posts fixados nunca disparam a parada.
+    """
+    seen: Set[str] = set()
+
+    profile_url = f"https://www.instagram.com/{username}/"
+    print(f"  > Abrindo perfil {profile_url}")
+
+    try:
+        await navigate(page, profile_url, limiter, timeout=90000)
+        await wait_ready(
+            "profile_grid",
+            page.wait_for_selector('a[href*="/p/"], a[href*="/reel/"]',
+                                   timeout=READY_TIMEOUT_MS["profile_grid"]),
+            page.wait_for_selector("text=/conta é privada|account is private|"
+                                   "ainda não há nenhuma publicação|no posts yet/i",
+                                   timeout=READY_TIMEOUT_MS["profile_grid"]),
+        )
+    except (PWTimeout, PWError) as e:
+        # sem espera aqui: quem chama decide quando tentar de novo
+        print(f"  [WARN] Erro ao abrir perfil @{username}: {e}")
+        raise
+
+    stale = 0
+    while len(seen) < max_posts and stale < GRID_STALE_SCROLLS:
+        try:
+            with TELEMETRY.span("leitura da grade"):
+                anchors = await page.evaluate(GRID_ANCHORS_JS)
+        except PWError as e:
+            print(f"[ERRO] Coleta de links em @{username}: {e}")
+            return
+
+        new = 0
+        for a in anchors:
+            href = a.get("href") or ""
+            if not href:
+                continue
+            if href.startswith("/"):
+                href = "https://www.instagram.com" + href
+            href = href.split("?")[0]
+            if not ("/p/" in href or "/reel/" in href) or href in seen:
+                continue
+            seen.add(href)
+            new += 1
+
+            media = capture.get(href) if capture else None
+            pinned = bool(a.get("pinned") or (media and media.get("pinned")))
+            published = _known_date(href, capture, store)
+            if published is not None and published < cutoff:
+                if not pinned and len(seen) > MAX_PINNED_POSTS:
+                    print(f"  > @{username}: grade passou da janela após {len(seen) - 1} posts")
+                    return
+                continue  # fixado (ou possível fixado) antigo: não abre, mas segue
+
+            yield href, pinned
+            if len(seen) >= max_posts:
+                return
+
+        stale = 0 if new else stale + 1
+        n_before = len(anchors)
+        try:
+            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+        except PWError:
+            return
+        await wait_ready(
+            "grid_scroll",
+            page.wait_for_function(
+                f"document.querySelectorAll('a[href*=\"/p/\"], a[href*=\"/reel/\"]').length > {n_before}",
+                timeout=READY_TIMEOUT_MS["grid_scroll"],
+            ),
+        )
+
+# ======================== EXTRAÇÃO DO POST ========================
+
+def build_post_row(snap: Dict[str, Any], url: str, profile: Optional[str] = None,
+                   insights: Optional[Dict[str, Optional[int]]] = None,
+                   media: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Monta a linha do CSV. Campos de `media` (JSON capturado) têm prioridade sobre o DOM."""
+    media = media or {}
+
+    dt_local: Optional[datetime] = None
+    data_str = ""
+    try:
+        if media.get("taken_at"):
+            dt_local = to_user_tz(media["taken_at"])
+        elif snap.get("datetime"):
+            dt_utc = datetime.fromisoformat(snap["datetime"].replace("Z", "+00:00"))
+            dt_local = to_user_tz(dt_utc)
+        if dt_local:
+            data_str = dt_local.strftime("%Y-%m-%d %H:%M:%S")
+    except Exception:
+        dt_local = None
+        data_str = ""
+
+    caption = ""
+    if "caption" in media:
+        caption = media["caption"]
+    else:
+        for txt in snap.get("headings") or []:
+            caption += txt + " "
+
+        if not caption:
+            capture = snap.get("spans") or []
+            if capture:
+                capture_sorted = sorted(set(capture), key=lambda x: (-len(x), x))
+                caption = capture_sorted[0]
+
+    media_type = "Foto"
+    if "/reel/" in (snap.get("url") or url):
+        media_type = "Reels"
+    elif media.get("media_type"):
+        media_type = media["media_type"]
+    elif snap.get("hasVideo"):
+        media_type = "vídeo"
+    elif snap.get("hasCarouselNav"):
+        media_type = "Carrossel"
+
+    perfil_final = profile or media.get("username") or ""
+    if not perfil_final:
+        for href in snap.get("headerLinks") or []:
+            if not href:
+                continue
+            u = href.strip("/").split("/")[0]
+            if u and u not in ("explore", "reel", "p"):
+                perfil_final = u
+                break
+
+    likes = media["likes"] if media.get("likes") is not None else extract_likes(snap)
+    views = extract_views(snap, media_type)
+    if media.get("views") is not None and media_type.lower() in ("reels", "vídeo", "video"):
+        views = media["views"]
+    insights = insights or {}
+
+    return {
+        "PERFIL": perfil_final,
+        "Data/Hora da Publicação": data_str,
+        "_DT_LOCAL": dt_local,
+        "Legenda/Descrição do Post": caption.strip(),
+        "Tema Central (assunto principal)": extract_main_theme(caption),
+        "Tipo de Mídia": media_type,
+        "Tom da Comunicação": classify_tone(caption),
+        "Hashtags utilizadas": extract_hashtags(caption),
+        "Likes": likes,
+        "Views": views,
+        "Shares": insights.get("Shares"),
+        "Reach": insights.get("Reach"),
+        "URL": url
+    }
+
+
+def media_complete(media: Optional[Dict[str, Any]]) -> bool:
+    """O JSON capturado tem tudo o que a linha usa (data, legenda, tipo e likes)?"""
+    return bool(media and media.get("taken_at") and "caption" in media
+                and media.get("media_type") and media.get("likes") is not None)
+
+
+async def extract_post(page, url: str, profile: Optional[str] = None,
+                       limiter: Optional[AdaptiveRateLimiter] = None,
+                       capture: Optional[ResponseCapture] = None,
+                       probe_insights: bool = True) -> Optional[Dict[str, Any]]:
+    """Linha do post; `_INSIGHTS` diz se o botão de Insights existia (None: não sondado).
+
+    Uma tentativa só: PWTimeout/PWError sobem para o pipeline, que reagenda o post
+    com backoff em vez de segurar a página esperando.
+    """
+    try:
+        await navigate(page, url, limiter, timeout=90000, wait_until="domcontentloaded")
+        waiters = [page.wait_for_selector("time", timeout=READY_TIMEOUT_MS["post"])]
+        if capture:
+            waiters.append(capture.wait_for(url))
+        await wait_ready("post", *waiters)
+
+        media = capture.get(url) if capture else None
+        snap: Dict[str, Any] = {"url": page.url}
+        if not media_complete(media):
+            # payload ausente ou incompleto: o DOM completa o que faltar (media tem prioridade)
+            with TELEMETRY.span("snapshot do DOM"):
+                snap = await page.evaluate(POST_SNAPSHOT_JS)
+
+        insights = None
+        if probe_insights:
+            with TELEMETRY.span("insights"):
+                insights = await try_extract_insights(page)
+        else:
+            TELEMETRY.inc("insights pulado")
+        with TELEMETRY.span("extratores"):
+            row = build_post_row(snap, url, profile, insights, media)
+        row["_INSIGHTS"] = (insights is not None) if probe_insights else None
+        return row
+
+    except (PWTimeout, PWError):
+        raise
+    except Exception as e:
+        print(f"    [ERRO] Falha inesperada em {url}: {e}")
+        return None
+
+# ======================== COLETA VIA HTTP ========================
+# Caminho leve para os posts: a mesma API JSON que a página do post consome, pedida
+# direto por um cliente HTTP com conexões persistentes (HTTP/2 se o pacote h2 estiver
+# instalado) e os cookies da sessão do navegador. O JSON passa pelo mesmo parser da
+# captura (media_fields) e vira a mesma linha de extract_post.
+
+IG_APP_ID = "936619743392459"  # app web do Instagram (cabeçalho X-IG-App-ID)
+MEDIA_INFO_URL = "https://www.instagram.com/api/v1/media/{media_id}/info/"
+SHORTCODE_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+
+
+def media_id_from_shortcode(shortcode: str) -> int:
+    """O shortcode é o id da mídia em base 64 (os 11 primeiros caracteres)."""
+    n = 0
+    for ch in shortcode[:11]:
+        n = n * 64 + SHORTCODE_ALPHABET.index(ch)
+    return n
+
+
+def json_request_url(url: str) -> str:
+    """URL efetiva de um pedido de JSON: a original ou a do replay offline."""
+    if not REPLAY_BASE_URL:
+        return url
+    return f"{REPLAY_BASE_URL}/__replay__?url={quote(url, safe='')}"
+
+
+class HttpFetcher:
+    """Cliente HTTP compartilhado pelos workers de extração, com a sessão do `pool`."""
+
+    def __init__(self, client, pool, limiter: Optional[AdaptiveRateLimiter] = None):
+        self.client = client
+        self.pool = pool
+        self.limiter = limiter
+        self.failures = 0
+        self.disabled = False
+        self.stats: Counter = Counter()
+        self._reloaded = False
+
+    @classmethod
+    async def open(cls, pool, limiter: Optional[AdaptiveRateLimiter] = None) -> Optional["HttpFetcher"]:
+        try:
+            import httpx
+        except ImportError:
+            print("[WARN] httpx não instalado (pip install httpx[http2]); posts só pelo navegador.")
+            return None
+        client = httpx.AsyncClient(
+            http2=importlib.util.find_spec("h2") is not None,
+            timeout=HTTP_TIMEOUT_S,
+            follow_redirects=False,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+            headers={
+                "User-Agent": CONTEXT_OPTIONS["user_agent"],
+                "Accept": "application/json",
+                "X-IG-App-ID": IG_APP_ID,
+                "X-Requested-With": "XMLHttpRequest",
+                "Referer": "https://www.instagram.com/",
+            },
+        )
+        fetcher = cls(client, pool, limiter)
+        await fetcher.load_cookies()
+        return fetcher
+
+    async def load_cookies(self):
+        self.client.cookies.clear()
+        for c in await self.pool.context.cookies("https://www.instagram.com"):
+            self.client.cookies.set(c["name"], c["value"], domain=c["domain"], path=c.get("path") or "/")
+            if c["name"] == "csrftoken":
+                self.client.headers["X-CSRFToken"] = c["value"]
+
+    async def fetch_media(self, url: str) -> Optional[Dict[str, Any]]:
+        """Campos do post (formato de media_fields) ou None se o HTTP não resolveu."""
+        shortcode = shortcode_from_url(url)
+        if self.disabled or not shortcode:
+            return None
+        payload = await self.get_json(MEDIA_INFO_URL.format(media_id=media_id_from_shortcode(shortcode)))
+        if payload is None:
+            return None
+        for node in iter_media_nodes(payload):
+            media = media_fields(node)
+            if media.get("shortcode") == shortcode:
+                self.stats["ok"] += 1
+                return media
+        return await self._fail("post ausente no JSON")
+
+    async def get_json(self, url: str) -> Optional[Any]:
+        if self.disabled:
+            return None
+        if self.limiter is not None:
+            with TELEMETRY.span("limitador"):
+                await self.limiter.acquire()
+        try:
+            with TELEMETRY.span("http"):
+                resp = await self.client.get(json_request_url(url))
+        except Exception as e:
+            if self.limiter is not None and "Timeout" in type(e).__name__:
+                self.limiter.observe_timeout()
+            return await self._fail(type(e).__name__)
+
+        location = resp.headers.get("location", "")
+        if self.limiter is not None:
+            self.limiter.observe(resp.status_code, location)
+        if resp.status_code != 200:
+            return await self._fail(f"http {resp.status_code}", login="/accounts/login" in location
+                                    or resp.status_code in (401, 403))
+        try:
+            payload = resp.json()
+        except ValueError:
+            return await self._fail("resposta não é JSON", login=True)
+        self.failures = 0
+        return payload
+
+    async def _fail(self, reason: str, login: bool = False) -> None:
+        self.stats[reason] += 1
+        self.failures += 1
+        if login and not self._reloaded:
+            # a sessão pode ter girado no navegador (ex.: contexto reciclado)
+            self._reloaded = True
+            await self.load_cookies()
+        if self.failures >= HTTP_MAX_FAILURES and not self.disabled:
+            self.disabled = True
+            print(f"[WARN] {self.failures} falhas seguidas no HTTP ({reason}); seguindo só com o navegador.")
+        return None
+
+    async def close(self):
+        await self.client.aclose()
+
+    def summary(self) -> str:
+        bad = {k: v for k, v in self.stats.items() if k != "ok"}
+        return (f"[HTTP] {self.stats['ok']} posts via HTTP, falhas: {bad or 'nenhuma'}"
+                + (" (desligado na execução)" if self.disabled else ""))
+
+
+async def context_get_json(context, url: str, limiter: Optional[AdaptiveRateLimiter] = None) -> Optional[Any]:
+    """GET pela API de requisições do próprio contexto (mesmos cookies, sem renderizar nada)."""
+    if limiter is not None:
+        with TELEMETRY.span("limitador"):
+            await limiter.acquire()
+    try:
+        resp = await context.request.get(json_request_url(url), max_redirects=0, headers={
+            "X-IG-App-ID": IG_APP_ID,
+            "X-Requested-With": "XMLHttpRequest",
+        })
+    except PWError:
+        return None
+    if limiter is not None:
+        limiter.observe(resp.status, resp.headers.get("location", ""))
+    if not resp.ok:
+        return None
+    try:
+        return await resp.json()
+    except Exception:
+        return None
+
+# ======================== SONDA DE MUDANÇA ========================
+
+PROFILE_INFO_URL = "https://www.instagram.com/api/v1/users/web_profile_info/?username={username}"
+# posts de uma hashtag (o mesmo JSON que a página /explore/tags/<tag>/ consome)
+TAG_INFO_URL = "https://www.instagram.com/api/v1/tags/web_info/?tag_name={tag}"
+
+
+class ProfileProbe:
+    """Total de posts do perfil e os mais recentes, na ordem da grade: [(url, fixado)]."""
+
+    def __init__(self, count: int, items: List[Tuple[str, bool]], payload: Any):
+        self.count = count
+        self.items = items
+        self.payload = payload
+
+    @property
+    def newest(self) -> str:
+        for url, pinned in self.items:
+            if not pinned:
+                return shortcode_from_url(url)
+        return ""
+
+    def new_since(self, post_count: int, newest: str, known) -> Optional[int]:
+        """Posts novos desde a coleta anterior, se a sonda explica toda a mudança: o post
+        mais novo de então aparece (não fixado) e o total cresceu exatamente o número de
+        posts desconhecidos (`known(url)` falso) antes dele. None quando algo pode estar
+        escondido (post apagado, fixado ou novo além da sonda) e a grade precisa ser aberta."""
+        if not newest or not any(shortcode_from_url(u) == newest and not p for u, p in self.items):
+            return None
+        n_new = sum(1 for u, _ in self.urls_until(newest) if not known(u))
+        return n_new if self.count - post_count == n_new else None
+
+    def urls_until(self, shortcode: str) -> List[Tuple[str, bool]]:
+        """Itens mais novos que `shortcode`, mais os fixados que vierem depois dele."""
+        out, seen = [], False
+        for url, pinned in self.items:
+            if shortcode_from_url(url) == shortcode:
+                seen = True
+            if not seen or pinned:
+                out.append((url, pinned))
+        return out
+
+
+def parse_profile_probe(payload: Any) -> Optional[ProfileProbe]:
+    user = ((payload or {}).get("data") or {}).get("user") or {}
+    timeline = user.get("edge_owner_to_timeline_media") or {}
+    if not isinstance(timeline.get("count"), int):
+        return None
+    items = []
+    for edge in timeline.get("edges") or []:
+        media = media_fields((edge or {}).get("node") or {})
+        if media.get("shortcode"):
+            kind = "reel" if media.get("media_type") == "Reels" else "p"
+            items.append((f"https://www.instagram.com/{kind}/{media['shortcode']}/", bool(media.get("pinned"))))
+    return ProfileProbe(timeline["count"], items, payload)
+
+# ======================== ARMAZENAMENTO ========================
+
+# coluna do CSV -> coluna da tabela posts
+STORE_FIELDS = {
+    "PERFIL": "perfil",
+    "Data/Hora da Publicação": "data_str",
+    "Legenda/Descrição do Post": "caption",
+    "Tema Central (assunto principal)": "theme",
+    "Tipo de Mídia": "media_type",
+    "Tom da Comunicação": "tone",
+    "Hashtags utilizadas": "hashtags",
+    "Likes": "likes",
+    "Views": "views",
+    "Shares": "shares",
+    "Reach": "reach",
+    "URL": "url",
+}
+VOLATILE_FIELDS = ("Likes", "Views", "Shares", "Reach")
+
+
+def refresh_interval(age: timedelta) -> timedelta:
+    hours = age.total_seconds() / 3600
+    for max_age, every in REFRESH_SCHEDULE:
+        if max_age is None or hours <= max_age:
+            return timedelta(hours=every)
+    return timedelta(hours=REFRESH_SCHEDULE[-1][1])
+
+
+# Séries: uma linha por post em post_series, uma coluna (BLOB) por métrica com as
+# diferenças entre amostras consecutivas em varint zigzag, poucos bytes por amostra.
+# Métrica ausente é gravada como 0 (os valores vão somados de 1).
+
+def _varint_deltas(values: List[int], prev: int = 0) -> bytes:
+    out = bytearray()
+    for v in values:
+        d, prev = v - prev, v
+        z = (d << 1) ^ (d >> 63)
+        while z >= 0x80:
+            out.append((z & 0x7F) | 0x80)
+            z >>= 7
+        out.append(z)
+    return bytes(out)
+
+
+def _undelta(blob: Optional[bytes]) -> List[int]:
+    values: List[int] = []
+    prev = z = shift = 0
+    for b in blob or b"":
+        z |= (b & 0x7F) << shift
+        if b & 0x80:
+            shift += 7
+            continue
+        prev += (z >> 1) ^ -(z & 1)
+        values.append(prev)
+        z = shift = 0
+    return values
+
+
+def _opt(v: Optional[int]) -> int:
+    return 0 if v is None else int(v) + 1
+
+
+def _unopt(v: int) -> Optional[int]:
+    return None if v == 0 else v - 1
+
+
+def _at_age(points: List[Tuple[float, Optional[int], Optional[int]]], age_h: float, i: int) -> Optional[float]:
+    """Métrica `i` interpolada na idade `age_h` (None fora do intervalo amostrado)."""
+    known = [(p[0], p[i]) for p in points if p[i] is not None]
+    for (a0, v0), (a1, v1) in zip(known, known[1:]):
+        if a0 <= age_h <= a1:
+            return v0 if a1 == a0 else v0 + (v1 - v0) * (age_h - a0) / (a1 - a0)
+    if known and known[-1][0] == age_h:
+        return known[-1][1]
+    return None
+
+
+class PostStore:
+    """Posts já coletados, por shortcode. Campos fixos são gravados uma vez; as métricas
+    voláteis são reatualizadas com intervalo crescente conforme o post envelhece.
+
+    `base` (usado pelos workers de --shards) é a base principal, aberta só para leitura:
+    o plano de coleta a consulta, e um post reatualizado é copiado de lá para o shard."""
+
+    def __init__(self, path: str = STORE_DB, base: Optional[str] = None):
+        self.conn = sqlite3.connect(path, timeout=30, uri=True)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS posts (
+                shortcode TEXT PRIMARY KEY,
+                perfil TEXT,
+                published_ts REAL,
+                data_str TEXT,
+                caption TEXT,
+                theme TEXT,
+                media_type TEXT,
+                tone TEXT,
+                hashtags TEXT,
+                likes INTEGER,
+                views INTEGER,
+                shares INTEGER,
+                reach INTEGER,
+                url TEXT,
+                first_seen_ts REAL,
+                refreshed_ts REAL,
+                refresh_count INTEGER DEFAULT 0
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS posts_perfil_ts ON posts (perfil, published_ts)")
+        # resultado da sonda de mudança na última coleta completa do perfil
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS profile_probe (
+                perfil TEXT PRIMARY KEY,
+                post_count INTEGER,
+                newest TEXT,
+                probed_ts REAL
+            )
+        """)
+        # o perfil tem painel de Insights? (aprendido sondando os posts)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS profile_insights (
+                perfil TEXT PRIMARY KEY,
+                available INTEGER,
+                misses INTEGER DEFAULT 0,
+                probed_ts REAL
+            )
+        """)
+        # séries de engajamento (só crescem); last_* permitem anexar sem decodificar
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS post_series (
+                shortcode TEXT PRIMARY KEY,
+                perfil TEXT,
+                published_ts REAL,
+                n INTEGER,
+                last_ts INTEGER,
+                last_likes INTEGER,
+                last_views INTEGER,
+                ts BLOB,
+                likes BLOB,
+                views BLOB
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS series_perfil ON post_series (perfil, published_ts)")
+        self.conn.commit()
+        self.stats: Counter = Counter()
+        self.base = bool(base and os.path.exists(base)
+                         and os.path.abspath(base) != os.path.abspath(path))
+        if self.base:
+            self.conn.execute("ATTACH DATABASE ? AS base",
+                              (f"file:{quote(os.path.abspath(base))}?mode=ro",))
+
+    def _lookup(self, cols: str, key: str, table: str = "posts",
+                key_col: str = "shortcode") -> Optional[sqlite3.Row]:
+        r = self.conn.execute(f"SELECT {cols} FROM {table} WHERE {key_col} = ?", (key,)).fetchone()
+        if r is None and self.base:
+            r = self.conn.execute(f"SELECT {cols} FROM base.{table} WHERE {key_col} = ?", (key,)).fetchone()
+        return r
+
+    def _localize(self, key: str, table: str = "posts", key_col: str = "shortcode"):
+        if self.base:
+            self.conn.execute(f"INSERT OR IGNORE INTO {table} SELECT * FROM base.{table} WHERE {key_col} = ?",
+                              (key,))
+
+    @staticmethod
+    def key(url: str) -> str:
+        return shortcode_from_url(url) or url
+
+    def published_ts(self, url: str) -> Optional[float]:
+        r = self._lookup("published_ts", self.key(url))
+        return r["published_ts"] if r else None
+
+    def plan(self, url: str, now: datetime, cutoff: datetime) -> str:
+        """"new" (nunca visto), "old" (fora da janela), "fresh" (métricas em dia) ou "due"."""
+        decision = self._decide(self._lookup("published_ts, refreshed_ts", self.key(url)), now, cutoff)
+        self.stats[decision] += 1
+        return decision
+
+    @staticmethod
+    def _decide(r: Optional[sqlite3.Row], now: datetime, cutoff: datetime) -> str:
+        if r is None:
+            decision = "new"
+        elif r["published_ts"] is not None and r["published_ts"] < cutoff.timestamp():
+            decision = "old"
+        else:
+            published = r["published_ts"] if r["published_ts"] is not None else r["refreshed_ts"]
+            age = timedelta(seconds=max(0.0, now.timestamp() - published))
+            since = timedelta(seconds=now.timestamp() - (r["refreshed_ts"] or 0))
+            decision = "due" if since >= refresh_interval(age) else "fresh"
+        return decision
+
+    def due_urls(self, perfil: str, now: datetime, cutoff: datetime) -> List[str]:
+        """Posts da janela com métricas vencidas (para reatualizar sem passar pela grade)."""
+        sql = "SELECT url, published_ts, refreshed_ts FROM {}posts WHERE perfil = ? AND published_ts >= ?"
+        rows = {}
+        for prefix in (["base."] if self.base else []) + [""]:  # o shard sobrepõe a base
+            for r in self.conn.execute(sql.format(prefix), (perfil, cutoff.timestamp())):
+                rows[r["url"]] = r
+        return [url for url, r in rows.items() if url and self._decide(r, now, cutoff) == "due"]
+
+    def last_probe(self, perfil: str) -> Optional[sqlite3.Row]:
+        return self._lookup("post_count, newest", perfil, "profile_probe", "perfil")
+
+    def save_probe(self, perfil: str, probe: ProfileProbe, now: datetime):
+        self.conn.execute("INSERT OR REPLACE INTO profile_probe VALUES (?, ?, ?, ?)",
+                          (perfil, probe.count, probe.newest, now.timestamp()))
+        self.conn.commit()
+
+    def _post_values(self, row: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+        dt_local = row.get("_DT_LOCAL")
+        values = {col: row.get(field) for field, col in STORE_FIELDS.items()}
+        values["shortcode"] = self.key(row["URL"])
+        values["published_ts"] = dt_local.timestamp() if isinstance(dt_local, datetime) else None
+        values["first_seen_ts"] = values["refreshed_ts"] = now.timestamp()
+        return values
+
+    def save_post(self, row: Dict[str, Any], now: datetime):
+        values = self._post_values(row, now)
+        self._localize(values["shortcode"])
+        cols = ", ".join(values)
+        marks = ", ".join("?" for _ in values)
+        # campos fixos só entram se ainda estiverem vazios; métricas sempre
+        updates = ", ".join(
+            [f"{STORE_FIELDS[f]} = COALESCE(excluded.{STORE_FIELDS[f]}, {STORE_FIELDS[f]})"
+             for f in VOLATILE_FIELDS]
+            + [f"{c} = COALESCE({c}, excluded.{c})"
+               for c in ("perfil", "published_ts", "data_str", "caption", "theme",
+                         "media_type", "tone", "hashtags", "url")]
+            + ["refreshed_ts = excluded.refreshed_ts", "refresh_count = refresh_count + 1"]
+        )
+        self.conn.execute(
+            f"INSERT INTO posts ({cols}) VALUES ({marks}) ON CONFLICT(shortcode) DO UPDATE SET {updates}",
+            list(values.values()),
+        )
+        self._sample(values["shortcode"], now)
+        self.conn.commit()
+
+    def restore_post(self, row: Dict[str, Any], captured: datetime) -> bool:
+        """Repõe um post do diário só se ele não está na base: o que já foi gravado
+        não conta como nova coleta (refresh_count e refreshed_ts ficam como estão).
+        `captured` é o momento da coleta original; a série não ganha amostra, porque
+        a reposição não é uma observação nova."""
+        values = self._post_values(row, captured)
+        if self._lookup("1", values["shortcode"]) is not None:
+            return False
+        self.conn.execute(
+            f"INSERT INTO posts ({', '.join(values)}) VALUES ({', '.join('?' for _ in values)})",
+            list(values.values()),
+        )
+        self.conn.commit()
+        return True
+
+    def update_metrics(self, url: str, metrics: Dict[str, Optional[int]], now: datetime):
+        sets = [f"{STORE_FIELDS[f]} = ?" for f in VOLATILE_FIELDS if metrics.get(f) is not None]
+        params: List[Any] = [metrics[f] for f in VOLATILE_FIELDS if metrics.get(f) is not None]
+        sets += ["refreshed_ts = ?", "refresh_count = refresh_count + 1"]
+        params += [now.timestamp(), self.key(url)]
+        self._localize(self.key(url))
+        self.conn.execute(f"UPDATE posts SET {', '.join(sets)} WHERE shortcode = ?", params)
+        self._sample(self.key(url), now)
+        self.conn.commit()
+
+    # ---------- séries de engajamento ----------
+
+    def _sample(self, shortcode: str, now: datetime):
+        """Anexa as métricas atuais do post à série dele, se o post ainda é acompanhado."""
+        p = self.conn.execute("SELECT perfil, published_ts, likes, views FROM posts WHERE shortcode = ?",
+                              (shortcode,)).fetchone()
+        ts = int(now.timestamp())
+        if p is None or p["published_ts"] is None or ts - p["published_ts"] > SNAPSHOT_TRACK_HOURS * 3600:
+            return
+        likes, views = _opt(p["likes"]), _opt(p["views"])
+        s = self.conn.execute("SELECT * FROM post_series WHERE shortcode = ?", (shortcode,)).fetchone()
+        if s is None:
+            self.conn.execute(
+                "INSERT INTO post_series VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?)",
+                (shortcode, p["perfil"], p["published_ts"], ts, likes, views,
+                 _varint_deltas([ts]), _varint_deltas([likes]), _varint_deltas([views])),
+            )
+        elif ts - s["last_ts"] >= SNAPSHOT_MIN_GAP_S:
+            self.conn.execute(
+                """UPDATE post_series SET n = n + 1, last_ts = ?, last_likes = ?, last_views = ?,
+                       ts = ?, likes = ?, views = ?
+                   WHERE shortcode = ?""",
+                (ts, likes, views, s["ts"] + _varint_deltas([ts], s["last_ts"]),
+                 s["likes"] + _varint_deltas([likes], s["last_likes"]),
+                 s["views"] + _varint_deltas([views], s["last_views"]), shortcode),
+            )
+
+    @staticmethod
+    def _points(r: sqlite3.Row) -> List[Tuple[int, int, int]]:
+        return list(zip(_undelta(r["ts"]), _undelta(r["likes"]), _undelta(r["views"])))
+
+    def _write_series(self, shortcode: str, perfil: Optional[str], published_ts: Optional[float],
+                      points: List[Tuple[int, int, int]]):
+        ts, likes, views = (list(col) for col in zip(*points))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO post_series VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (shortcode, perfil, published_ts, len(points), ts[-1], likes[-1], views[-1],
+             _varint_deltas(ts), _varint_deltas(likes), _varint_deltas(views)),
+        )
+
+    def snapshot_due(self, now: datetime, limit: int = SNAPSHOT_BATCH) -> List[str]:
+        """Posts que passaram de um marco de SNAPSHOT_SCHEDULE_H sem amostra desde então,
+        do marco mais antigo para o mais recente."""
+        now_ts = now.timestamp()
+        rows = self.conn.execute(
+            """SELECT p.url, p.published_ts, s.last_ts FROM posts p
+               LEFT JOIN post_series s ON s.shortcode = p.shortcode
+               WHERE p.published_ts >= ? AND p.url IS NOT NULL""",
+            (now_ts - SNAPSHOT_TRACK_HOURS * 3600,),
+        )
+        due = []
+        for r in rows:
+            passed = [h for h in SNAPSHOT_SCHEDULE_H if r["published_ts"] + h * 3600 <= now_ts]
+            if passed and (r["last_ts"] or 0) < r["published_ts"] + passed[-1] * 3600:
+                due.append((r["published_ts"] + passed[-1] * 3600, r["url"]))
+        due.sort()
+        return [url for _, url in due[:limit]]
+
+    def series(self, url: str) -> Optional[Dict[str, Any]]:
+        """Curva de um post: amostras (idade em horas, likes, views) e a velocidade
+        (por hora) entre amostras consecutivas."""
+        r = self._lookup("*", self.key(url), "post_series")
+        if r is None:
+            return None
+        published = r["published_ts"]
+        points = [((ts - published) / 3600, _unopt(lk), _unopt(vw)) for ts, lk, vw in self._points(r)]
+        velocity = []
+        for (a0, l0, v0), (a1, l1, v1) in zip(points, points[1:]):
+            dt = max(a1 - a0, 1e-6)
+            velocity.append({
+                "age_h": round(a1, 2),
+                "likes_per_h": round((l1 - l0) / dt, 2) if None not in (l0, l1) else None,
+                "views_per_h": round((v1 - v0) / dt, 2) if None not in (v0, v1) else None,
+            })
+        return {
+            "shortcode": r["shortcode"],
+            "perfil": r["perfil"],
+            "published_at": datetime.fromtimestamp(published, USER_TZ).isoformat(),
+            "points": [{"age_h": round(a, 2), "likes": lk, "views": vw} for a, lk, vw in points],
+            "velocity": velocity,
+        }
+
+    def profile_series(self, perfil: str, since: Optional[datetime] = None) -> Dict[str, Any]:
+        """Curva típica do perfil: mediana de likes/views de seus posts em cada marco de
+        SNAPSHOT_SCHEDULE_H (interpolada entre amostras) e a velocidade até o marco."""
+        rows = self.conn.execute(
+            "SELECT * FROM post_series WHERE perfil = ? AND published_ts >= ?",
+            (perfil, since.timestamp() if since else 0),
+        ).fetchall()
+        curves = [[((ts - r["published_ts"]) / 3600, _unopt(lk), _unopt(vw)) for ts, lk, vw in self._points(r)]
+                  for r in rows]
+        curve = []
+        for h in SNAPSHOT_SCHEDULE_H:
+            likes = [v for v in (_at_age(c, h, 1) for c in curves) if v is not None]
+            views = [v for v in (_at_age(c, h, 2) for c in curves) if v is not None]
+            curve.append({
+                "age_h": h,
+                "posts": len(likes),
+                "likes_median": round(_percentile(likes, 0.5), 1) if likes else None,
+                "views_median": round(_percentile(views, 0.5), 1) if views else None,
+                "likes_per_h_median": round(_percentile(likes, 0.5) / h, 2) if likes else None,
+            })
+        return {"perfil": perfil, "posts": len(rows), "curve": curve}
+
+    def iter_records(self, profiles: List[str], cutoff: datetime):
+        """Posts da janela, um por vez (cursor), na ordem do CSV: perfil e data desc.
+        Fontes "#tag" em `profiles` trazem os posts com essa hashtag na legenda."""
+        wanted = {p for p in profiles if not p.startswith("#")}
+        tags = {p.lower() for p in profiles if p.startswith("#")}
+        cur = self.conn.execute(
+            """SELECT * FROM posts
+               WHERE published_ts IS NULL OR published_ts >= ?
+               ORDER BY perfil, published_ts IS NULL, published_ts DESC""",
+            (cutoff.timestamp(),),
+        )
+        for r in cur:
+            if r["perfil"] in wanted or (tags and tags & set((r["hashtags"] or "").lower().split(", "))):
+                yield export_record(r)
+
+    def count_posts(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+
+    def iter_shortcodes(self):
+        for r in self.conn.execute("SELECT shortcode FROM posts"):
+            yield r[0]
+
+    def profile_activity(self, perfil: str, now: datetime) -> Tuple[float, Optional[float]]:
+        """Posts por dia na janela e mediana de likes por hora de vida do post."""
+        rows = self.conn.execute(
+            "SELECT published_ts, likes, refreshed_ts FROM posts WHERE perfil = ? AND published_ts >= ?",
+            (perfil, now.timestamp() - WINDOW_HOURS * 3600),
+        ).fetchall()
+        velocity = [r["likes"] / max(1.0, (r["refreshed_ts"] - r["published_ts"]) / 3600)
+                    for r in rows if r["likes"] is not None and r["refreshed_ts"]]
+        return len(rows) / (WINDOW_HOURS / 24), (_percentile(velocity, 0.5) if velocity else None)
+
+    def insights_due(self, perfil: str, now: datetime) -> bool:
+        """Vale sondar Insights neste post? Não, para perfil que já mostrou não ter o painel."""
+        r = self._lookup("available, misses, probed_ts", perfil, "profile_insights", "perfil")
+        if r is None or r["available"] or r["misses"] < INSIGHTS_MISSES_TO_SKIP:
+            return True
+        return now.timestamp() - (r["probed_ts"] or 0) >= INSIGHTS_REPROBE_HOURS * 3600
+
+    def record_insights(self, perfil: str, found: bool, now: datetime):
+        self._localize(perfil, "profile_insights", "perfil")
+        self.conn.execute(
+            """INSERT INTO profile_insights (perfil, available, misses, probed_ts) VALUES (?, ?, ?, ?)
+               ON CONFLICT(perfil) DO UPDATE SET
+                   available = excluded.available,
+                   misses = CASE WHEN excluded.available THEN 0 ELSE misses + 1 END,
+                   probed_ts = excluded.probed_ts""",
+            (perfil, int(found), 0 if found else 1, now.timestamp()),
+        )
+        self.conn.commit()
+
+    def merge_from(self, path: str) -> int:
+        """Funde a base de um shard: métricas da coleta mais recente, campos fixos só se vazios."""
+        cols = [r["name"] for r in self.conn.execute("PRAGMA table_info(posts)")]
+        fixed = [c for c in cols if c not in ("shortcode", "first_seen_ts", "refreshed_ts", "refresh_count")
+                 and c not in (STORE_FIELDS[f] for f in VOLATILE_FIELDS)]
+        updates = ", ".join(
+            [f"{STORE_FIELDS[f]} = CASE WHEN excluded.refreshed_ts >= COALESCE(refreshed_ts, 0) "
+             f"THEN COALESCE(excluded.{STORE_FIELDS[f]}, {STORE_FIELDS[f]}) ELSE {STORE_FIELDS[f]} END"
+             for f in VOLATILE_FIELDS]
+            + [f"{c} = COALESCE({c}, excluded.{c})" for c in fixed]
+            + ["first_seen_ts = MIN(COALESCE(first_seen_ts, excluded.first_seen_ts), excluded.first_seen_ts)",
+               "refreshed_ts = MAX(COALESCE(refreshed_ts, 0), excluded.refreshed_ts)",
+               "refresh_count = MAX(refresh_count, excluded.refresh_count)"]
+        )
+        self.conn.execute("ATTACH DATABASE ? AS shard", (f"file:{quote(os.path.abspath(path))}?mode=ro",))
+        try:
+            with self.conn:
+                n = self.conn.execute("SELECT COUNT(*) FROM shard.posts").fetchone()[0]
+                self.conn.execute(
+                    f"INSERT INTO posts ({', '.join(cols)}) SELECT {', '.join(cols)} FROM shard.posts WHERE 1 "
+                    f"ON CONFLICT(shortcode) DO UPDATE SET {updates}"
+                )
+                self.conn.execute(
+                    """INSERT INTO profile_probe SELECT * FROM shard.profile_probe WHERE 1
+                       ON CONFLICT(perfil) DO UPDATE SET post_count = excluded.post_count,
+                           newest = excluded.newest, probed_ts = excluded.probed_ts
+                       WHERE excluded.probed_ts >= COALESCE(probed_ts, 0)"""
+                )
+                self.conn.execute(
+                    """INSERT INTO profile_insights SELECT * FROM shard.profile_insights WHERE 1
+                       ON CONFLICT(perfil) DO UPDATE SET available = excluded.available,
+                           misses = excluded.misses, probed_ts = excluded.probed_ts
+                       WHERE excluded.probed_ts >= COALESCE(probed_ts, 0)"""
+                )
+                # séries: o shard começou a sua do zero; junta as amostras pela hora
+                for r in self.conn.execute("SELECT * FROM shard.post_series").fetchall():
+                    mine = self.conn.execute("SELECT * FROM post_series WHERE shortcode = ?",
+                                             (r["shortcode"],)).fetchone()
+                    points = {p[0]: p for p in (self._points(mine) if mine else [])}
+                    points.update((p[0], p) for p in self._points(r))
+                    self._write_series(r["shortcode"], r["perfil"], r["published_ts"], sorted(points.values()))
+        finally:
+            self.conn.execute("DETACH DATABASE shard")
+        return n
+
+    def close(self):
+        self.conn.close()
+
+# ======================== POSTS JÁ VISTOS ========================
+
+class BloomFilter:
+    """Conjunto aproximado de tamanho fixo: "não está" é certeza, "está" pode ser falso
+    positivo com probabilidade ~`error` enquanto couber em `capacity`."""
+
+    def __init__(self, capacity: int, error: float, bits: Optional[bytearray] = None, n: int = 0):
+        self.capacity = capacity
+        self.error = error
+        self.m = max(8, math.ceil(-capacity * math.log(error) / math.log(2) ** 2))
+        self.k = max(1, round(self.m / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.m + 7) // 8)
+        self.n = n
+
+    def _positions(self, key: str):
+        h = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(h[:8], "little"), int.from_bytes(h[8:], "little") | 1
+        return [(h1 + i * h2) % self.m for i in range(self.k)]
+
+    def add(self, key: str):
+        new = False
+        for p in self._positions(key):
+            if not self.bits[p >> 3] & (1 << (p & 7)):
+                self.bits[p >> 3] |= 1 << (p & 7)
+                new = True
+        self.n += new
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def save(self, path: str, **meta):
+        header = {"capacity": self.capacity, "error": self.error, "n": self.n, **meta}
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            f.write(self.bits)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["BloomFilter", Dict[str, Any]]:
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            bits = bytearray(f.read())
+        bloom = cls(header["capacity"], header["error"], bits, header["n"])
+        if len(bits) != (bloom.m + 7) // 8:
+            raise ValueError("tamanho do filtro não confere com o cabeçalho")
+        return bloom, header
+
+
+class SeenSet:
+    """Posts já abertos, para todas as fontes e entre execuções.
+
+    O filtro responde "nunca aberto" sem consultar a base; um "talvez" vai para a base
+    (PostStore.plan), que diz se o post já está em dia neste ciclo de reatualização.
+    O arquivo guarda quantos posts a base tinha ao salvar: se não bater (shards
+    fundidos, base trocada) ou o filtro lotou, ele é refeito a partir da base.
+    """
+
+    def __init__(self, store: PostStore, path: Optional[str] = None):
+        self.store = store
+        self.path = SEEN_FILE if path is None else path
+        self.bloom = self._load()
+
+    def _load(self) -> BloomFilter:
+        n_posts = self.store.count_posts()
+        if self.path and os.path.exists(self.path):
+            try:
+                bloom, meta = BloomFilter.load(self.path)
+                if meta.get("posts") == n_posts and bloom.n <= bloom.capacity:
+                    return bloom
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[WARN] Filtro de vistos ilegível ({self.path}): {e}")
+        bloom = BloomFilter(max(SEEN_CAPACITY, 2 * n_posts), SEEN_ERROR)
+        for shortcode in self.store.iter_shortcodes():
+            bloom.add(shortcode)
+        if n_posts:
+            print(f"[VISTOS] Filtro refeito a partir da base ({n_posts} posts).")
+        return bloom
+
+    def known(self, url: str) -> bool:
+        return PostStore.key(url) in self.bloom
+
+    def add(self, url: str):
+        self.bloom.add(PostStore.key(url))
+
+    def save(self):
+        if self.path:
+            self.bloom.save(self.path, posts=self.store.count_posts())
+
+# ======================== EXPORTAÇÃO ========================
+
+# esquema tipado usado por JSONL/Parquet (o CSV mantém os nomes de coluna originais)
+EXPORT_SCHEMA = [
+    ("perfil", "str"),
+    ("published_at", "timestamp"),
+    ("caption", "str"),
+    ("theme", "str"),
+    ("media_type", "str"),
+    ("tone", "str"),
+    ("hashtags", "str"),
+    ("likes", "int"),
+    ("views", "int"),
+    ("shares", "int"),
+    ("reach", "int"),
+    ("url", "str"),
+]
+
+
+def export_record(r) -> Dict[str, Any]:
+    ts = r["published_ts"]
+    published = datetime.fromtimestamp(ts, tz=USER_TZ) if ts is not None else None
+    return {name: (published if name == "published_at" else r[name]) for name, _ in EXPORT_SCHEMA}
+
+
+class CsvWriter:
+    def __init__(self, path: str = OUT_CSV):
+        self.path = path
+        self.count = 0
+        self._fh = open(path, "w", encoding="utf-8-sig", newline="")
+        self._w = csv.writer(self._fh)
+        self._w.writerow(CSV_COLUMNS)
+
+    def write(self, rec: Dict[str, Any]):
+        dt = rec["published_at"]
+        row = {field: rec.get(col) for field, col in STORE_FIELDS.items()}
+        row["Data/Hora da Publicação"] = dt.strftime("%Y-%m-%d %H:%M:%S") if dt else ""
+        self._w.writerow(["" if row[c] is None else row[c] for c in CSV_COLUMNS])
+        self.count += 1
+
+    def close(self) -> str:
+        self._fh.close()
+        return self.path
+
+
+class _PartitionedWriter(ABC):
+    """Base dos formatos particionados: <EXPORT_DIR>/<fmt>/collected=<data>/perfil=<perfil>/.
+    Os registros chegam ordenados por perfil, então só uma partição fica aberta por vez."""
+
+    ext = ""
+
+    def __init__(self, root: str, collected: str, run_id: str):
+        self.root = os.path.join(root, self.ext, f"collected={collected}")
+        self.run_id = run_id
+        self.count = 0
+        self._part: Optional[str] = None
+
+    def _partition_path(self, perfil: str) -> str:
+        d = os.path.join(self.root, f"perfil={perfil or '_'}")
+        os.makedirs(d, exist_ok=True)
+        return os.path.join(d, f"part-{self.run_id}.{self.ext}")
+
+    def write(self, rec: Dict[str, Any]):
+        if rec["perfil"] != self._part:
+            self._close_part()
+            self._part = rec["perfil"]
+            self._open_part(self._partition_path(self._part))
+        self._write(rec)
+        self.count += 1
+
+    def close(self) -> str:
+        self._close_part()
+        return self.root
+
+    @abstractmethod
+    def _open_part(self, path: str):
+        """Abre o arquivo da partição em `path`."""
+
+    @abstractmethod
+    def _write(self, rec: Dict[str, Any]):
+        """Grava um registro na partição aberta."""
+
+    @abstractmethod
+    def _close_part(self):
+        """Fecha a partição aberta (se houver)."""
+
+
+class JsonlWriter(_PartitionedWriter):
+    ext = "jsonl"
+
+    def _open_part(self, path: str):
+        self._fh = open(path, "w", encoding="utf-8")
+
+    def _write(self, rec: Dict[str, Any]):
+        out = dict(rec)
+        if out["published_at"] is not None:
+            out["published_at"] = out["published_at"].isoformat()
+        self._fh.write(json.dumps(out, ensure_ascii=False) + "\n")
+
+    def _close_part(self):
+        if self._part is not None:
+            self._fh.close()
+
+
+class ParquetWriter(_PartitionedWriter):
+    """Grava row groups de até PARQUET_ROW_GROUP linhas; memória limitada a um row group."""
+
+    ext = "parquet"
+
+    def __init__(self, root: str, collected: str, run_id: str, row_group: int = PARQUET_ROW_GROUP):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Exportar parquet requer pyarrow (pip install pyarrow).")
+        self.pa, self.pq = pa, pq
+        types = {"str": pa.string(), "int": pa.int64(), "timestamp": pa.timestamp("s", tz="UTC")}
+        self.schema = pa.schema([(name, types[kind]) for name, kind in EXPORT_SCHEMA])
+        self.row_group = row_group
+        self._buf: List[Dict[str, Any]] = []
+        super().__init__(root, collected, run_id)
+
+    def _open_part(self, path: str):
+        self._pw = self.pq.ParquetWriter(path, self.schema)
+
+    def _write(self, rec: Dict[str, Any]):
+        self._buf.append(rec)
+        if len(self._buf) >= self.row_group:
+            self._flush()
+
+    def _flush(self):
+        if self._buf:
+            self._pw.write_table(self.pa.Table.from_pylist(self._buf, schema=self.schema))
+            self._buf = []
+
+    def _close_part(self):
+        if self._part is not None:
+            self._flush()
+            self._pw.close()
+
+
+def make_writers(formats: List[str], collected: datetime) -> List[Any]:
+    day = collected.strftime("%Y-%m-%d")
+    run_id = collected.strftime("%Y%m%dT%H%M%S")
+    writers: List[Any] = []
+    for fmt in formats:
+        if fmt == "csv":
+            writers.append(CsvWriter(OUT_CSV))
+        elif fmt == "jsonl":
+            writers.append(JsonlWriter(EXPORT_DIR, day, run_id))
+        elif fmt == "parquet":
+            writers.append(ParquetWriter(EXPORT_DIR, day, run_id))
+        else:
+            raise ValueError(f"Formato de exportação desconhecido: {fmt!r}")
+    return writers
+
+
+def export_store(store: PostStore, profiles: List[str], cutoff: datetime,
+                 formats: List[str], collected: datetime) -> int:
+    writers = make_writers(formats, collected)
+    n = 0
+    try:
+        for rec in store.iter_records(profiles, cutoff):
+            for w in writers:
+                w.write(rec)
+            n += 1
+    finally:
+        for w in writers:
+            dest = w.close()
+            if n:
+                print(f"[OK] Exportado {w.count} posts para {dest}")
+    return n
+
+# ======================== DIÁRIO DA EXECUÇÃO ========================
+
+class RunJournal:
+    """Diário append-only da execução: cada post e perfil concluído vira uma linha JSON
+    gravada em disco na hora, para que uma queda não perca o que já foi feito."""
+
+    def __init__(self, path: str = RUN_JOURNAL, resume: bool = False):
+        self.path = path
+        self._reset()
+        if resume and os.path.exists(path):
+            self._load()
+            if self.finished:
+                print("[RESUME] A última execução já terminou; começando uma nova.")
+                self._reset()
+                resume = False
+        self._fh = open(path, "a" if resume else "w", encoding="utf-8")
+        if resume and self._fh.tell() and not self._ends_with_newline():
+            self._fh.write("\n")  # isola a linha cortada pela queda
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as fh:
+            fh.seek(-1, os.SEEK_END)
+            return fh.read(1) == b"\n"
+
+    def _reset(self):
+        self.cutoff: Optional[datetime] = None
+        self.finished = False
+        self.done_profiles: Set[str] = set()
+        self.done_urls: Dict[str, Dict[str, bool]] = {}
+        # (momento da coleta, linha) de cada post gravado
+        self.rows: List[Tuple[datetime, Dict[str, Any]]] = []
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    ev = json.loads(line)
+                except ValueError:
+                    continue  # última linha cortada por uma queda
+                kind = ev.get("ev")
+                if kind == "run":
+                    self.cutoff = datetime.fromisoformat(ev["cutoff"])
+                elif kind == "post":
+                    self.done_urls.setdefault(ev["profile"], {})[ev["url"]] = ev["in_window"]
+                    row = ev.get("row")
+                    if row:
+                        if row.get("_DT_LOCAL"):
+                            row["_DT_LOCAL"] = datetime.fromisoformat(row["_DT_LOCAL"])
+                        captured = datetime.fromisoformat(ev.get("captured") or ev["ts"])
+                        self.rows.append((captured, row))
+                elif kind == "profile_done":
+                    self.done_profiles.add(ev["profile"])
+                elif kind == "run_done":
+                    self.finished = True
+
+    def _write(self, ev: Dict[str, Any]):
+        ev["ts"] = datetime.now(USER_TZ).isoformat()
+        self._fh.write(json.dumps(ev, ensure_ascii=False, default=str) + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def start(self, cutoff: datetime) -> datetime:
+        """Abre a execução; ao retomar, devolve a janela da execução original."""
+        if self.cutoff is None:
+            self.cutoff = cutoff
+            self._write({"ev": "run", "cutoff": cutoff.isoformat()})
+        else:
+            self._write({"ev": "resume", "done_profiles": len(self.done_profiles)})
+        return self.cutoff
+
+    def post_done(self, profile: str, url: str, row: Dict[str, Any], in_window: bool, captured: datetime):
+        rec = dict(row)
+        if isinstance(rec.get("_DT_LOCAL"), datetime):
+            rec["_DT_LOCAL"] = rec["_DT_LOCAL"].isoformat()
+        self.done_urls.setdefault(profile, {})[url] = in_window
+        self._write({"ev": "post", "profile": profile, "url": url, "in_window": in_window,
+                     "captured": captured.isoformat(), "row": rec})
+
+    def profile_done(self, profile: str):
+        self.done_profiles.add(profile)
+        self._write({"ev": "profile_done", "profile": profile})
+
+    def run_done(self):
+        self.finished = True
+        self._write({"ev": "run_done"})
+
+    def close(self):
+        self._fh.close()
+
+# ======================== REGISTRO DE PERFIS ========================
+
+class ProfileRegistry:
+    """PROFILES_FILE: perfis e, para cada um, posts/dia, likes/hora e a última coleta."""
+
+    def __init__(self, path: str = PROFILES_FILE):
+        self.path = path
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as fh:
+                self.entries: List[Dict[str, Any]] = json.load(fh)["profiles"]
+        else:
+            self.entries = [{"username": u, "enabled": True} for u in parse_profiles(PROFILES_RAW)]
+            self.save()
+            print(f"[REGISTRO] {path} criado com {len(self.entries)} perfis de PROFILES_RAW.")
+        for e in self.entries:
+            names = parse_profiles(e["username"])
+            e["username"] = names[0] if names else ""
+
+    def _by_name(self) -> Dict[str, Dict[str, Any]]:
+        return {e["username"]: e for e in self.entries}
+
+    def usernames(self) -> List[str]:
+        return [e["username"] for e in self.entries if e["username"] and e.get("enabled", True)]
+
+    @staticmethod
+    def hours_since_crawl(e: Dict[str, Any], now: datetime) -> Optional[float]:
+        last = (e.get("stats") or {}).get("last_crawl")
+        return (now - datetime.fromisoformat(last)).total_seconds() / 3600 if last else None
+
+    def expected_new(self, e: Dict[str, Any], now: datetime) -> float:
+        hours = self.hours_since_crawl(e, now)
+        if hours is None:
+            return math.inf
+        return (e.get("stats") or {}).get("posts_per_day", 0.0) * hours / 24
+
+    def is_due(self, e: Dict[str, Any], now: datetime) -> bool:
+        hours = self.hours_since_crawl(e, now)
+        if hours is None:
+            return True
+        if e.get("interval_hours") is not None:  # frequência fixada à mão
+            return hours >= e["interval_hours"]
+        return (self.expected_new(e, now) >= SCHEDULE_MIN_EXPECTED_POSTS
+                or hours >= SCHEDULE_MAX_INTERVAL_HOURS)
+
+    def score(self, e: Dict[str, Any], now: datetime) -> float:
+        """Posts novos esperados, pesados pela velocidade de engajamento do perfil."""
+        likes_per_hour = (e.get("stats") or {}).get("likes_per_hour") or 0.0
+        return self.expected_new(e, now) * (1 + math.log1p(likes_per_hour))
+
+    def schedule(self, now: datetime, everyone: bool = False) -> Tuple[List[str], List[str]]:
+        """(perfis desta execução, do mais valioso ao menos; perfis adiados)."""
+        wanted = set(self.usernames())
+        entries = [e for e in self.entries if e["username"] in wanted]
+        due = [e for e in entries if everyone or self.is_due(e, now)]
+        due.sort(key=lambda e: -self.score(e, now))  # estável: sem histórico, mantém a ordem do arquivo
+        skipped = [e["username"] for e in entries if e not in due]
+        return [e["username"] for e in due], skipped
+
+    def record_run(self, usernames: List[str], store: PostStore, now: datetime):
+        """Atualiza as médias dos perfis concluídos com o que está na base."""
+        def ewma(prev: Optional[float], new: float) -> float:
+            return new if prev is None else SCHEDULE_EWMA_ALPHA * new + (1 - SCHEDULE_EWMA_ALPHA) * prev
 
-    if not rows:
-        print("Nenhum post foi coletado.")
+        by_name = self._by_name()
+        for u in usernames:
+            e = by_name.get(u)
+            if e is None:
+                continue
+            stats = e.setdefault("stats", {})
+            posts_per_day, likes_per_hour = store.profile_activity(u, now)
+            stats["posts_per_day"] = round(ewma(stats.get("posts_per_day"), posts_per_day), 3)
+            if likes_per_hour is not None:
+                stats["likes_per_hour"] = round(ewma(stats.get("likes_per_hour"), likes_per_hour), 2)
+            stats["last_crawl"] = now.isoformat()
+            stats["runs"] = stats.get("runs", 0) + 1
+        self.save()
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"profiles": self.entries}, fh, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+
+def scheduled_profiles(args: argparse.Namespace, now: datetime) -> Tuple[ProfileRegistry, List[str]]:
+    registry = ProfileRegistry(PROFILES_FILE)
+    todo, skipped = registry.schedule(now, everyone=args.all)
+    if skipped:
+        print(f"[AGENDA] {len(todo)} perfis nesta execução; {len(skipped)} adiados (sem posts novos "
+              f"esperados): {', '.join(skipped[:10])}{' ...' if len(skipped) > 10 else ''}")
+    return registry, todo
+
+
+def hashtag_sources(args: argparse.Namespace) -> List[str]:
+    """Fontes "#tag" pedidas em --hashtags (padrão: HASHTAGS)."""
+    tags = (t.strip().lstrip("#").lower() for t in re.split(r"[\s,]+", args.hashtags or ""))
+    return sorted({f"#{t}" for t in tags if t})
+
+# ======================== FILA DE PERFIS COMPARTILHADA ========================
+# Para --shards: a fila substitui o diário como registro de progresso, na
+# granularidade de perfil. Sem WAL de propósito: o modo de journal padrão do
+# SQLite é o que funciona com o arquivo num disco de rede.
+
+class LeaseQueue:
+    """Perfis a coletar, reservados por lease: quem pega renova enquanto trabalha."""
+
+    def __init__(self, path: str = SHARD_QUEUE, lease_s: float = LEASE_S,
+                 max_attempts: int = LEASE_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        # claim/renew/finish rodam em threads (asyncio.to_thread) para a espera pelo lock
+        # do arquivo não travar o loop; a conexão é única, protegida por _lock
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                username TEXT PRIMARY KEY,
+                state TEXT NOT NULL DEFAULT 'pending',   -- pending, leased, done, failed
+                owner TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_ts REAL
+            )
+        """)
+
+    def _meta(self, key: str) -> Optional[str]:
+        r = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return r["value"] if r else None
+
+    def cutoff(self) -> Optional[datetime]:
+        v = self._meta("cutoff")
+        return datetime.fromisoformat(v) if v else None
+
+    def init(self, usernames: List[str], cutoff: datetime) -> datetime:
+        """Cria a rodada; se a anterior ainda tem perfis em aberto, continua nela."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            c = self.counts()
+            if self._meta("cutoff") and (c["pending"] or c["leased"]):
+                print(f"[SHARDS] Continuando a rodada em aberto: {dict(c)}")
+            else:
+                self.conn.execute("DELETE FROM leases")
+                self.conn.executemany("INSERT INTO leases (username, updated_ts) VALUES (?, ?)",
+                                      [(u, time.time()) for u in usernames])
+                self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('cutoff', ?)", (cutoff.isoformat(),))
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return self.cutoff()
+
+    def claim(self, owner: str) -> Optional[str]:
+        """Reserva o próximo perfil livre (ou com lease vencido) para `owner`."""
+        now = time.time()
+        with self._lock:
+            return self._claim(owner, now)
+
+    def _claim(self, owner: str, now: float) -> Optional[str]:
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                r = self.conn.execute(
+                    """SELECT username, attempts FROM leases
+                       WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?)
+                       ORDER BY attempts, rowid LIMIT 1""", (now,)).fetchone()
+                if r is None:
+                    username = None
+                    break
+                if r["attempts"] >= self.max_attempts:
+                    self.conn.execute("UPDATE leases SET state = 'failed', owner = NULL, updated_ts = ? "
+                                      "WHERE username = ?", (now, r["username"]))
+                    print(f"[SHARDS] @{r['username']}: {r['attempts']} tentativas sem concluir, desistindo.")
+                    continue
+                username = r["username"]
+                self.conn.execute(
+                    "UPDATE leases SET state = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1, "
+                    "updated_ts = ? WHERE username = ?", (owner, now + self.lease_s, now, username))
+                break
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return username
+
+    def renew(self, owner: str):
+        now = time.time()
+        with self._lock:
+            self.conn.execute("UPDATE leases SET lease_until = ?, updated_ts = ? "
+                              "WHERE owner = ? AND state = 'leased'", (now + self.lease_s, now, owner))
+
+    def finish(self, owner: str, username: str, ok: bool) -> bool:
+        """Concluído vira 'done'; falha volta para a fila (até max_attempts).
+
+        Só vale para o lease ainda vigente de `owner`: se ele venceu (e talvez já foi
+        repassado a outro worker), nada muda e a resposta é False."""
+        now = time.time()
+        with self._lock:
+            cur = self.conn.execute(
+                "UPDATE leases SET state = ?, owner = NULL, lease_until = NULL, updated_ts = ? "
+                "WHERE username = ? AND state = 'leased' AND owner = ? AND lease_until >= ?",
+                ("done" if ok else "pending", now, username, owner, now))
+            return cur.rowcount == 1
+
+    def counts(self) -> Counter:
+        return Counter({r["state"]: r["n"] for r in
+                        self.conn.execute("SELECT state, COUNT(*) AS n FROM leases GROUP BY state")})
+
+    def done_usernames(self) -> List[str]:
+        return [r["username"] for r in self.conn.execute("SELECT username FROM leases WHERE state = 'done'")]
+
+    def claimable(self) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM leases WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?)",
+            (time.time(),)).fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+# ======================== POOL DO NAVEGADOR ========================
+
+STEALTH_INIT_JS = """
+    Object.defineProperty(navigator, 'webdriver', {get: () => undefined});
+    window.chrome = { runtime: {} };
+    Object.defineProperty(navigator, 'plugins', {get: () => [1,2,3]});
+    Object.defineProperty(navigator, 'languages', {get: () => ['pt-BR','pt','en']});
+"""
+
+CONTEXT_OPTIONS = {
+    "viewport": {"width": 1280, "height": 800},
+    "user_agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/123.0.0.0 Safari/537.36"
+    ),
+}
+
+
+def browser_rss_mb() -> Optional[float]:
+    """RSS somado dos processos filhos deste (driver do Playwright + Chromium), em MB."""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        total = 0
+        for proc in psutil.Process().children(recursive=True):
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / 2 ** 20
+    if not os.path.isdir("/proc"):
+        return None
+    # sem psutil: monta a árvore de processos pelo /proc (Linux)
+    children: Dict[int, List[int]] = {}
+    rss: Dict[int, int] = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as fh:
+                fields = fh.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(name))  # ppid
+        rss[int(name)] = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+    total, stack = 0, list(children.get(os.getpid(), []))
+    while stack:
+        pid = stack.pop()
+        total += rss.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total / 2 ** 20
+
+
+class PageSlot:
+    """Página emprestada do pool, com a captura de JSON ligada a ela."""
+
+    def __init__(self, page, capture: Optional[ResponseCapture], gen: int):
+        self.page = page
+        self.capture = capture
+        self.gen = gen
+
+
+class ContextPool:
+    """Contexto logado e páginas reaproveitadas entre jobs (acquire/release).
+
+    Ao passar de `max_navigations` ou `max_rss_mb`, abre um contexto novo com o
+    storage_state do atual (sessão preservada, sem novo login). Jobs em andamento
+    terminam no contexto antigo, que é fechado quando a última página dele volta.
+    """
+
+    def __init__(self, browser, setup, options: Optional[Dict[str, Any]] = None,
+                 max_navigations: int = CONTEXT_MAX_NAVIGATIONS, max_rss_mb: float = BROWSER_MAX_RSS_MB):
+        self.browser = browser
+        self.setup = setup              # corrotina aplicada a cada contexto novo
+        self.options = dict(CONTEXT_OPTIONS, **(options or {}))
+        self.max_navigations = max_navigations
+        self.max_rss_mb = max_rss_mb
+        self.context = None
+        self.gen = 0
+        self.navigations = 0
+        self.recycled = 0
+        self.peak_rss_mb = 0.0
+        self._idle: List[PageSlot] = []
+        self._in_use: Counter = Counter()
+        self._retired: Dict[int, Any] = {}
+        self._last_rss_check = 0.0
+        self._lock = asyncio.Lock()
+
+    async def open(self, storage_state: Optional[Dict[str, Any]] = None):
+        opts = dict(self.options, **({"storage_state": storage_state} if storage_state else {}))
+        self.context = await self.browser.new_context(**opts)
+        self.gen += 1
+        self.navigations = 0
+        self.context.on("request", self._on_request)
+        await self.setup(self.context)
+
+    def _on_request(self, req):
+        if req.is_navigation_request() and req.frame.parent_frame is None:
+            self.navigations += 1
+
+    async def acquire(self) -> PageSlot:
+        while self._idle:
+            slot = self._idle.pop()
+            if not slot.page.is_closed():
+                self._in_use[slot.gen] += 1
+                return slot
+        # contexto e geração lidos antes do await, e a página já conta como em uso:
+        # uma reciclagem durante o new_page não fecha o contexto nem troca a geração
+        ctx, gen = self.context, self.gen
+        self._in_use[gen] += 1
+        try:
+            page = await ctx.new_page()
+        except BaseException:
+            self._in_use[gen] -= 1
+            await self._close_retired()
+            raise
+        capture = None
+        if CAPTURE_JSON:
+            capture = ResponseCapture()
+            capture.attach(page)
+        return PageSlot(page, capture, gen)
+
+    async def release(self, slot: PageSlot):
+        self._in_use[slot.gen] -= 1
+        if slot.page.is_closed():
+            await self._close_retired()  # página morta não volta para o pool
+        elif slot.gen == self.gen:
+            self._idle.append(slot)
+        else:
+            await self._close_page(slot)
+            await self._close_retired()
+        reason = self._recycle_reason()
+        if reason:
+            await self.recycle(reason)
+
+    def _recycle_reason(self) -> Optional[str]:
+        if self.max_navigations and self.navigations >= self.max_navigations:
+            return f"{self.navigations} navegações"
+        now = time.monotonic()
+        if self.max_rss_mb and now - self._last_rss_check >= RSS_CHECK_EVERY_S:
+            self._last_rss_check = now
+            rss = browser_rss_mb()
+            if rss is not None:
+                self.peak_rss_mb = max(self.peak_rss_mb, rss)
+                if rss >= self.max_rss_mb:
+                    return f"{rss:.0f} MB de memória"
+        return None
+
+    async def recycle(self, reason: str):
+        gen = self.gen
+        async with self._lock:
+            if self.gen != gen:
+                return  # outro job reciclou enquanto este esperava
+            with TELEMETRY.span("reciclagem do contexto"):
+                state = await self.context.storage_state()
+                old_gen, old = self.gen, self.context
+                for slot in self._idle:
+                    await self._close_page(slot)
+                self._idle.clear()
+                await self.open(state)
+                self._retired[old_gen] = old
+                await self._close_retired()
+            self.recycled += 1
+            TELEMETRY.inc("contexto reciclado")
+            print(f"[POOL] Contexto reciclado ({reason}); sessão mantida.")
+
+    async def _close_page(self, slot: PageSlot):
+        try:
+            await slot.page.close()
+        except Exception:
+            pass
+
+    async def _close_retired(self):
+        for gen in [g for g in self._retired if self._in_use[g] <= 0]:
+            try:
+                await self._retired.pop(gen).close()
+            except Exception:
+                pass
+
+    async def close(self):
+        for slot in self._idle:
+            await self._close_page(slot)
+        self._idle.clear()
+        for ctx in list(self._retired.values()) + [self.context]:
+            try:
+                await ctx.close()
+            except Exception:
+                pass
+        self._retired.clear()
+
+    def summary(self) -> str:
+        rss = browser_rss_mb()
+        if rss is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb, rss)
+        mem = f", pico de memória do navegador {self.peak_rss_mb:.0f} MB" if self.peak_rss_mb else ""
+        return f"[POOL] {self.recycled} reciclagens de contexto{mem}"
+
+# ======================== PIPELINE DE COLETA ========================
+# descoberta (grade dos perfis) -> fila de URLs -> extração dos posts -> fila de
+# linhas -> gravação (diário + base). As filas são limitadas: se a extração atrasa,
+# a descoberta espera; o estágio mais lento dita o ritmo.
+
+# Depois dos fixados a grade é cronológica: o primeiro post antigo não fixado
+# encerra o perfil. Nas primeiras MAX_PINNED_POSTS posições um post antigo pode
+# ser um fixado que o DOM não marcou, então ali ele só é ignorado.
+def past_window(jdx: int, pinned: bool) -> bool:
+    return not pinned and jdx > MAX_PINNED_POSTS
+
+
+def failure_reason(e: BaseException) -> str:
+    """Motivo curto para agrupar falhas no relatório ("timeout", "net::ERR_...", ...)."""
+    if isinstance(e, PWTimeout):
+        return "timeout"
+    m = re.search(r"net::ERR_[A-Z_]+", str(e))
+    if m:
+        return m.group(0)
+    first = str(e).strip().splitlines()
+    return first[0][:60] if first else type(e).__name__
+
+
+def retry_delay(attempt: int) -> float:
+    """Espera antes da tentativa `attempt + 1`: exponencial com jitter de ±50%."""
+    return min(RETRY_MAX_S, RETRY_BASE_S * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+
+
+class ProfileState:
+    """Andamento de um perfil dentro do pipeline."""
+
+    def __init__(self, idx: int, username: str):
+        self.idx = idx
+        self.username = username
+        self.pending = 0            # URLs enfileiradas ainda não gravadas
+        self.discovered_all = False
+        self.stopped = False        # grade passou da janela: descarta o resto
+        self.failed = False
+        self.finished = False
+        self.n_rows = 0
+        self.n_posts = 0            # posts gravados (dentro ou fora da janela)
+        self.probe: Optional[ProfileProbe] = None
+        self.open_attempts = 0      # aberturas do perfil que falharam
+        self.streak = 0             # falhas seguidas (zera no primeiro sucesso)
+        self.failures: Counter = Counter()  # motivo -> falhas
+        self.gave_up = 0            # posts abandonados depois de OPEN_POST_RETRIES
+        self.tripped = False        # disjuntor do perfil aberto
+
+    @property
+    def tag(self) -> str:
+        """Nome da hashtag quando a fonte é "#tag" em vez de um perfil."""
+        return self.username[1:] if self.username.startswith("#") else ""
+
+
+class PipelineStats:
+    """Vazão e ocupação de cada estágio, mais a profundidade das filas."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.t0 = time.monotonic()
+        self.count: Counter = Counter()
+        self.busy: Counter = Counter()
+        self.samples: Dict[str, List[float]] = {}
+
+    def add(self, stage: str, busy_s: float, n: int = 1):
+        self.count[stage] += n
+        self.busy[stage] += busy_s
+        self.samples.setdefault(stage, []).append(busy_s)
+        TELEMETRY.observe(f"estágio: {stage}", busy_s)
+
+    def line(self, url_q: asyncio.Queue, row_q: asyncio.Queue, done: int, total: int,
+             limiter: Optional[AdaptiveRateLimiter] = None) -> str:
+        elapsed = max(1e-6, time.monotonic() - self.t0)
+        parts = [
+            f"perfis {done}/{total}",
+            f"fila urls {url_q.qsize()}/{url_q.maxsize}",
+            f"fila linhas {row_q.qsize()}/{row_q.maxsize}",
+        ]
+        for stage, unit in (("descoberta", "url"), ("extração", "post"), ("gravação", "linha")):
+            parts.append(f"{stage} {self.count[stage] / elapsed * 60:.1f} {unit}/min")
+        if limiter is not None:
+            parts.append(f"ritmo {limiter.per_minute:.1f} nav/min, {limiter.throttled_s:.0f}s limitado")
+        return "[PIPE] " + " | ".join(parts)
+
+
+PIPELINE_STATS = PipelineStats()
+
+
+class CrawlPipeline:
+    """Com `lease`, os perfis vêm da fila compartilhada (um por vez, conforme a
+    descoberta libera) em vez de `usernames`. Entradas "#tag" em `usernames` são
+    hashtags: fontes de posts de qualquer perfil, deduplicadas junto com os perfis."""
+
+    def __init__(self, pool: ContextPool, usernames: List[str], cutoff: datetime,
+                 limiter: AdaptiveRateLimiter, store: Optional[PostStore] = None, journal: Optional[RunJournal] = None,
+                 lease: Optional[LeaseQueue] = None, owner: str = "",
+                 http: Optional[HttpFetcher] = None, deadline: Optional[float] = None):
+        self.pool = pool
+        self.http = http
+        self.deadline = deadline  # time.monotonic(); depois dele nenhum perfil novo começa
+        self.cutoff = cutoff
+        self.limiter = limiter
+        self.store = store
+        self.journal = journal
+        self.lease = lease
+        self.owner = owner
+        self.now = datetime.now(USER_TZ)
+        self.states = [ProfileState(i, u) for i, u in enumerate(usernames, start=1)]
+        self.profile_q: "asyncio.Queue[ProfileState]" = asyncio.Queue()
+        self.url_q: asyncio.Queue = asyncio.Queue(maxsize=URL_QUEUE_SIZE)
+        self.row_q: asyncio.Queue = asyncio.Queue(maxsize=ROW_QUEUE_SIZE)
+        self.stats = PIPELINE_STATS
+        self.stats.reset()
+        self.n_done = 0
+        self.n_rows = 0
+        # fila de espera das novas tentativas: heaps de (quando, seq, item)
+        self.retry_posts: List[Tuple[float, int, Tuple]] = []
+        self.retry_profiles: List[Tuple[float, int, ProfileState]] = []
+        self._retry_seq = 0
+        self._retry_wake = asyncio.Event()
+        self._progress = asyncio.Event()   # algum perfil terminou
+        self.session_streak = 0
+        self.session_trips = 0
+        self.aborted = False        # disjuntor da sessão abriu de vez
+        # cada post entra na fila uma vez por execução, venha de quantas fontes vier;
+        # o filtro de vistos (só com base própria, fora dos shards) poupa a consulta à
+        # base para post nunca aberto
+        self.claimed: Set[str] = set()
+        self.seen = SeenSet(store) if store is not None and lease is None else None
+
+    # ---------- falhas: nova tentativa e disjuntores ----------
+
+    def _fail(self, st: ProfileState, reason: str):
+        st.failures[reason] += 1
+        st.streak += 1
+        self.session_streak += 1
+        TELEMETRY.inc(f"falha: {reason}")
+        if st.streak >= PROFILE_BREAKER_FAILURES and not st.tripped:
+            print(f"[CIRCUITO] @{st.username}: {st.streak} falhas seguidas, perfil encerrado nesta execução.")
+            TELEMETRY.inc("circuito: perfil")
+            st.tripped = st.stopped = st.failed = True
+        if self.session_streak >= SESSION_BREAKER_FAILURES:
+            self.session_streak = 0
+            self.session_trips += 1
+            TELEMETRY.inc("circuito: sessão")
+            if self.session_trips >= SESSION_BREAKER_MAX_TRIPS:
+                print(f"[CIRCUITO] Sessão: {self.session_trips}ª rajada de {SESSION_BREAKER_FAILURES} "
+                      f"falhas seguidas, encerrando a execução (rode com --resume depois).")
+                self.aborted = True
+            else:
+                self.limiter.hold("circuito da sessão", SESSION_BREAKER_COOLDOWN_S * self.session_trips)
+        self._retry_wake.set()
+
+    def _ok(self, st: ProfileState):
+        st.streak = 0
+        self.session_streak = 0
+
+    def _defer_post(self, job: Tuple, e: BaseException) -> bool:
+        """Registra a falha; True se o post voltou para a fila de espera."""
+        st, jdx, url, pinned, attempt = job
+        reason = failure_reason(e)
+        self._fail(st, reason)
+        if st.stopped or self.aborted:
+            return False
+        if attempt >= OPEN_POST_RETRIES:
+            st.gave_up += 1
+            print(f"    [ERRO] {url}: desistindo após {attempt} tentativas ({reason})")
+            return False
+        delay = retry_delay(attempt)
+        print(f"    [WARN] {url}: {reason}; nova tentativa em {delay:.0f}s ({attempt + 1}/{OPEN_POST_RETRIES})")
+        self._retry_seq += 1
+        heapq.heappush(self.retry_posts, (time.monotonic() + delay, self._retry_seq,
+                                          (st, jdx, url, pinned, attempt + 1)))
+        return True
+
+    def _defer_profile(self, st: ProfileState, e: BaseException) -> bool:
+        reason = failure_reason(e)
+        st.open_attempts += 1
+        self._fail(st, reason)
+        if st.stopped or self.aborted or st.open_attempts >= OPEN_PROFILE_RETRIES:
+            return False
+        delay = retry_delay(st.open_attempts)
+        print(f"  [WARN] @{st.username}: {reason}; perfil volta em {delay:.0f}s "
+              f"({st.open_attempts + 1}/{OPEN_PROFILE_RETRIES})")
+        self._retry_seq += 1
+        heapq.heappush(self.retry_profiles, (time.monotonic() + delay, self._retry_seq, st))
+        return True
+
+    async def retry_feeder(self):
+        """Devolve os posts da fila de espera à extração quando vencem, mas só com a
+        fila de URLs vazia: trabalho novo e saudável passa na frente. Itens de perfis
+        encerrados (ou da sessão abortada) saem na hora, para serem descartados."""
+        while True:
+            dropped = [it for it in self.retry_posts if it[2][0].stopped or self.aborted]
+            if dropped:
+                self.retry_posts = [it for it in self.retry_posts if not (it[2][0].stopped or self.aborted)]
+                heapq.heapify(self.retry_posts)
+                for it in dropped:
+                    await self.url_q.put(it[2])
+                continue
+            self._retry_wake.clear()
+            if not self.retry_posts:
+                await self._retry_wake.wait()
+                continue
+            wait = self.retry_posts[0][0] - time.monotonic()
+            if wait <= 0 and self.url_q.empty():
+                await self.url_q.put(heapq.heappop(self.retry_posts)[2])
+                continue
+            try:
+                await asyncio.wait_for(self._retry_wake.wait(), timeout=max(wait, 0.5))
+            except asyncio.TimeoutError:
+                pass
+
+    def failure_report(self) -> List[str]:
+        lines = []
+        for st in self.states:
+            if not st.failures:
+                continue
+            reasons = ", ".join(f"{r}: {n}" for r, n in st.failures.most_common())
+            flags = " [circuito aberto]" if st.tripped else ""
+            lines.append(f"  @{st.username}: {sum(st.failures.values())} falhas, "
+                         f"{st.gave_up} posts abandonados ({reasons}){flags}")
+        if lines:
+            head = f"[FALHAS] {len(lines)} perfis com falhas"
+            if self.session_trips:
+                head += f"; disjuntor da sessão disparou {self.session_trips}x"
+            lines.insert(0, head)
+        return lines
+
+    # ---------- estágio 1: descoberta ----------
+
+    async def _next_profile(self) -> Optional[ProfileState]:
+        if self.aborted:
+            return None
+        try:
+            return self.profile_q.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        st = await self._claim()
+        if st is not None or not self.retry_profiles:
+            return st
+        # só sobraram perfis na fila de espera: aguarda o mais próximo vencer
+        due, _, st = heapq.heappop(self.retry_profiles)
+        await asyncio.sleep(max(0.0, due - time.monotonic()))
+        return st
+
+    async def discovery_worker(self):
+        while True:
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                if not self.profile_q.empty() or self.lease is not None or self.retry_profiles:
+                    print("[AGENDA] Orçamento de tempo esgotado; perfis restantes ficam para a próxima.")
+                for _, _, st in self.retry_profiles:
+                    st.failed = st.discovered_all = True
+                    await self._maybe_finish(st)
+                self.retry_profiles.clear()
+                return
+            st = await self._next_profile()
+            if st is None:
+                return
+            print(f"\n[Perfil {st.idx}/{len(self.states)}] @{st.username}")
+            CURRENT_PROFILE.set(st.username)
+            slot = None
+            deferred = False
+            try:
+                # dentro do try: um PWError ao abrir a página adia só este perfil
+                slot = await self.pool.acquire()
+                if slot.capture:
+                    slot.capture.reset()
+                await self._discover(slot.page, slot.capture, st)
+            except (PWTimeout, PWError) as e:
+                deferred = self._defer_profile(st, e)
+                if not deferred:
+                    st.failed = True
+                    print(f"[ERRO PERFIL @{st.username}] {e}")
+            except Exception as e:
+                st.failed = True
+                print(f"[ERRO PERFIL @{st.username}] {e}")
+            finally:
+                if not deferred:
+                    st.discovered_all = True
+                    await self._maybe_finish(st)
+                if slot is not None:
+                    await self.pool.release(slot)
+
+    async def _claim(self) -> Optional[ProfileState]:
+        if self.lease is None:
+            return None
+        username = await asyncio.to_thread(self.lease.claim, self.owner)
+        if username is None:
+            return None
+        st = ProfileState(len(self.states) + 1, username)
+        self.states.append(st)
+        return st
+
+    async def _probe(self, st: ProfileState) -> Optional[ProfileProbe]:
+        url = PROFILE_INFO_URL.format(username=st.username)
+        with TELEMETRY.span("sonda"):
+            if self.http is not None and not self.http.disabled:
+                payload = await self.http.get_json(url)
+            else:
+                payload = await context_get_json(self.pool.context, url, self.limiter)
+        probe = parse_profile_probe(payload)
+        TELEMETRY.inc("sonda ok" if probe else "sonda falhou")
+        return probe
+
+    async def _discover(self, page, capture: Optional[ResponseCapture], st: ProfileState):
+        done = self.journal.done_urls.get(st.username, {}) if self.journal else {}
+        if st.tag:
+            return await self._discover_tag(page, capture, st, done)
+        stop_at = ""
+        if CHANGE_PROBE and self.store:
+            st.probe = await self._probe(st)
+            prev = self.store.last_probe(st.username)
+            if st.probe and capture:
+                capture.feed(st.probe.payload)
+            n_new = None
+            if st.probe and prev:
+                n_new = st.probe.new_since(prev["post_count"], prev["newest"],
+                                           lambda u: self.store.published_ts(u) is not None)
+                if n_new is None:
+                    print(f"  > @{st.username}: sonda {prev['post_count']} -> {st.probe.count} posts não "
+                          f"fecha com a coleta anterior; abrindo a grade.")
+            if n_new is not None:
+                # tudo o que é novo cabe na sonda: sem grade; os posts conhecidos só têm
+                # as métricas reatualizadas (com o JSON da sonda, quando vencidas)
+                print(f"  > @{st.username}: sonda {prev['post_count']} -> {st.probe.count} posts, "
+                      f"{n_new} novos" + (" (sem mudanças, grade não aberta)" if not n_new else ""))
+                jdx = 0
+                for url, pinned in st.probe.items:
+                    jdx += 1
+                    if await self._offer(st, jdx, url, pinned, capture, done) == "stop":
+                        break
+                await self._refresh_due(st, {shortcode_from_url(u) for u, _ in st.probe.items}, capture, done)
+                return
+            stop_at = prev["newest"] if prev else ""
+
+        jdx = 0
+        seen: Set[str] = set()
+        t0 = time.monotonic()
+        async for url, pinned in iter_profile_post_urls(page, st.username, self.cutoff, self.limiter,
+                                                        capture, self.store):
+            jdx += 1
+            seen.add(shortcode_from_url(url))
+            self.stats.add("descoberta", time.monotonic() - t0)
+            if await self._offer(st, jdx, url, pinned, capture, done) == "stop":
+                break
+            if stop_at and not pinned and shortcode_from_url(url) == stop_at:
+                # daqui para baixo a grade é a mesma da última coleta
+                print(f"  > @{st.username}: alcançou o post mais novo da coleta anterior, parando a grade.")
+                await self._refresh_due(st, seen, capture, done)
+                break
+            t0 = time.monotonic()
+
+    async def _discover_tag(self, page, capture: Optional[ResponseCapture], st: ProfileState,
+                            done: Dict[str, bool]):
+        """Posts da janela numa hashtag: pela API da página da tag (que já traz data e
+        métricas) e, se ela falhar, pelos links da página. A ordem não é cronológica,
+        então nada encerra a fonte antes de HASHTAG_MAX_POSTS (jdx 0, como um fixado)."""
+        api = TAG_INFO_URL.format(tag=quote(st.tag))
+        with TELEMETRY.span("hashtag"):
+            if self.http is not None and not self.http.disabled:
+                payload = await self.http.get_json(api)
+            else:
+                payload = await context_get_json(self.pool.context, api, self.limiter)
+        urls: List[str] = []
+        for node in iter_media_nodes(payload):
+            media = media_fields(node)
+            if media.get("taken_at") is not None and media["taken_at"] < self.cutoff:
+                continue
+            kind = "reel" if media.get("media_type") == "Reels" else "p"
+            urls.append(f"https://www.instagram.com/{kind}/{media['shortcode']}/")
+        if urls and capture:
+            capture.feed(payload)
+        if not urls:
+            TELEMETRY.inc("hashtag via página")
+            await navigate(page, f"https://www.instagram.com/explore/tags/{quote(st.tag)}/", self.limiter,
+                           timeout=90000)
+            await wait_ready("profile_grid", page.wait_for_selector(
+                'a[href*="/p/"], a[href*="/reel/"]', timeout=READY_TIMEOUT_MS["profile_grid"]))
+            for a in await page.evaluate(GRID_ANCHORS_JS):
+                href = (a.get("href") or "").split("?")[0]
+                if "/p/" in href or "/reel/" in href:
+                    urls.append("https://www.instagram.com" + href if href.startswith("/") else href)
+        urls = list(dict.fromkeys(urls))[:HASHTAG_MAX_POSTS]
+        outcome = Counter([await self._offer(st, 0, url, False, capture, done) for url in urls])
+        print(f"  > #{st.tag}: {len(urls)} posts, {outcome['queued']} na fila "
+              f"({outcome['skip']} já vistos ou em dia)")
+
+    async def _refresh_due(self, st: ProfileState, seen: Set[str], capture: Optional[ResponseCapture],
+                           done: Dict[str, bool]):
+        """Posts da janela com métricas vencidas que não passaram pela grade/sonda: vão
+        direto pela URL salva (jdx 0 nunca encerra o perfil, como um fixado)."""
+        for url in self.store.due_urls(st.username, self.now, self.cutoff):
+            if shortcode_from_url(url) not in seen:
+                await self._offer(st, 0, url, False, capture, done)
+
+    async def _offer(self, st: ProfileState, jdx: int, url: str, pinned: bool,
+                     capture: Optional[ResponseCapture], done: Dict[str, bool]) -> str:
+        """Decide o que fazer com um post descoberto: "stop", "skip" ou "queued"."""
+        store = self.store
+        if st.stopped or self.aborted:
+            return "stop"
+        if PostStore.key(url) in self.claimed:
+            return "skip"   # outra fonte (ou esta, numa descoberta refeita) já pegou
+        if url in done:
+            # já concluído antes da queda (--resume)
+            return "stop" if not done[url] and past_window(jdx, pinned) else "skip"
+
+        if self.seen is not None and not self.seen.known(url):
+            plan = "new"    # o filtro garante: nunca aberto, nem consulta a base
+            store.stats["new"] += 1
+        else:
+            plan = store.plan(url, self.now, self.cutoff) if store else "new"
+        if plan == "old":
+            # já sabemos que está fora da janela: nem abre o post
+            if past_window(jdx, pinned):
+                print(f"      > @{st.username}: fora da janela (base local), parando.")
+                return "stop"
+            return "skip"
+        if plan == "fresh":
+            return "skip"
+        if plan == "due" and capture:
+            media = capture.get(url)
+            if media and media.get("likes") is not None:
+                # a grade (ou a sonda) já trouxe as métricas novas no JSON
+                store.update_metrics(url, {"Likes": media.get("likes"), "Views": media.get("views")},
+                                     datetime.now(USER_TZ))
+                return "skip"
+
+        st.pending += 1
+        self.claimed.add(PostStore.key(url))
+        await self.url_q.put((st, jdx, url, pinned, 1))  # bloqueia se a extração estiver atrasada
+        return "queued"
+
+    # ---------- estágio 2: extração ----------
+
+    async def extraction_worker(self):
+        while True:
+            job = await self.url_q.get()
+            if job is None:
+                return
+            st, jdx, url, pinned, attempt = job
+            row = None
+            if not st.stopped and not self.aborted:
+                print(f"    [@{st.username} {jdx}] {url}")
+                CURRENT_PROFILE.set(st.username)
+                t0 = time.monotonic()
+                try:
+                    row = await self._extract(st, url)
+                    self._ok(st)
+                except (PWTimeout, PWError) as e:
+                    if self._defer_post(job, e):
+                        # continua pendente: o perfil só termina quando o post voltar
+                        self.stats.add("extração", time.monotonic() - t0)
+                        continue
+                self.stats.add("extração", time.monotonic() - t0)
+            await self.row_q.put((st, jdx, url, pinned, row))
+
+    async def _extract(self, st: ProfileState, url: str) -> Optional[Dict[str, Any]]:
+        # post de hashtag é de perfil alheio: sem Insights, e o PERFIL vem do próprio post
+        profile = None if st.tag else st.username
+        probe = not st.tag and (self.store.insights_due(st.username, self.now) if self.store else True)
+        # Insights só existe no navegador: perfis ainda sondados não vão pelo HTTP
+        if self.http is not None and not probe:
+            media = await self.http.fetch_media(url)
+            if media_complete(media):
+                TELEMETRY.inc("post via http")
+                with TELEMETRY.span("extratores"):
+                    row = build_post_row({"url": url}, url, profile, None, media)
+                row["_INSIGHTS"] = None
+                return row
+            TELEMETRY.inc("http -> navegador")
+
+        slot = await self.pool.acquire()
+        if slot.capture:
+            slot.capture.reset()
+        try:
+            return await extract_post(slot.page, url, profile=profile, limiter=self.limiter,
+                                      capture=slot.capture, probe_insights=probe)
+        finally:
+            await self.pool.release(slot)
+
+    # ---------- estágio 3: gravação ----------
+
+    async def row_sink(self):
+        while True:
+            item = await self.row_q.get()
+            if item is None:
+                return
+            st, jdx, url, pinned, row = item
+            t0 = time.monotonic()
+            CURRENT_PROFILE.set(st.username)
+            st.pending -= 1
+            if row is not None:
+                st.n_posts += 1
+                TELEMETRY.inc("post")
+                self._store_row(st, jdx, url, pinned, row)
+            elif not st.stopped:
+                TELEMETRY.inc("post falhou")
+            self.stats.add("gravação", time.monotonic() - t0)
+            await self._maybe_finish(st)
+
+    def _store_row(self, st: ProfileState, jdx: int, url: str, pinned: bool, row: Dict[str, Any]):
+        dt_local = row.get("_DT_LOCAL")
+        in_window = not (isinstance(dt_local, datetime) and dt_local < self.cutoff)
+        # momento real da coleta: é o carimbo da amostra na série de engajamento
+        captured = datetime.now(USER_TZ)
+
+        if self.journal:
+            self.journal.post_done(st.username, url, row, in_window, captured)
+        if self.store:
+            self.store.save_post(row, captured)
+            if self.seen is not None:
+                self.seen.add(url)
+            if row.get("_INSIGHTS") is not None:
+                self.store.record_insights(st.username, row["_INSIGHTS"], self.now)
+
+        if in_window:
+            st.n_rows += 1
+            self.n_rows += 1
+            return
+
+        print(f"      > @{st.username} {url}: fora da janela de tempo, ignorado.")
+        if past_window(jdx, pinned) and not st.stopped:
+            print(f"      > @{st.username}: grade passou da janela, parando coleta deste perfil.")
+            st.stopped = True
+
+    async def _maybe_finish(self, st: ProfileState):
+        if st.finished or not st.discovered_all or st.pending:
+            return
+        st.finished = True
+        if self.aborted:
+            st.failed = True    # pode ter sobrado post descartado: fica para o --resume
+        self.n_done += 1
+        # a base do shard antes do lease: com o último lease concluído o coordenador já
+        # pode mesclar e apagar a base, e uma sonda gravada depois se perderia
+        if self.store and st.probe and not st.failed:
+            self.store.save_probe(st.username, st.probe, self.now)
+        if self.journal and not st.failed:
+            self.journal.profile_done(st.username)
+        if self.lease and not await asyncio.to_thread(self.lease.finish, self.owner, st.username, not st.failed):
+            print(f"[SHARDS] @{st.username}: lease vencido ou repassado; o resultado não foi registrado na fila.")
+        self._progress.set()
+
+    def progress_line(self) -> str:
+        """Posts/min e ETA; o restante é estimado pela média de posts dos perfis já concluídos."""
+        rate = TELEMETRY.posts_per_minute()
+        finished = [s for s in self.states if s.finished]
+        eta = "ETA --"
+        if finished and rate > 0:
+            per_profile = sum(s.n_posts for s in finished) / len(finished)
+            remaining = sum(max(0.0, per_profile - s.n_posts) for s in self.states if not s.finished)
+            eta = f"ETA ~{remaining / rate:.0f} min"
+        return (f"[PROGRESSO] {TELEMETRY.events['post']} posts | {rate:.1f} posts/min | "
+                f"perfis {self.n_done}/{len(self.states)} | {eta}")
+
+    async def reporter(self):
+        while True:
+            await asyncio.sleep(PIPELINE_REPORT_EVERY_S)
+            print(self.stats.line(self.url_q, self.row_q, self.n_done, len(self.states), self.limiter))
+            print(self.progress_line())
+            TELEMETRY.write()
+
+    async def heartbeat(self):
+        while True:
+            await asyncio.sleep(self.lease.lease_s / 3)
+            await asyncio.to_thread(self.lease.renew, self.owner)
+
+    async def run(self, n_discovery: int, n_extraction: int) -> int:
+        for st in self.states:
+            self.profile_q.put_nowait(st)
+
+        extractors = [asyncio.create_task(self.extraction_worker()) for _ in range(n_extraction)]
+        sink = asyncio.create_task(self.row_sink())
+        background = [asyncio.create_task(self.reporter()), asyncio.create_task(self.retry_feeder())]
+        if self.lease:
+            background.append(asyncio.create_task(self.heartbeat()))
+        try:
+            await asyncio.gather(*(self.discovery_worker() for _ in range(n_discovery)))
+            # posts na fila de espera ainda podem voltar: espera os perfis iniciados fecharem
+            while any(s.discovered_all and not s.finished for s in self.states):
+                self._progress.clear()
+                await self._progress.wait()
+            for _ in extractors:
+                await self.url_q.put(None)
+            await asyncio.gather(*extractors)
+            await self.row_q.put(None)
+            await sink
+        finally:
+            for t in extractors + [sink] + background:
+                t.cancel()
+            if self.seen is not None:
+                self.seen.save()
+        print(self.stats.line(self.url_q, self.row_q, self.n_done, len(self.states), self.limiter))
+        print(self.progress_line())
+        for line in self.failure_report():
+            print(line)
+        return self.n_rows
+
+
+# corrotinas chamadas com cada contexto novo, antes do filtro de rede (usado pelo
+# replay offline de benchmarks/replay.py para servir as respostas gravadas)
+CONTEXT_SETUP_HOOKS: List[Any] = []
+
+
+@asynccontextmanager
+async def browser_session(net: Optional[RouteFilter] = None, record_har: Optional[str] = None,
+                          fetch: Optional[str] = None):
+    """Navegador com o pool logado: entrega (pool, limitador, cliente HTTP ou None),
+    ou None se o login falhar. Na saída (também por erro ou Ctrl+C) salva a sessão
+    (cookies renovados) e fecha tudo."""
+    async with async_playwright() as pw:
+        browser = await pw.chromium.launch(
+            headless=True,
+            args=["--disable-blink-features=AutomationControlled"],
+            proxy=BROWSER_PROXY,
+        )
+        limiter = AdaptiveRateLimiter()
+
+        async def setup(context):
+            await context.add_init_script(STEALTH_INIT_JS)
+            for hook in CONTEXT_SETUP_HOOKS:
+                await hook(context)
+            if net is not None:
+                await net.install(context)
+            # também reage a 429 nas chamadas XHR/GraphQL
+            limiter.watch(context)
+
+        # gravando HAR, o contexto não é reciclado (cada contexto novo reescreveria o arquivo)
+        pool = ContextPool(browser, setup,
+                           options={"record_har_path": record_har} if record_har else None,
+                           max_navigations=0 if record_har else CONTEXT_MAX_NAVIGATIONS)
+        await pool.open(load_session_state())
+        http = None
+        logged_in = False
+        try:
+            if not await ensure_login(pool):
+                yield None
+                return
+            logged_in = True
+            http = await HttpFetcher.open(pool, limiter) if (fetch or FETCH_BACKEND) == "http" else None
+            yield pool, limiter, http
+        finally:
+            if logged_in:
+                try:
+                    await save_session_state(pool.context)
+                except Exception as e:
+                    # no Ctrl+C o navegador pode já ter recebido o sinal e fechado
+                    print(f"[WARN] Sessão não salva: {e}")
+            if http is not None:
+                await http.close()
+            await pool.close()
+            await browser.close()
+
+
+async def run_crawl(usernames: List[str], cutoff: datetime,
+                    net: Optional[RouteFilter] = None,
+                    store: Optional[PostStore] = None,
+                    journal: Optional[RunJournal] = None,
+                    record_har: Optional[str] = None,
+                    lease: Optional[LeaseQueue] = None, owner: str = "",
+                    fetch: Optional[str] = None, budget_min: float = 0) -> int:
+    deadline = time.monotonic() + budget_min * 60 if budget_min else None
+    async with browser_session(net, record_har, fetch) as session:
+        if session is None:
+            return 0
+        pool, limiter, http = session
+
+        # Todas as páginas do pipeline compartilham o contexto logado
+        pipeline = CrawlPipeline(pool, usernames, cutoff, limiter, store, journal, lease, owner, http,
+                                 deadline)
+        n_rows = await pipeline.run(
+            n_discovery=max(1, N_DISCOVERY_WORKERS if lease else min(N_DISCOVERY_WORKERS, len(usernames))),
+            n_extraction=max(1, N_WORKERS),
+        )
+        print(limiter.summary())
+        print(pool.summary())
+        if http is not None:
+            print(http.summary())
+
+    return n_rows
+
+# ======================== SÉRIES DE ENGAJAMENTO ========================
+# --snapshot: reamostra só os posts com marco vencido (ver PostStore.snapshot_due),
+# pelo HTTP quando possível; cada coleta vira uma amostra na série do post.
+
+async def take_snapshots(store: PostStore,
+                         session: Tuple[ContextPool, AdaptiveRateLimiter, Optional[HttpFetcher]]) -> int:
+    pool, limiter, http = session
+    urls = store.snapshot_due(datetime.now(USER_TZ))
+    print(f"[SÉRIES] {len(urls)} posts com amostra vencida (limite {SNAPSHOT_BATCH} por rodada)")
+    todo: asyncio.Queue = asyncio.Queue()
+    for url in urls:
+        todo.put_nowait(url)
+    n = 0
+
+    async def worker():
+        nonlocal n
+        while not todo.empty():
+            url = todo.get_nowait()
+            media = await http.fetch_media(url) if http is not None else None
+            if media and media.get("likes") is not None:
+                store.update_metrics(url, {"Likes": media.get("likes"), "Views": media.get("views")},
+                                     datetime.now(USER_TZ))
+                n += 1
+                continue
+            slot = await pool.acquire()
+            if slot.capture:
+                slot.capture.reset()
+            try:
+                row = await extract_post(slot.page, url, limiter=limiter, capture=slot.capture,
+                                         probe_insights=False)
+            except (PWTimeout, PWError) as e:
+                print(f"    [WARN] {url}: {failure_reason(e)}; a amostra fica para a próxima rodada")
+                row = None
+            finally:
+                await pool.release(slot)
+            if row is not None:
+                store.save_post(row, datetime.now(USER_TZ))
+                n += 1
+
+    await asyncio.gather(*(worker() for _ in range(max(1, N_WORKERS))))
+    return n
+
+
+def run_snapshot(args: argparse.Namespace):
+    TELEMETRY.reset()
+    net = RouteFilter(ROUTE_PROFILE)
+    store = PostStore(STORE_DB)
+
+    async def _run() -> int:
+        async with browser_session(net, fetch=args.fetch) as session:
+            return await take_snapshots(store, session) if session is not None else 0
+
+    try:
+        print(f"[SÉRIES] {asyncio.run(_run())} amostras gravadas.")
+    except KeyboardInterrupt:
+        print("\n[INTERROMPIDO] As amostras já gravadas ficam na base.")
+    finally:
+        TELEMETRY.write()
+        store.close()
+
+
+def show_series(target: str):
+    """Imprime em JSON a curva de um post (URL ou shortcode) ou de um perfil (@perfil)."""
+    store = PostStore(STORE_DB)
+    try:
+        if target.startswith("@"):
+            result: Optional[Dict[str, Any]] = store.profile_series(target[1:])
+        else:
+            result = store.series(target)
+        if result is None:
+            print(f"Nenhuma série para {target}.")
+            return
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    finally:
+        store.close()
+
+# ======================== DAEMON ========================
+# Navegador, sessão e pool aquecidos entre jobs. A API é HTTP/JSON local:
+#   POST /jobs      {"profiles": [...], "cutoff": ISO | "window_hours": N, "wait": bool}
+#   GET  /jobs/<id> estado do job e, quando pronto, as linhas da janela
+#   GET  /health    sessão, jobs e pool
+# Os jobs rodam um por vez no mesmo pool (sessão e limitador são de todos).
+
+class CrawlDaemon:
+    def __init__(self, session: Tuple[ContextPool, AdaptiveRateLimiter, Optional[HttpFetcher]],
+                 store: PostStore):
+        self.pool, self.limiter, self.http = session
+        self.store = store
+        self.loop = asyncio.get_running_loop()
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._done: Dict[str, asyncio.Event] = {}
+        # o loop só guarda referências fracas das tasks: sem este conjunto, um job em
+        # andamento pode ser coletado pelo GC
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock = asyncio.Lock()
+        self._seq = 0
+        self._checked = time.monotonic()  # a sessão acabou de ser conferida no login
+
+    def submit(self, profiles: List[str], cutoff: datetime) -> Dict[str, Any]:
+        self._expire()
+        self._seq += 1
+        job_id = f"{int(time.time())}-{self._seq}"
+        self.jobs[job_id] = {"id": job_id, "status": "queued", "profiles": profiles,
+                             "cutoff": cutoff.isoformat(), "submitted": time.time()}
+        self._done[job_id] = asyncio.Event()
+        task = asyncio.create_task(self._run(job_id, profiles, cutoff), name=f"job {job_id}")
+        self._tasks.add(task)
+        task.add_done_callback(lambda t: self._finished(job_id, t))
+        return self.view(job_id, rows=False)
+
+    def _finished(self, job_id: str, task: asyncio.Task):
+        """Fim da task do job: o que escapou de _run (cancelamento, BaseException) vai
+        para o status do job em vez de se perder."""
+        self._tasks.discard(task)
+        job = self.jobs.get(job_id)
+        if job is None or job["status"] in ("done", "failed"):
+            if not task.cancelled():
+                task.exception()  # já registrado no job; só marca como recuperada
+            return
+        job["status"] = "failed"
+        job["error"] = "cancelado" if task.cancelled() else repr(task.exception())
+        job.setdefault("finished", time.time())
+        print(f"[DAEMON] Job {job_id} interrompido: {job['error']}")
+        self._done[job_id].set()
+
+    async def close(self):
+        """Cancela os jobs em andamento e espera eles saírem (antes de fechar o navegador)."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _expire(self):
+        limit = time.time() - DAEMON_JOB_TTL_S
+        for job_id in [j for j, job in self.jobs.items() if job.get("finished", time.time()) < limit]:
+            del self.jobs[job_id], self._done[job_id]
+
+    async def _run(self, job_id: str, profiles: List[str], cutoff: datetime):
+        job = self.jobs[job_id]
+        async with self._lock:
+            job["status"] = "running"
+            t0 = time.monotonic()
+            try:
+                if time.monotonic() - self._checked >= DAEMON_SESSION_CHECK_S:
+                    if not await ensure_login(self.pool):
+                        raise RuntimeError("sessão expirada e o login falhou")
+                    self._checked = time.monotonic()
+                pipeline = CrawlPipeline(self.pool, profiles, cutoff, self.limiter, self.store, http=self.http)
+                job["crawled"] = await pipeline.run(
+                    n_discovery=max(1, min(N_DISCOVERY_WORKERS, len(profiles))),
+                    n_extraction=max(1, N_WORKERS),
+                )
+                job["done"] = [st.username for st in pipeline.states if st.finished and not st.failed]
+                job["failures"] = pipeline.failure_report()
+                job["rows"] = list(self.store.iter_records(profiles, cutoff))
+                job["status"] = "done"
+            except Exception as e:
+                job["status"], job["error"] = "failed", str(e)
+                print(f"[DAEMON] Job {job_id} falhou: {e}")
+            finally:
+                job["elapsed_s"] = round(time.monotonic() - t0, 2)
+                job["finished"] = time.time()
+                self._done[job_id].set()
+                TELEMETRY.write()
+
+    def view(self, job_id: str, rows: bool = True) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        return {k: v for k, v in job.items() if rows or k != "rows"}
+
+    async def wait(self, job_id: str) -> Optional[Dict[str, Any]]:
+        await self._done[job_id].wait()
+        return self.view(job_id)
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "jobs": dict(Counter(job["status"] for job in self.jobs.values())),
+            "rate_per_min": round(self.limiter.per_minute, 1),
+            "pool": self.pool.summary(),
+            "session_checked_s_ago": round(time.monotonic() - self._checked),
+        }
+
+    def call(self, fn, *args):
+        """Roda `fn` (função ou corrotina) no loop do daemon a partir da thread HTTP."""
+        async def _call():
+            result = fn(*args)
+            return await result if asyncio.iscoroutine(result) else result
+        return asyncio.run_coroutine_threadsafe(_call(), self.loop).result()
+
+    def handler(self):
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args):
+                pass
+
+            def _send(self, status: int, body: Any):
+                data = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/health":
+                    return self._send(200, daemon.call(daemon.health))
+                if self.path.startswith("/jobs/"):
+                    job = daemon.call(daemon.view, self.path[len("/jobs/"):])
+                    return self._send(200, job) if job else self._send(404, {"error": "job desconhecido"})
+                self._send(404, {"error": "rota desconhecida"})
+
+            def do_POST(self):
+                if self.path != "/jobs":
+                    return self._send(404, {"error": "rota desconhecida"})
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                    # sem ordenar: a ordem do pedido é a prioridade do agendador
+                    profiles = profile_names(" ".join(body["profiles"]))
+                    if body.get("cutoff"):
+                        cutoff = datetime.fromisoformat(body["cutoff"]).astimezone(USER_TZ)
+                    else:
+                        hours = float(body.get("window_hours") or WINDOW_HOURS)
+                        cutoff = datetime.now(USER_TZ) - timedelta(hours=hours)
+                except (KeyError, TypeError, ValueError) as e:
+                    return self._send(400, {"error": f"pedido inválido: {e}"})
+                if not profiles:
+                    return self._send(400, {"error": "nenhum perfil"})
+                job = daemon.call(daemon.submit, profiles, cutoff)
+                if body.get("wait"):
+                    return self._send(200, daemon.call(daemon.wait, job["id"]))
+                self._send(202, job)
+
+        return Handler
+
+
+async def serve_daemon(net: RouteFilter, store: PostStore, fetch: Optional[str],
+                       host: str = DAEMON_HOST, port: int = DAEMON_PORT):
+    async with browser_session(net, fetch=fetch) as session:
+        if session is None:
+            return
+        daemon = CrawlDaemon(session, store)
+        server = ThreadingHTTPServer((host, port), daemon.handler())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"[DAEMON] Pronto em http://{host}:{port} (POST /jobs, GET /jobs/<id>, GET /health)")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            server.shutdown()
+            server.server_close()
+            await daemon.close()
+
+
+def run_daemon(args: argparse.Namespace):
+    TELEMETRY.reset()
+    net = RouteFilter(ROUTE_PROFILE)
+    store = PostStore(STORE_DB)
+    try:
+        asyncio.run(serve_daemon(net, store, args.fetch))
+    except KeyboardInterrupt:
+        print("\n[DAEMON] Encerrado.")
+    finally:
+        TELEMETRY.write()
+        store.close()
+
+
+def submit_to_daemon(profiles: List[str], cutoff: datetime, url: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Manda um job ao daemon e acompanha até ele terminar; None se não houver daemon no ar.
+    Se o daemon parar de responder, devolve o job como "sem resposta" (os perfis ficam no
+    diário para --resume) em vez de travar junto com ele."""
+    url = url or f"http://{DAEMON_HOST}:{DAEMON_PORT}"
+    try:
+        with urlopen(f"{url}/health", timeout=2):
+            pass
+    except OSError:
+        return None
+    body = json.dumps({"profiles": profiles, "cutoff": cutoff.isoformat()}).encode("utf-8")
+    req = Request(f"{url}/jobs", data=body, headers={"Content-Type": "application/json"})
+    job: Dict[str, Any] = {"id": "?", "status": "queued"}
+    t0 = time.monotonic()
+    try:
+        with urlopen(req, timeout=DAEMON_HTTP_TIMEOUT_S) as resp:
+            job = json.load(resp)
+        # consulta o job em vez de um POST com wait: cada pedido tem timeout, o job não
+        while job["status"] not in ("done", "failed"):
+            time.sleep(DAEMON_POLL_S)
+            with urlopen(f"{url}/jobs/{job['id']}", timeout=DAEMON_HTTP_TIMEOUT_S) as resp:
+                job = json.load(resp)
+    except OSError as e:
+        print(f"[ERRO] Daemon sem resposta: {e}")
+        job.update(status="sem resposta", elapsed_s=round(time.monotonic() - t0, 2))
+    return job
+
+# ======================== MAIN ========================
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Crawler Instagram por perfis.")
+    ap.add_argument("--resume", action="store_true",
+                    help=f"retoma a última execução interrompida a partir de {RUN_JOURNAL}")
+    ap.add_argument("--format", default=",".join(EXPORT_FORMATS),
+                    help="formatos de saída separados por vírgula: csv, jsonl, parquet")
+    ap.add_argument("--record-har", metavar="ARQUIVO",
+                    help="grava todas as respostas da execução num HAR (fixture para benchmarks/replay.py)")
+    ap.add_argument("--fetch", choices=("http", "browser"), default=FETCH_BACKEND,
+                    help="como baixar os posts: http (JSON direto, navegador só de reserva) ou browser")
+    ap.add_argument("--hashtags", default=",".join(HASHTAGS),
+                    help="hashtags também usadas como fonte de posts, separadas por vírgula")
+    ap.add_argument("--all", action="store_true",
+                    help="ignora o agendador e coleta todos os perfis habilitados do registro")
+    ap.add_argument("--budget-min", type=float, default=RUN_BUDGET_MIN,
+                    help="orçamento de tempo da execução em minutos (0 = sem limite)")
+    ap.add_argument("--shards", type=int, metavar="N",
+                    help="divide os perfis entre N processos, cada um com navegador e sessão próprios")
+    ap.add_argument("--queue", default=SHARD_QUEUE,
+                    help="fila de perfis compartilhada (SQLite) usada por --shards")
+    ap.add_argument("--join", action="store_true",
+                    help="com --shards: só entra com workers numa fila já criada por outra máquina")
+    ap.add_argument("--worker-id", help=argparse.SUPPRESS)
+    ap.add_argument("--snapshot", action="store_true",
+                    help="só reamostra as métricas dos posts recentes com marco de série vencido")
+    ap.add_argument("--series", metavar="ALVO",
+                    help="mostra a curva de engajamento de um post (URL/shortcode) ou perfil (@perfil)")
+    ap.add_argument("--daemon", action="store_true",
+                    help=f"mantém navegador e sessão abertos e recebe jobs em http://{DAEMON_HOST}:{DAEMON_PORT}")
+    ap.add_argument("--via-daemon", action="store_true",
+                    help="manda os perfis da execução ao daemon (se estiver no ar) em vez de abrir um navegador")
+    return ap.parse_args(argv)
+
+
+def shard_store_path(queue_path: str, owner: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(queue_path)), f"posts-{owner}.sqlite")
+
+
+def run_worker(args: argparse.Namespace):
+    """Um processo de --shards: pega perfis da fila até ela esvaziar."""
+    owner = args.worker_id
+    queue = LeaseQueue(args.queue)
+    cutoff = queue.cutoff()
+    if cutoff is None:
+        print(f"[ERRO] Fila {args.queue} não inicializada.")
+        return
+    TELEMETRY.reset()
+    TELEMETRY.worker = owner
+    global METRICS_PROM_FILE, METRICS_JSON_FILE
+    METRICS_PROM_FILE, METRICS_JSON_FILE = (
+        f"{os.path.splitext(f)[0]}.{owner}{os.path.splitext(f)[1]}" if f else f
+        for f in (METRICS_PROM_FILE, METRICS_JSON_FILE)
+    )
+
+    net = RouteFilter(ROUTE_PROFILE)
+    store = PostStore(shard_store_path(args.queue, owner), base=STORE_DB)
+    try:
+        crawled = asyncio.run(run_crawl([], cutoff, net, store, None, lease=queue, owner=owner,
+                                        fetch=args.fetch, budget_min=args.budget_min))
+        print(f"[WORKER {owner}] {crawled} posts na janela; plano: {dict(store.stats)}")
+    except KeyboardInterrupt:
+        print(f"\n[WORKER {owner}] Interrompido; os leases abertos vencem em {LEASE_S}s.")
+    finally:
+        TELEMETRY.write()
+        store.close()
+        queue.close()
+
+
+def run_shards(args: argparse.Namespace):
+    """Sobe os workers locais; sem --join, também espera a fila esvaziar (incluindo
+    workers de outras máquinas), funde os shards em STORE_DB e exporta."""
+    now_local = datetime.now(USER_TZ)
+    registry, todo = scheduled_profiles(args, now_local)
+    usernames = registry.usernames()
+    os.makedirs(os.path.dirname(os.path.abspath(args.queue)), exist_ok=True)
+    queue = LeaseQueue(args.queue)
+    if args.join:
+        cutoff = queue.cutoff()
+        if cutoff is None:
+            print(f"[ERRO] Fila {args.queue} não inicializada; rode --shards sem --join primeiro.")
+            return
+    else:
+        if not todo:
+            print("Nenhum perfil para coletar nesta execução.")
+            return
+        # a ordem de inserção é a ordem de claim: os perfis de mais valor saem primeiro
+        cutoff = queue.init(todo, now_local - timedelta(hours=WINDOW_HOURS))
+
+    host = socket.gethostname().split(".")[0]
+    try:
+        while True:
+            settled = queue.counts()["done"] + queue.counts()["failed"]
+            n = max(1, min(args.shards, queue.claimable()))
+            procs = [
+                subprocess.Popen([sys.executable, os.path.abspath(__file__), "--queue", args.queue,
+                                  "--fetch", args.fetch, "--budget-min", str(args.budget_min),
+                                  "--worker-id", f"{host}-{os.getpid()}-{i}-{int(time.time())}"])
+                for i in range(n)
+            ]
+            print(f"[SHARDS] {n} workers locais; fila: {dict(queue.counts())}")
+            for proc in procs:
+                proc.wait()
+            if args.join:
+                return
+            # workers que morreram deixam leases vencidos; outros podem estar em outras máquinas
+            while not queue.claimable() and queue.counts()["leased"]:
+                print(f"[SHARDS] Aguardando workers remotos: {dict(queue.counts())}")
+                time.sleep(min(30, LEASE_S))
+            if not queue.claimable():
+                break
+            if queue.counts()["done"] + queue.counts()["failed"] == settled:
+                print("[ERRO] Nenhum worker avançou a fila nesta rodada (login falhou?); parando.")
+                break
+    except KeyboardInterrupt:
+        print("\n[INTERROMPIDO] Rode --shards de novo para continuar a rodada.")
+        return
+    finally:
+        counts = queue.counts()
+        done = queue.done_usernames()
+        queue.close()
+
+    print(f"[SHARDS] Fila concluída: {dict(counts)}")
+    shard_dir = os.path.dirname(os.path.abspath(args.queue))
+    store = PostStore(STORE_DB)
+    try:
+        for name in sorted(os.listdir(shard_dir)):
+            if not (name.startswith("posts-") and name.endswith(".sqlite")):
+                continue
+            path = os.path.join(shard_dir, name)
+            n = store.merge_from(path)
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            print(f"[SHARDS] {n} posts de {name} fundidos em {STORE_DB}")
+        registry.record_run(done, store, now_local)
+        print()
+        formats = [f.strip() for f in args.format.split(",") if f.strip()]
+        if not export_store(store, usernames, cutoff, formats, now_local):
+            print("Nenhum post foi coletado.")
+    finally:
+        store.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    if args.worker_id:
+        return run_worker(args)
+    if args.shards:
+        if args.hashtags:
+            print("[WARN] --hashtags não é usado com --shards (a fila compartilhada é só de perfis).")
+        return run_shards(args)
+    if args.series:
+        return show_series(args.series)
+    if args.snapshot:
+        return run_snapshot(args)
+    if args.daemon:
+        return run_daemon(args)
+
+    TELEMETRY.reset()
+    now_local = datetime.now(USER_TZ)
+    registry, scheduled = scheduled_profiles(args, now_local)
+    usernames = registry.usernames()
+    tags = hashtag_sources(args)
+    if not usernames and not tags:
+        print(f"Nenhum perfil habilitado em {PROFILES_FILE}.")
         return
+    sources = scheduled + tags
+
+    journal = RunJournal(RUN_JOURNAL, resume=args.resume)
+    cutoff = journal.start(now_local - timedelta(hours=WINDOW_HOURS))
+
+    net = RouteFilter(ROUTE_PROFILE)
+    store = PostStore(STORE_DB)
+    try:
+        # o diário é a fonte da verdade: repõe na base o que a queda não deixou gravar
+        restored = sum(store.restore_post(row, captured) for captured, row in journal.rows)
+        if restored:
+            print(f"[RESUME] {restored} posts do diário repostos na base.")
+
+        todo = [u for u in sources if u not in journal.done_profiles]
+        if args.resume and journal.done_profiles:
+            print(f"[RESUME] {len(sources) - len(todo)} perfis já concluídos, faltam {len(todo)}.")
+
+        try:
+            result = submit_to_daemon(todo, cutoff) if args.via_daemon and todo else None
+            if result is not None:
+                # o daemon gravou na mesma base; o diário só registra os perfis concluídos
+                print(f"[DAEMON] Job {result['id']}: {result['status']} em {result.get('elapsed_s')}s")
+                for line in result.get("failures") or []:
+                    print(line)
+                for username in result.get("done") or []:
+                    journal.profile_done(username)
+                crawled = result.get("crawled") or 0
+            else:
+                if args.via_daemon and todo:
+                    print("[WARN] Daemon fora do ar; coletando neste processo.")
+                crawled = asyncio.run(run_crawl(todo, cutoff, net, store, journal, args.record_har,
+                                                fetch=args.fetch, budget_min=args.budget_min)) if todo else 0
+        except KeyboardInterrupt:
+            print("\n[INTERROMPIDO] Progresso salvo; rode novamente com --resume para continuar.")
+            TELEMETRY.write()
+            return
+
+        print("\n" + net.summary())
+        print(WAIT_STATS.summary())
+        print(TELEMETRY.summary())
+        TELEMETRY.write()
+        print(f"[BASE] {crawled} posts novos/atualizados na janela; plano: {dict(store.stats)}")
+
+        registry.record_run([u for u in todo if u in journal.done_profiles and not u.startswith("#")],
+                            store, now_local)
+        if all(u in journal.done_profiles for u in sources):
+            journal.run_done()
+
+        print()
+        formats = [f.strip() for f in args.format.split(",") if f.strip()]
+        if not export_store(store, usernames + tags, cutoff, formats, now_local):
+            print("Nenhum post foi coletado.")
+    finally:
+        store.close()
+        journal.close()
+
 
-    # Remove campo auxiliar de data
-    for r in rows:
-        if "_DT_LOCAL" in r:
-            del r["_DT_LOCAL"]
-
-    df = pd.DataFrame(rows, columns=[
-        "PERFIL",
-        "Data/Hora da Publicação",
-        "Legenda/Descrição do Post",
-        "Tema Central (assunto principal)",
-        "Tipo de Mídia",
-        "Tom da Comunicação",
-        "Hashtags utilizadas",
-        "Likes",
-        "Views",
-        "Shares",
-        "Reach",
-        "URL"
-    ])
-
-    df.to_csv(OUT_CSV, index=False, encoding="utf-8-sig")
-    print(f"\n[OK] Exportado {len(df)} posts para {OUT_CSV}")
 if __name__ == "__main__":
     main()
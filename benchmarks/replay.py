@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+"""
+Replay offline do Instagram e benchmark ponta a ponta do crawler.
+
+1) Gravar as páginas de perfil e post (precisa de login de verdade):
+       python "Instagram Crawler.py" --record-har fixtures/replay/sessao.har
+2) Servir o que foi gravado, com latência, erros e limite de requisições:
+       python benchmarks/replay.py serve fixtures/replay/sessao.har --latency-ms 120 --error-rate 0.02
+3) Rodar o main() inteiro contra o replay e medir vazão, latência por estágio e memória:
+       python benchmarks/replay.py bench fixtures/replay/sessao.har --workers 4 --out benchmarks/results.jsonl
+
+No bench, todas as requisições do Chromium são desviadas (context.route + route.fetch)
+para o servidor local, que responde com o conteúdo do HAR; os pedidos de JSON feitos
+fora das páginas (cliente HTTP e context.request) vão para o mesmo servidor pelo
+REPLAY_BASE_URL do crawler, e os posts são baixados pelo navegador (o que o HAR grava).
+Qualquer outra saída para a rede passa por um proxy que recusa a conexão e a anota: se
+houver alguma, o bench falha. O login é pulado: o HAR já carrega a sessão. Cada execução
+é acrescentada em --out; a anterior serve de base para mostrar a variação de uma rodada
+para outra.
+"""
+
+import argparse
+import base64
+import hashlib
+import importlib.util
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlsplit
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# caminhos de primeiro nível que não são perfis
+RESERVED_PATHS = {"", "p", "reel", "reels", "explore", "accounts", "api", "graphql", "stories",
+                  "direct", "static", "ajax", "challenge", "web", "data", "logging"}
+SKIP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection",
+                "keep-alive", "alt-svc", "strict-transport-security"}
+
+
+def load_crawler():
+    spec = importlib.util.spec_from_file_location("instagram_crawler",
+                                                  os.path.join(ROOT, "Instagram Crawler.py"))
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules["instagram_crawler"] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+
+# ======================== HAR ========================
+
+class HarIndex:
+    """Respostas do HAR indexadas por (método, host, caminho)."""
+
+    def __init__(self, path: str):
+        with open(path, encoding="utf-8") as fh:
+            har = json.load(fh)
+        self.entries: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = {}
+        self.documents: List[str] = []
+        for e in har["log"]["entries"]:
+            req, resp = e["request"], e["response"]
+            if resp.get("status", 0) <= 0:
+                continue  # requisição abortada durante a gravação
+            u = urlsplit(req["url"])
+            content = resp.get("content") or {}
+            body = (content.get("text") or "").encode("utf-8")
+            if content.get("encoding") == "base64":
+                body = base64.b64decode(content.get("text") or "")
+            self.entries.setdefault((req["method"], u.netloc, u.path), []).append({
+                "query": u.query,
+                "body_hash": _hash((req.get("postData") or {}).get("text", "").encode("utf-8")),
+                "status": resp["status"],
+                "headers": [(h["name"], h["value"]) for h in resp.get("headers", [])
+                            if h["name"].lower() not in SKIP_HEADERS and not h["name"].startswith(":")],
+                "body": body,
+            })
+            if "html" in (content.get("mimeType") or "") and resp["status"] == 200:
+                self.documents.append(req["url"])
+
+    def lookup(self, method: str, url: str, body: bytes) -> Optional[Dict[str, Any]]:
+        u = urlsplit(url)
+        cands = self.entries.get((method, u.netloc, u.path))
+        if not cands:
+            return None
+        h = _hash(body or b"")
+        for c in cands:
+            if c["query"] == u.query and c["body_hash"] == h:
+                return c
+        for c in cands:
+            if c["query"] == u.query:
+                return c
+        return cands[0]
+
+    def profiles(self) -> List[str]:
+        out = []
+        for url in self.documents:
+            u = urlsplit(url)
+            parts = [p for p in u.path.split("/") if p]
+            if u.netloc.endswith("instagram.com") and len(parts) == 1 and parts[0] not in RESERVED_PATHS:
+                if parts[0] not in out:
+                    out.append(parts[0])
+        return out
+
+
+def _hash(b: bytes) -> str:
+    return hashlib.sha1(b).hexdigest()
+
+
+# ======================== SERVIDOR ========================
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, index: HarIndex, port: int = 0, latency_ms: float = 0, jitter_ms: float = 0,
+                 error_rate: float = 0.0, throttle_rps: float = 0.0):
+        super().__init__(("127.0.0.1", port), ReplayHandler)
+        self.index = index
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rps = throttle_rps
+        self.stats = {"served": 0, "missing": 0, "errors": 0, "throttled": 0}
+        self._lock = threading.Lock()
+        self._tokens = max(1.0, throttle_rps)
+        self._last = time.monotonic()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def take_token(self) -> bool:
+        if not self.throttle_rps:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.throttle_rps, self._tokens + (now - self._last) * self.throttle_rps)
+            self._last = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    server: ReplayServer
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._replay()
+
+    def do_POST(self):
+        self._replay()
+
+    def do_HEAD(self):
+        self._replay()
+
+    def _replay(self):
+        srv = self.server
+        target = parse_qs(urlsplit(self.path).query).get("url", [""])[0]
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        if not srv.take_token():
+            srv.count("throttled")
+            return self._send(429, [("Content-Type", "text/plain")], b"Please wait a few minutes")
+        if srv.error_rate and random.random() < srv.error_rate:
+            srv.count("errors")
+            return self._send(500, [("Content-Type", "text/plain")], b"injected error")
+        if srv.latency_ms or srv.jitter_ms:
+            time.sleep((srv.latency_ms + random.uniform(0, srv.jitter_ms)) / 1000)
+
+        entry = srv.index.lookup(self.command, target, body)
+        if entry is None:
+            srv.count("missing")
+            return self._send(404, [("Content-Type", "text/plain")], b"not recorded")
+        srv.count("served")
+        self._send(entry["status"], entry["headers"], entry["body"])
+
+    def _send(self, status: int, headers: List[Tuple[str, str]], body: bytes):
+        self.send_response(status)
+        for k, v in headers:
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+
+def start_server(args) -> ReplayServer:
+    srv = ReplayServer(HarIndex(args.har), args.port, args.latency_ms, args.jitter_ms,
+                       args.error_rate, args.throttle_rps)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+class LeakGuard(ThreadingHTTPServer):
+    """Proxy que recusa tudo: o que chegar aqui tentou sair do replay para a rede."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), LeakGuardHandler)
+        self.hosts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def record(self, target: str):
+        host = target.split("//", 1)[-1].split("/", 1)[0]
+        with self._lock:
+            self.hosts[host] = self.hosts.get(host, 0) + 1
+
+
+class LeakGuardHandler(BaseHTTPRequestHandler):
+    server: LeakGuard
+
+    def log_message(self, *args):
+        pass
+
+    def _refuse(self):
+        self.server.record(self.path)
+        self.send_response(403)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_CONNECT = do_GET = do_POST = do_HEAD = do_PUT = do_DELETE = do_OPTIONS = _refuse
+
+
+def start_leak_guard(crawler) -> LeakGuard:
+    """Põe o guarda na frente do Chromium (BROWSER_PROXY) e do httpx (variáveis de proxy);
+    o loopback, onde está o replay, passa direto."""
+    guard = LeakGuard()
+    threading.Thread(target=guard.serve_forever, daemon=True).start()
+    crawler.BROWSER_PROXY = {"server": guard.url, "bypass": "127.0.0.1,localhost"}
+    for var in ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "http_proxy", "https_proxy", "all_proxy"):
+        os.environ[var] = guard.url
+    os.environ["NO_PROXY"] = os.environ["no_proxy"] = "127.0.0.1,localhost"
+    return guard
+
+
+def make_replay_hook(base_url: str):
+    """Hook de contexto do crawler: toda requisição do Chromium passa a vir do replay."""
+    async def hook(context):
+        async def handle(route):
+            req = route.request
+            try:
+                resp = await route.fetch(
+                    url=f"{base_url}/__replay__?url={quote(req.url, safe='')}",
+                    method=req.method,
+                    headers=req.headers,
+                    post_data=req.post_data_buffer,
+                    max_redirects=0,
+                )
+                await route.fulfill(response=resp)
+            except Exception:
+                await route.abort()
+        await context.route("**/*", handle)
+        # websockets (tempo real) não passam pelo context.route: ficam sem servidor
+        if hasattr(context, "route_web_socket"):
+            await context.route_web_socket("**/*", lambda ws: None)
+    return hook
+
+
+# ======================== BENCHMARK ========================
+
+def _ms_stats(crawler, values: List[float]) -> Dict[str, float]:
+    return {
+        "n": len(values),
+        "p50_ms": round(crawler._percentile(values, 0.5) * 1000, 1),
+        "p95_ms": round(crawler._percentile(values, 0.95) * 1000, 1),
+    }
+
+
+def _peak_rss_mb() -> Dict[str, float]:
+    if resource is None:
+        return {}
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # macOS em bytes, Linux em KB
+    return {
+        "python": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "browser": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+def bench(args) -> Dict[str, Any]:
+    srv = start_server(args)
+    crawler = load_crawler()
+    tmp = tempfile.mkdtemp(prefix="ig-bench-")
+
+    profiles = args.profiles.split(",") if args.profiles else srv.index.profiles()
+    if not profiles:
+        raise SystemExit("Nenhum perfil encontrado no HAR; use --profiles.")
+
+    async def no_login(page):
+        return True
+
+    crawler.PROFILES_RAW = "\n".join(profiles)
+    crawler.PROFILES_FILE = os.path.join(tmp, "profiles.json")
+    crawler.STORE_DB = os.path.join(tmp, "posts.sqlite")
+    crawler.RUN_JOURNAL = os.path.join(tmp, "journal.jsonl")
+    crawler.SESSION_STATE_FILE = ""
+    crawler.SEEN_FILE = os.path.join(tmp, "seen.bloom")
+    crawler.OUT_CSV = os.path.join(tmp, "out.csv")
+    crawler.EXPORT_DIR = os.path.join(tmp, "exports")
+    crawler.METRICS_PROM_FILE = os.path.join(tmp, "metrics.prom")
+    crawler.METRICS_JSON_FILE = os.path.join(tmp, "metrics.json")
+    crawler.WINDOW_HOURS = args.window_hours
+    crawler.N_WORKERS = args.workers
+    crawler.RATE_START_PER_MIN = crawler.RATE_MAX_PER_MIN = args.rate_per_min
+    crawler.REPLAY_BASE_URL = srv.base_url
+    crawler.login_instagram = no_login
+    crawler.CONTEXT_SETUP_HOOKS.append(make_replay_hook(srv.base_url))
+    guard = start_leak_guard(crawler)
+
+    t0 = time.perf_counter()
+    # o HAR tem as páginas dos posts, não o JSON que o cliente HTTP pediria
+    crawler.main(["--fetch", "browser"])
+    wall = time.perf_counter() - t0
+    srv.shutdown()
+    guard.shutdown()
+
+    with sqlite3.connect(crawler.STORE_DB) as conn:
+        posts = conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+
+    stages = {k: _ms_stats(crawler, v) for k, v in crawler.PIPELINE_STATS.samples.items()}
+    stages.update({f"espera:{k}": _ms_stats(crawler, v) for k, v in crawler.WAIT_STATS.samples.items()})
+    return {
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "har": os.path.basename(args.har),
+        "params": {"workers": args.workers, "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+                   "error_rate": args.error_rate, "throttle_rps": args.throttle_rps,
+                   "rate_per_min": args.rate_per_min, "profiles": len(profiles)},
+        "wall_s": round(wall, 2),
+        "posts": posts,
+        "posts_per_s": round(posts / wall, 3) if wall else 0.0,
+        "stages": stages,
+        "spans": crawler.TELEMETRY.as_dict()["spans"],
+        "peak_rss_mb": _peak_rss_mb(),
+        "server": srv.stats,
+        "leaks": guard.hosts,
+    }
+
+
+def report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]]):
+    def delta(new: float, old: Optional[float]) -> str:
+        if not old:
+            return ""
+        return f"  ({(new - old) / old * 100:+.1f}%)"
+
+    b_stages = (baseline or {}).get("stages", {})
+    print(f"\n[BENCH] {result['posts']} posts em {result['wall_s']}s = {result['posts_per_s']} posts/s"
+          + delta(result["posts_per_s"], (baseline or {}).get("posts_per_s")))
+    print(f"  {'estágio':<28} {'n':>6} {'p50':>10} {'p95':>10}")
+    for name, st in sorted(result["stages"].items()):
+        old = b_stages.get(name, {})
+        print(f"  {name:<28} {st['n']:>6} {st['p50_ms']:>8.1f}ms {st['p95_ms']:>8.1f}ms"
+              + delta(st["p95_ms"], old.get("p95_ms")))
+    print(f"  pico de memória (MB): {result['peak_rss_mb']}")
+    print(f"  servidor: {result['server']}")
+    if result["leaks"]:
+        print(f"  [ERRO] requisições fora do replay (bloqueadas): {result['leaks']}")
+
+
+def last_result(path: str) -> Optional[Dict[str, Any]]:
+    if not path or not os.path.exists(path):
+        return None
+    last = None
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                last = json.loads(line)
+    return last
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("serve", "bench"):
+        p = sub.add_parser(name)
+        p.add_argument("har", help="HAR gravado com --record-har")
+        p.add_argument("--port", type=int, default=0)
+        p.add_argument("--latency-ms", type=float, default=0)
+        p.add_argument("--jitter-ms", type=float, default=0)
+        p.add_argument("--error-rate", type=float, default=0.0, help="fração de respostas 500 injetadas")
+        p.add_argument("--throttle-rps", type=float, default=0.0, help="acima disso o servidor responde 429")
+        if name == "bench":
+            p.add_argument("--workers", type=int, default=4)
+            p.add_argument("--profiles", help="perfis separados por vírgula (padrão: os que estão no HAR)")
+            p.add_argument("--window-hours", type=int, default=24 * 365 * 10,
+                           help="janela larga para o HAR não 'envelhecer'")
+            p.add_argument("--rate-per-min", type=float, default=6000,
+                           help="ritmo do limitador do crawler (alto = mede só o pipeline)")
+            p.add_argument("--out", help="arquivo JSONL onde cada execução é acrescentada")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "serve":
+        srv = start_server(args)
+        print(f"Replay em {srv.base_url}/__replay__?url=<url original> (Ctrl-C para sair)")
+        try:
+            while True:
+                time.sleep(5)
+        except KeyboardInterrupt:
+            print(srv.stats)
+        return 0
+
+    baseline = last_result(args.out)
+    result = bench(args)
+    report(result, baseline)
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(result, ensure_ascii=False) + "\n")
+    # um bench que tentou falar com a rede não mediu o replay
+    return 1 if result["leaks"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
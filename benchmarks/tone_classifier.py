@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark do classificador de tom: versão original (listas recriadas a cada legenda)
+contra o ToneClassifier compilado, legenda a legenda e em lote (classify_series).
+
+Uso:
+    python benchmarks/tone_classifier.py                      # legendas sintéticas
+    python benchmarks/tone_classifier.py --csv instagram_perfis_auto.csv --workers 4
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import re
+import sys
+import time
+
+import pandas as pd
+from unidecode import unidecode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_crawler():
+    spec = importlib.util.spec_from_file_location("instagram_crawler",
+                                                  os.path.join(ROOT, "Instagram Crawler.py"))
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules["instagram_crawler"] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+
+# ======================== VERSÃO ORIGINAL ========================
+
+def legacy_classify_tone(caption: str) -> str:
+    if not caption:
+        return "Campanha"
+    text = unidecode(caption.lower())
+    produto_kw = [
+        "compre","garanta","aproveite","desconto","oferta","cupom","frete","estoque","tamanho",
+        "cores","modelo","produto","colecao","linha","edicao","preco","por apenas","link na bio",
+        "especificacoes","caracteristicas","material","tecido","madeira","borracha","raquete","paddle",
+        "tenis","camiseta","shorts","jaqueta","mochila","oculos","meias","lancamento de produto"
+    ]
+    campanha_kw = [
+        "campanha","evento","torneio","inscricoes","inscricao","regulamento","programacao",
+        "cronograma","datas","agenda","ao vivo","live","estreia","parceria","oficial",
+        "comunicado","novidade","lancamento","edicao","serie","capitulo","episodio"
+    ]
+    atleta_kw = [
+        "atleta","treino","treinar","partida","jogo","match","vitoria","derrota","titulo",
+        "medalha","podio","campeonato","torneio","ranking","desempenho","sets","games",
+        "sparring","coach","tecnico","convocacao","selecao","selecao brasileira",
+        "meu jogo","minha partida","minha vitoria","minha derrota","estou treinando","eu joguei"
+    ]
+    if any(k in text for k in produto_kw):
+        return "Produto"
+    if any(k in text for k in atleta_kw):
+        return "Atleta"
+    if any(k in text for k in campanha_kw):
+        return "Campanha"
+    return "Campanha"
+
+
+def legacy_extract_main_theme(caption: str) -> str:
+    if not caption:
+        return ""
+    tags = [t.lstrip("#") for t in re.findall(r"#\w+", caption)]
+    if tags:
+        uniq = []
+        for t in tags:
+            tclean = t.strip().lower()
+            if tclean not in uniq:
+                uniq.append(tclean)
+        return ", ".join(uniq[:2])
+
+    first_sentence = re.split(r"[.!?\n\r]", caption.strip())[0]
+    tokens = re.findall(r"\w+", unidecode(first_sentence.lower()))
+    pt_stop = set("""
+a o os as de da do das dos e em para por com sem um uma umas uns no na nos nas ao à às aos que ser estar é são foi foram era eram vai vão
+como mais menos muito muita muitos muitas pouco poucos poucas este esta isto esse essa isso aquele aquela aquilo sobre entre até
+""".split())
+    tokens = [w for w in tokens if w not in pt_stop]
+    return " ".join(tokens[:8])
+
+
+# ======================== DADOS ========================
+
+WORDS = (
+    "hoje treino final torneio garanta raquete nova coleção ao vivo campeonato vitória time "
+    "pickleball tênis de mesa evento inscrições link na bio desconto jogo partida semana "
+    "obrigado torcida parceria lançamento oficial atleta medalha seleção brasileira"
+).split()
+
+
+def synthetic_captions(n: int, seed: int = 7) -> pd.Series:
+    rnd = random.Random(seed)
+    caps = []
+    for _ in range(n):
+        words = rnd.choices(WORDS, k=rnd.randint(4, 40))
+        if rnd.random() < 0.3:
+            words.append("#" + rnd.choice(WORDS))
+        caps.append(" ".join(words).capitalize() + ".")
+    return pd.Series(caps)
+
+
+def timed(label: str, fn, n: int):
+    t0 = time.perf_counter()
+    out = fn()
+    dt = time.perf_counter() - t0
+    print(f"  {label:<40} {dt:8.3f}s  {n / dt:>12,.0f} legendas/s")
+    return out, dt
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--csv", help="export do crawler para usar as legendas reais")
+    ap.add_argument("-n", type=int, default=200_000, help="legendas sintéticas (sem --csv)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    crawler = load_crawler()
+    if args.csv:
+        captions = pd.read_csv(args.csv, encoding="utf-8-sig")["Legenda/Descrição do Post"].fillna("")
+    else:
+        captions = synthetic_captions(args.n)
+    values = captions.tolist()
+    n = len(values)
+
+    clf = crawler.get_tone_classifier()
+    print(f"{n:,} legendas | engine: {clf.engine}")
+
+    print("Tom da Comunicação")
+    legacy, t_legacy = timed("original (por legenda)", lambda: [legacy_classify_tone(c) for c in values], n)
+    compiled, t_single = timed("ToneClassifier.classify (por legenda)", lambda: [clf.classify(c) for c in values], n)
+    primary, t_primary = timed("classify_series (só o principal)",
+                               lambda: clf.classify_series(captions, multi_label=False), n)
+    batch, t_batch = timed("classify_series (multirrótulo)", lambda: clf.classify_series(captions), n)
+    if args.workers > 1:
+        timed(f"classify_series ({args.workers} processos)",
+              lambda: clf.classify_series(captions, workers=args.workers), n)
+
+    print("Tema Central")
+    timed("original (por legenda)", lambda: [legacy_extract_main_theme(c) for c in values], n)
+    timed("extract_main_theme", lambda: [crawler.extract_main_theme(c) for c in values], n)
+
+    diffs = {
+        "por legenda": sum(a != b for a, b in zip(legacy, compiled)),
+        "lote": sum(a != b for a, b in zip(legacy, primary["Tom da Comunicação"])),
+        "multirrótulo": sum(a != b for a, b in zip(legacy, batch["Tom da Comunicação"])),
+    }
+    print("divergências com a versão original: " + ", ".join(f"{v} ({k})" for k, v in diffs.items()))
+    gains = {"por legenda": t_legacy / t_single, "lote": t_legacy / t_primary,
+             "multirrótulo": t_legacy / t_batch}
+    print("ganho sobre o original: " + ", ".join(f"{v:.1f}x ({k})" for k, v in gains.items()))
+    # o caminho do rótulo principal tem que ganhar do original, não só empatar
+    slow = [k for k in ("por legenda", "lote") if gains[k] < 1.0]
+    if slow:
+        print(f"[ERRO] mais lento que o original: {', '.join(slow)}")
+    return 1 if any(diffs.values()) or slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""Painel de engajamento sobre as exportações do Instagram Crawler.
+
+As exportações (parquet/jsonl particionados em EXPORT_DIR ou o CSV OUT_CSV) são lidas
+uma vez pelo DuckDB numa tabela em memória, junto com os agregados por perfil/dia/tipo/
+tom e por hashtag. Os filtros consultam os agregados (poucas linhas por dia) e só o
+ranking de posts varre a tabela de posts; os resultados ficam em st.cache_data, então
+mexer num filtro já visto nem chega ao DuckDB. Uma exportação nova (arquivos com outro
+mtime) invalida tudo sozinha.
+
+    streamlit run streamlit_app.py
+"""
+
+import glob
+import os
+import threading
+from datetime import date
+from typing import Any, List, Optional, Tuple
+
+import duckdb
+import pandas as pd
+import streamlit as st
+
+# ======================== CONFIG ========================
+
+# mesmos caminhos de saída do crawler (OUT_CSV e EXPORT_DIR em "Instagram Crawler.py")
+OUT_CSV = "instagram_perfis_auto.csv"
+EXPORT_DIR = "exports"
+# datas dos posts são mostradas no fuso do crawler
+USER_TZ = "America/Sao_Paulo"
+
+LEADERBOARD_SIZE = 25
+TOP_HASHTAGS = 30
+# as exportações são relidas no máximo a cada CACHE_TTL_S (se os arquivos mudaram)
+CACHE_TTL_S = 300
+
+# ======================== FONTES ========================
+
+Signature = Tuple[Tuple[str, float], ...]
+
+
+def export_files() -> Tuple[str, Signature]:
+    """Formato mais completo disponível e seus arquivos com mtime (a chave dos caches)."""
+    for kind in ("parquet", "jsonl"):
+        files = sorted(glob.glob(os.path.join(EXPORT_DIR, kind, "**", f"*.{kind}"), recursive=True))
+        if files:
+            return kind, tuple((f, os.path.getmtime(f)) for f in files)
+    if os.path.exists(OUT_CSV):
+        return "csv", ((OUT_CSV, os.path.getmtime(OUT_CSV)),)
+    return "", ()
+
+
+def source_sql(kind: str) -> str:
+    """SELECT com o esquema de exportação (EXPORT_SCHEMA do crawler) mais `run`, a
+    execução que gerou a linha; cada execução reexporta a janela inteira, então vale a
+    linha da execução mais recente de cada post."""
+    if kind == "csv":
+        return """
+            SELECT "PERFIL" AS perfil,
+                   TRY_STRPTIME("Data/Hora da Publicação", '%Y-%m-%d %H:%M:%S') AS published_at,
+                   "Legenda/Descrição do Post" AS caption,
+                   "Tema Central (assunto principal)" AS theme,
+                   "Tipo de Mídia" AS media_type,
+                   "Tom da Comunicação" AS tone,
+                   "Hashtags utilizadas" AS hashtags,
+                   TRY_CAST("Likes" AS BIGINT) AS likes,
+                   TRY_CAST("Views" AS BIGINT) AS views,
+                   TRY_CAST("Shares" AS BIGINT) AS shares,
+                   TRY_CAST("Reach" AS BIGINT) AS reach,
+                   "URL" AS url,
+                   '' AS run
+            FROM read_csv($files, header = true, all_varchar = true)
+        """
+    # as pastas collected=/perfil= não viram colunas: perfil já vem no arquivo
+    reader = (
+        "read_parquet($files, filename = true, union_by_name = true, hive_partitioning = false)"
+        if kind == "parquet" else
+        "read_json($files, format = 'newline_delimited', filename = true, union_by_name = true, "
+        "hive_partitioning = false)"
+    )
+    # parquet/jsonl guardam a data em UTC; a data local sai pelo fuso do crawler
+    return f"""
+        SELECT perfil,
+               timezone('{USER_TZ}', CAST(published_at AS TIMESTAMPTZ)) AS published_at,
+               caption, theme, media_type, tone, hashtags,
+               CAST(likes AS BIGINT) AS likes, CAST(views AS BIGINT) AS views,
+               CAST(shares AS BIGINT) AS shares, CAST(reach AS BIGINT) AS reach, url,
+               regexp_extract(filename, 'part-([0-9T]+)', 1) AS run
+        FROM {reader}
+    """
+
+
+def build_db(kind: str, files: List[str]) -> duckdb.DuckDBPyConnection:
+    con = duckdb.connect()
+    con.execute(f"""
+        CREATE TABLE posts AS
+        SELECT * EXCLUDE (run), CAST(published_at AS DATE) AS dia
+        FROM ({source_sql(kind)})
+        WHERE url IS NOT NULL
+        QUALIFY row_number() OVER (PARTITION BY url ORDER BY run DESC) = 1
+    """, {"files": files})
+    # agregados que respondem a quase todos os filtros sem tocar na tabela de posts
+    con.execute("""
+        CREATE TABLE daily AS
+        SELECT perfil, dia, media_type, tone,
+               count(*) AS posts, sum(likes) AS likes, sum(views) AS views, count(views) AS n_views
+        FROM posts GROUP BY ALL
+    """)
+    con.execute("""
+        CREATE TABLE tag_daily AS
+        SELECT perfil, dia, media_type, tone, lower(tag) AS tag, count(*) AS posts, sum(likes) AS likes
+        FROM (SELECT *, unnest(string_split(hashtags, ', ')) AS tag FROM posts WHERE hashtags <> '')
+        WHERE tag <> ''
+        GROUP BY ALL
+    """)
+    return con
+
+
+@st.cache_resource(show_spinner="Carregando as exportações...", max_entries=1)
+def open_db(kind: str, signature: Signature) -> Tuple[duckdb.DuckDBPyConnection, threading.Lock]:
+    # o Streamlit atende cada sessão numa thread; as consultas são de milissegundos,
+    # então uma conexão com lock sai mais barato que um cursor novo por consulta
+    return build_db(kind, [f for f, _ in signature]), threading.Lock()
+
+
+# ======================== CONSULTAS ========================
+# Todas recebem a assinatura das fontes (chave do cache) e os filtros como tuplas.
+
+Filters = Tuple[Tuple[str, ...], Tuple[str, ...], Tuple[str, ...], date, date]
+
+
+def where(filters: Filters) -> Tuple[str, List[Any]]:
+    perfis, tipos, tons, start, end = filters
+    conds, params = ["dia BETWEEN ? AND ?"], [start, end]
+    for col, values in (("perfil", perfis), ("media_type", tipos), ("tone", tons)):
+        if values:
+            conds.append(f"{col} IN ({', '.join('?' for _ in values)})")
+            params += list(values)
+    return " AND ".join(conds), params
+
+
+def query(kind: str, signature: Signature, sql: str, params: Optional[List[Any]] = None) -> pd.DataFrame:
+    con, lock = open_db(kind, signature)
+    with lock:
+        return con.execute(sql, params or []).df()
+
+
+@st.cache_data(ttl=CACHE_TTL_S, show_spinner=False)
+def filter_options(kind: str, signature: Signature) -> dict:
+    span = query(kind, signature, "SELECT min(dia) AS start, max(dia) AS end FROM daily").iloc[0]
+    opts = {
+        col: query(kind, signature, f"SELECT DISTINCT {col} FROM daily WHERE {col} IS NOT NULL ORDER BY 1")[col].tolist()
+        for col in ("perfil", "media_type", "tone")
+    }
+    for key in ("start", "end"):
+        opts[key] = span[key].date() if pd.notna(span[key]) else None
+    return opts
+
+
+@st.cache_data(ttl=CACHE_TTL_S, show_spinner=False)
+def totals(kind: str, signature: Signature, filters: Filters) -> pd.DataFrame:
+    cond, params = where(filters)
+    return query(kind, signature, f"""
+        SELECT sum(posts) AS posts, count(DISTINCT perfil) AS perfis, sum(likes) AS likes,
+               sum(likes) / nullif(sum(posts), 0) AS likes_por_post,
+               sum(views) / nullif(sum(n_views), 0) AS views_por_video
+        FROM daily WHERE {cond}
+    """, params)
+
+
+@st.cache_data(ttl=CACHE_TTL_S, show_spinner=False)
+def per_day(kind: str, signature: Signature, filters: Filters) -> pd.DataFrame:
+    cond, params = where(filters)
+    return query(kind, signature, f"""
+        SELECT dia, sum(posts) AS posts, sum(likes) AS likes
+        FROM daily WHERE {cond} GROUP BY dia ORDER BY dia
+    """, params)
+
+
+@st.cache_data(ttl=CACHE_TTL_S, show_spinner=False)
+def profile_board(kind: str, signature: Signature, filters: Filters) -> pd.DataFrame:
+    cond, params = where(filters)
+    return query(kind, signature, f"""
+        SELECT perfil, sum(posts) AS posts, sum(likes) AS likes,
+               round(sum(likes) / nullif(sum(posts), 0), 1) AS likes_por_post,
+               round(sum(views) / nullif(sum(n_views), 0), 1) AS views_por_video
+        FROM daily WHERE {cond}
+        GROUP BY perfil ORDER BY likes_por_post DESC NULLS LAST LIMIT {LEADERBOARD_SIZE}
+    """, params)
+
+
+@st.cache_data(ttl=CACHE_TTL_S, show_spinner=False)
+def top_posts(kind: str, signature: Signature, filters: Filters) -> pd.DataFrame:
+    cond, params = where(filters)
+    return query(kind, signature, f"""
+        SELECT perfil, published_at AS publicado, media_type AS tipo, tone AS tom, likes, views,
+               left(caption, 120) AS legenda, url
+        FROM posts WHERE {cond}
+        ORDER BY likes DESC NULLS LAST LIMIT {LEADERBOARD_SIZE}
+    """, params)
+
+
+@st.cache_data(ttl=CACHE_TTL_S, show_spinner=False)
+def mix(kind: str, signature: Signature, filters: Filters, col: str) -> pd.DataFrame:
+    cond, params = where(filters)
+    return query(kind, signature, f"""
+        SELECT coalesce({col}, '?') AS {col}, sum(posts) AS posts,
+               round(sum(likes) / nullif(sum(posts), 0), 1) AS likes_por_post
+        FROM daily WHERE {cond} GROUP BY 1 ORDER BY posts DESC
+    """, params)
+
+
+@st.cache_data(ttl=CACHE_TTL_S, show_spinner=False)
+def hashtags(kind: str, signature: Signature, filters: Filters) -> pd.DataFrame:
+    cond, params = where(filters)
+    return query(kind, signature, f"""
+        SELECT tag, sum(posts) AS posts, round(sum(likes) / nullif(sum(posts), 0), 1) AS likes_por_post
+        FROM tag_daily WHERE {cond}
+        GROUP BY tag ORDER BY posts DESC, tag LIMIT {TOP_HASHTAGS}
+    """, params)
+
+
+# ======================== PAINEL ========================
+
+def main():
+    st.set_page_config(page_title="Instagram · engajamento", layout="wide")
+    st.title("Engajamento dos perfis")
+
+    kind, signature = export_files()
+    if not signature:
+        st.info(f"Nenhuma exportação encontrada ({OUT_CSV} ou {EXPORT_DIR}/parquet|jsonl). "
+                "Rode o crawler primeiro.")
+        st.stop()
+    opts = filter_options(kind, signature)
+    if opts["start"] is None:
+        st.info("As exportações não têm posts com data.")
+        st.stop()
+
+    with st.sidebar:
+        st.caption(f"Fonte: {kind} ({len(signature)} arquivos)")
+        perfis = st.multiselect("Perfis", opts["perfil"])
+        tipos = st.multiselect("Tipo de mídia", opts["media_type"])
+        tons = st.multiselect("Tom", opts["tone"])
+        picked = st.date_input("Período", (opts["start"], opts["end"]),
+                               min_value=opts["start"], max_value=opts["end"])
+    # enquanto o usuário escolhe o fim do intervalo, o date_input devolve só o início
+    start, end = (picked[0], picked[-1]) if isinstance(picked, (tuple, list)) else (picked, picked)
+    filters: Filters = (tuple(perfis), tuple(tipos), tuple(tons), start, end)
+
+    t = totals(kind, signature, filters).iloc[0]
+    if not t["posts"]:
+        st.warning("Nenhum post com esses filtros.")
+        st.stop()
+    cols = st.columns(5)
+    cols[0].metric("Posts", f"{int(t['posts']):,}".replace(",", "."))
+    cols[1].metric("Perfis", int(t["perfis"]))
+    cols[2].metric("Likes", f"{int(t['likes'] or 0):,}".replace(",", "."))
+    cols[3].metric("Likes por post", f"{t['likes_por_post'] or 0:.1f}")
+    cols[4].metric("Views por vídeo", f"{t['views_por_video']:.0f}" if pd.notna(t["views_por_video"]) else "—")
+
+    daily = per_day(kind, signature, filters).set_index("dia")
+    st.subheader("Por dia")
+    st.line_chart(daily[["likes"]])
+    st.bar_chart(daily[["posts"]], height=160)
+
+    left, right = st.columns(2)
+    with left:
+        st.subheader("Perfis")
+        st.dataframe(profile_board(kind, signature, filters), hide_index=True, use_container_width=True)
+    with right:
+        st.subheader("Hashtags mais usadas")
+        st.bar_chart(hashtags(kind, signature, filters).set_index("tag")[["posts"]], horizontal=True)
+
+    st.subheader("Posts com mais likes")
+    st.dataframe(top_posts(kind, signature, filters), hide_index=True, use_container_width=True,
+                 column_config={"url": st.column_config.LinkColumn("url")})
+
+    left, right = st.columns(2)
+    with left:
+        st.subheader("Tipo de mídia")
+        st.dataframe(mix(kind, signature, filters, "media_type"), hide_index=True, use_container_width=True)
+    with right:
+        st.subheader("Tom da comunicação")
+        st.dataframe(mix(kind, signature, filters, "tone"), hide_index=True, use_container_width=True)
+
+
+main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Sonda de mudança (web_profile_info) contra a captura em fixtures/capture/."""
+
+import importlib.util
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE = os.path.join(ROOT, "fixtures", "capture", "profile_web_info.json")
+
+
+@pytest.fixture(scope="module")
+def crawler():
+    spec = importlib.util.spec_from_file_location("instagram_crawler",
+                                                  os.path.join(ROOT, "Instagram Crawler.py"))
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules["instagram_crawler"] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+
+@pytest.fixture
+def probe(crawler):
+    with open(FIXTURE, encoding="utf-8") as fh:
+        return crawler.parse_profile_probe(json.load(fh))
+
+
+def test_parse_profile_probe(probe):
+    assert probe is not None
+    assert probe.count == 1287
+    assert probe.items == [
+        ("https://www.instagram.com/p/C1pInNeDaA1/", True),
+        ("https://www.instagram.com/reel/DA2cD3eF4gH/", False),
+        ("https://www.instagram.com/p/DA1bC2dE3fG/", False),
+        ("https://www.instagram.com/p/DA0zY9xW8vU/", False),
+    ]
+    # o fixado no topo não é o post mais novo
+    assert probe.newest == "DA2cD3eF4gH"
+
+
+def test_timeline_capture_is_not_a_probe(crawler):
+    with open(os.path.join(ROOT, "fixtures", "capture", "profile_timeline.json"), encoding="utf-8") as fh:
+        assert crawler.parse_profile_probe(json.load(fh)) is None
+
+
+def test_new_since_counts_unknown_posts(probe):
+    known = {"https://www.instagram.com/p/C1pInNeDaA1/", "https://www.instagram.com/p/DA1bC2dE3fG/"}
+    assert probe.new_since(1286, "DA1bC2dE3fG", known.__contains__) == 1
+    assert probe.new_since(1287, "DA2cD3eF4gH", lambda url: True) == 0
+
+
+def test_new_since_falls_back_to_grid(probe):
+    known = {"https://www.instagram.com/p/C1pInNeDaA1/", "https://www.instagram.com/p/DA1bC2dE3fG/"}
+    # um post novo e um apagado: o total não muda, mas há um desconhecido
+    assert probe.new_since(1287, "DA1bC2dE3fG", known.__contains__) is None
+    # mais posts novos do que a sonda mostra
+    assert probe.new_since(1280, "DA1bC2dE3fG", known.__contains__) is None
+    # o mais novo anterior sumiu da sonda (apagado ou além dela)
+    assert probe.new_since(1287, "XXXXXXXXXXX", lambda url: True) is None
+    # o mais novo anterior agora está fixado: o que veio depois dele pode estar escondido
+    assert probe.new_since(1287, "C1pInNeDaA1", lambda url: True) is None